@@ -0,0 +1,394 @@
+"""
+API HTTP local (sin navegador) sobre el pipeline: research y redacción como
+jobs en una cola persistente (`job_queue.py`) atendida por un pool de workers.
+
+    python api_server.py --port 8787 --workers 4 --secrets .streamlit/secrets.toml
+
+Endpoints (JSON):
+    POST /v1/research           {"keyword", "incremental"}                        -> 202 {"id", "status"}
+    POST /v1/generate           {"keyword", "title", "structure_id", "tone", ...} -> 202 {"id", "status"}
+    GET  /v1/jobs/<id>          estado, tiempos y resultado
+    GET  /v1/jobs/<id>/stream   eventos SSE: "delta" (fragmento del artículo), "reset", "done"
+    GET  /v1/jobs?status=...    últimos jobs
+    GET  /healthz               jobs por estado y workers
+    GET  /metrics               métricas Prometheus del proceso
+
+`/v1/generate` acepta `research_job` (id de un research terminado) para no
+repetir el research; si no, lo hace dentro del mismo job. Con `API_TOKEN`
+definido, cada petición debe traer `Authorization: Bearer <token>`.
+"""
+import argparse, json, os, re, sys, threading, time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import seo_pipeline
+from batch_generate import load_secrets
+from job_queue import JobQueue, DEFAULT_QUEUE_PATH, LEASE_SEC
+from telemetry import start_trace, prometheus_text
+
+API_TOKEN = os.getenv("API_TOKEN", "")
+MAX_BODY_BYTES = 1 << 20
+# Streams de jobs terminados que se conservan en memoria para clientes que llegan tarde
+STREAM_RETENTION = 200
+# Sin eventos en este tiempo se manda un comentario SSE (mantiene viva la conexión)
+SSE_KEEPALIVE_SEC = 15.0
+# Rango de `limit` en GET /v1/jobs
+LIST_LIMIT_DEFAULT, LIST_LIMIT_MAX = 50, 500
+
+GENERATE_DEFAULTS = {"tone": "profesional", "word_count": 1500, "related_keywords": "", "structure_id": None}
+MODEL_FIELDS = ("ai_model", "temperature", "max_tokens", "presence_penalty", "frequency_penalty",
+                "optimization_mode", "latency_target_sec")
+
+class BadRequest(ValueError):
+    pass
+
+# =====================
+# Jobs
+# =====================
+def research(keyword: str, incremental: bool = True) -> Dict[str, Any]:
+    """Research + estrategia + estructuras disponibles de una keyword."""
+    data = seo_pipeline.analyze_competitors(keyword, incremental=incremental)
+    strategy = seo_pipeline.generate_content_strategy(
+        data["content_analyses"], keyword, serp_features=data.get("serp_features")
+    ) if data.get("content_analyses") else None
+    return {"keyword": keyword, "competitor_data": data, "strategy": strategy,
+            "structures": seo_pipeline.get_structure_options(keyword, strategy)}
+
+def pick_structure(structures: List[Dict[str, Any]], structure_id: Optional[int]) -> Dict[str, Any]:
+    """La estructura pedida o, por defecto, la optimizada (o la primera)."""
+    if structure_id:
+        structure = next((o for o in structures if o["id"] == structure_id), None)
+        if structure is None:
+            raise ValueError(f"structure_id {structure_id} no disponible (opciones: {[o['id'] for o in structures]})")
+        return structure
+    return next((o for o in structures if o.get("optimized")), structures[0])
+
+def _token_usage(waterfall) -> Dict[str, int]:
+    fields = ("prompt_tokens", "cached_tokens", "completion_tokens", "total_tokens")
+    calls = [r for r in waterfall if r["stage"] == "openai.chat_completion"]
+    return {k: sum(int(r.get(k) or 0) for r in calls) for k in fields}
+
+def validate(kind: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Parámetros normalizados de un job; BadRequest si faltan o no son válidos."""
+    keyword = str(body.get("keyword") or "").strip()
+    if kind == "research":
+        if not keyword:
+            raise BadRequest("Falta 'keyword'")
+        return {"keyword": keyword, "incremental": bool(body.get("incremental", True))}
+    params = {**GENERATE_DEFAULTS, **{k: body[k] for k in GENERATE_DEFAULTS if body.get(k) is not None}}
+    params["title"] = str(body.get("title") or "").strip()
+    params["keyword"] = keyword
+    params["research_job"] = body.get("research_job")
+    if not params["title"]:
+        raise BadRequest("Falta 'title'")
+    if not keyword and not params["research_job"]:
+        raise BadRequest("Falta 'keyword' (o 'research_job')")
+    try:
+        params["word_count"] = int(params["word_count"])
+        params["structure_id"] = int(params["structure_id"]) if params["structure_id"] else None
+    except (TypeError, ValueError):
+        raise BadRequest("'word_count' y 'structure_id' deben ser enteros")
+    params["model_config"] = {k: body[k] for k in MODEL_FIELDS if body.get(k) is not None}
+    return params
+
+class JobStream:
+    """Eventos de un job en memoria; los suscriptores SSE los leen desde cualquier posición."""
+
+    def __init__(self):
+        self.events: List[Tuple[str, Any]] = []
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def emit(self, event: str, data: Any):
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def close(self, status: Dict[str, Any]):
+        with self._cond:
+            self.events.append(("done", status))
+            self.closed = True
+            self._cond.notify_all()
+
+    def read(self, start: int, timeout: float) -> Tuple[List[Tuple[str, Any]], bool]:
+        """Eventos desde `start` (espera hasta `timeout` si no hay nuevos) y si el stream terminó."""
+        with self._cond:
+            if len(self.events) <= start and not self.closed:
+                self._cond.wait(timeout)
+            return self.events[start:], self.closed
+
+class JobService:
+    """Cola persistente + pool de workers + streams de eventos por job."""
+
+    def __init__(self, queue: JobQueue, workers: int = 4):
+        self.queue = queue
+        self.workers = workers
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._streams: "OrderedDict[str, JobStream]" = OrderedDict()
+        self._streams_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._running: set = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        self._requeue_stale()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"api-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._keepalive, name="api-lease", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def _requeue_stale(self):
+        requeued = self.queue.requeue_stale()
+        if requeued:
+            print(f"{requeued} job(s) interrumpidos vuelven a la cola", file=sys.stderr)
+            self._wake.set()
+
+    def _keepalive(self):
+        """Renueva el lease de los jobs en curso y recupera los de procesos caídos (lease vencido)."""
+        while not self._stop.wait(LEASE_SEC / 3):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                self.queue.heartbeat(running)
+                self._requeue_stale()
+            except Exception as e:  # SQLite ocupado: se reintenta en la próxima vuelta
+                print(f"No se pudo renovar el lease de los jobs: {e}", file=sys.stderr)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        job_id = self.queue.submit(kind, params)
+        self._wake.set()
+        return job_id
+
+    def stream(self, job_id: str) -> JobStream:
+        with self._streams_lock:
+            s = self._streams.get(job_id)
+            if s is None:
+                s = self._streams[job_id] = JobStream()
+            self._streams.move_to_end(job_id)
+            # Se descartan los más viejos ya terminados
+            while len(self._streams) > STREAM_RETENTION:
+                oldest = next((k for k, v in self._streams.items() if v.closed), None)
+                if oldest is None:
+                    break
+                del self._streams[oldest]
+            return s
+
+    def has_stream(self, job_id: str) -> bool:
+        with self._streams_lock:
+            return job_id in self._streams
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                # También se revisa la cola periódicamente (jobs enviados por otro proceso)
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            stream = self.stream(job["id"])
+            with self._running_lock:
+                self._running.add(job["id"])
+            try:
+                with start_trace(f"api.{job['kind']}", job_id=job["id"]) as trace:
+                    result = self._run(job, stream)
+                if job["kind"] == "generate":
+                    result["tokens"] = _token_usage(trace.waterfall())
+                result["elapsed_sec"] = round(trace.end - trace.start, 2)
+                self.queue.finish(job["id"], result)
+                stream.close({"status": "done"})
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                self.queue.fail(job["id"], error)
+                stream.close({"status": "failed", "error": error[:500]})
+            finally:
+                with self._running_lock:
+                    self._running.discard(job["id"])
+
+    def _run(self, job: Dict[str, Any], stream: JobStream) -> Dict[str, Any]:
+        p = job["params"]
+        if job["kind"] == "research":
+            return research(p["keyword"], p["incremental"])
+        if p.get("research_job"):
+            source = self.queue.get(p["research_job"])
+            if not source or source["kind"] != "research" or source["status"] != "done":
+                raise ValueError(f"research_job {p['research_job']} no existe o no ha terminado")
+            found = source["result"]
+        else:
+            found = research(p["keyword"])
+        structure = pick_structure(found["structures"], p["structure_id"])
+        content = seo_pipeline.generate_content_with_openai(
+            title=p["title"], keyword=found["keyword"], structure=structure, tone=p["tone"],
+            word_count=p["word_count"], related_keywords=p["related_keywords"],
+            competitor_data=found["competitor_data"], strategy=found["strategy"],
+            model_config=p["model_config"], on_stream=stream.emit,
+        )
+        if not seo_pipeline.OPENAI_API_KEY:
+            # Sin clave la redacción es la plantilla local (sin streaming): se emite de una vez
+            stream.emit("delta", content)
+        return {"keyword": found["keyword"], "structure": structure, "content": content, "words": len(content.split())}
+
+# =====================
+# HTTP
+# =====================
+JOB_PATH = re.compile(r"^/v1/jobs/([0-9a-f]+)(/stream)?$")
+
+class ApiHandler(BaseHTTPRequestHandler):
+    service: JobService = None
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: Any):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self) -> bool:
+        if API_TOKEN and self.headers.get("Authorization") != f"Bearer {API_TOKEN}":
+            self._send_json(401, {"error": "Token inválido o ausente"})
+            return False
+        return True
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        kind = {"/v1/research": "research", "/v1/generate": "generate"}.get(urlsplit(self.path).path.rstrip("/"))
+        if kind is None:
+            return self._send_json(404, {"error": "Ruta desconocida"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            return self._send_json(413, {"error": "Cuerpo demasiado grande"})
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise BadRequest("Se espera un objeto JSON")
+            params = validate(kind, body)
+        except ValueError as e:  # JSON inválido o BadRequest
+            return self._send_json(400, {"error": str(e)})
+        job_id = self.service.submit(kind, params)
+        self._send_json(202, {"id": job_id, "kind": kind, "status": "queued",
+                              "links": {"self": f"/v1/jobs/{job_id}", "stream": f"/v1/jobs/{job_id}/stream"}})
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlsplit(self.path)
+        path = url.path.rstrip("/")
+        queue = self.service.queue
+        if path == "/healthz":
+            return self._send_json(200, {"jobs": queue.counts(), "workers": self.service.workers})
+        if path == "/metrics":
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path == "/v1/jobs":
+            query = parse_qs(url.query)
+            status = query.get("status", [None])[0]
+            try:
+                limit = int(query.get("limit", [LIST_LIMIT_DEFAULT])[0])
+            except ValueError:
+                return self._send_json(400, {"error": "'limit' debe ser un entero"})
+            limit = max(1, min(limit, LIST_LIMIT_MAX))
+            return self._send_json(200, {"jobs": queue.list(status, limit)})
+        m = JOB_PATH.match(path)
+        if not m:
+            return self._send_json(404, {"error": "Ruta desconocida"})
+        job = queue.get(m.group(1), with_result=not m.group(2))
+        if job is None:
+            return self._send_json(404, {"error": "Job inexistente"})
+        if m.group(2):
+            return self._sse(job)
+        self._send_json(200, job)
+
+    def _sse(self, job: Dict[str, Any]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        write = lambda event, data: self.wfile.write(
+            f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+        try:
+            if job["status"] in ("done", "failed") and not self.service.has_stream(job["id"]):
+                return self._sse_from_store(job["id"], write)
+            stream, position = self.service.stream(job["id"]), 0
+            while True:
+                events, closed = stream.read(position, SSE_KEEPALIVE_SEC)
+                for event, data in events:
+                    write(event, data)
+                position += len(events)
+                if closed:
+                    break
+                if not events:
+                    # Job atendido por otro proceso: su stream no llega aquí, se sirve desde la cola al terminar
+                    if self.service.queue.get(job["id"], with_result=False)["status"] in ("done", "failed"):
+                        return self._sse_from_store(job["id"], write)
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _sse_from_store(self, job_id: str, write):
+        """Job ya terminado sin stream en memoria (reinicio u otro proceso): el artículo en un solo evento."""
+        job = self.service.queue.get(job_id)
+        content = (job.get("result") or {}).get("content")
+        if content:
+            write("reset", "")
+            write("delta", content)
+        write("done", {"status": job["status"], **({"error": job["error"]} if job["error"] else {})})
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int, host: str = "127.0.0.1", workers: int = 4, queue_path: str = DEFAULT_QUEUE_PATH) -> ThreadingHTTPServer:
+    """Arranca workers y servidor HTTP (en un hilo); devuelve el servidor."""
+    service = JobService(JobQueue(queue_path), workers)
+    service.start()
+    handler = type("BoundApiHandler", (ApiHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, name="api-server", daemon=True).start()
+    return server
+
+# =====================
+# CLI
+# =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP con cola de jobs para research y redacción")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--workers", type=int, default=4, help="Jobs en paralelo")
+    parser.add_argument("--db", default=DEFAULT_QUEUE_PATH, help="Archivo SQLite de la cola")
+    parser.add_argument("--secrets", help="Leer credenciales de un secrets.toml de Streamlit")
+    args = parser.parse_args(argv)
+
+    seo_pipeline.configure(**load_secrets(args.secrets))
+    server = serve(args.port, args.host, args.workers, args.db)
+    print(f"API en http://{args.host}:{args.port} ({args.workers} workers, cola {args.db})", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.service.stop()
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,53 @@
-import os, time, json
-import requests
+import os, time, json, uuid, functools, tempfile
 import streamlit as st
-from typing import Dict, Any, List
+from html import escape
+from typing import Dict, Any, List, Callable
+
+from serp_archive import get_archive
+from project_store import get_store, BLOB_FIELDS
+from rate_limit import configure_limits, limiter_metrics
+from deadline import breaker_states
+from cassette import use_cassette
+from telemetry import start_trace, stage_summary, prometheus_text, otlp_json, start_metrics_server
+from seo_pipeline import (
+    configure as configure_pipeline, get_structure_options, analyze_competitors,
+    generate_content_strategy, generate_content_with_openai, cached_research,
+)
+from profiling import RerunProfiler, record_rerun, rerun_summary
+from token_budget import estimate_output_tokens, model_limits, usage_report
+from model_router import AUTO_MODEL, MODEL_OPTIONS, LATENCY_TARGET_SEC, get_model_stats, route, describe
+from speculative import get_speculator, SPECULATIVE_TOKEN_BUDGET
+from seo_quality import analyze as analyze_quality
+from article_export import write_zip, project_articles
 
 # =====================
 # Configuración básica
 # =====================
 st.set_page_config(page_title="SEO Agent - Redactor", page_icon="🔎", layout="wide")
+
+# =====================
+# Profiling de reruns (opt-in: ?profile=cprofile|sample o secret PROFILE_RERUNS)
+# =====================
+PROFILE_MODE = st.query_params.get("profile") or st.secrets.get("PROFILE_RERUNS", os.getenv("PROFILE_RERUNS", ""))
+if str(PROFILE_MODE).lower() in ("", "0", "false", "off"):
+    PROFILE_MODE = ""
+
+def finish_rerun_profile(interrupted: bool = False):
+    """Cierra la medición del rerun (el anterior, si terminó con st.rerun()/st.stop())."""
+    started = st.session_state.pop("_rerun_started", None)
+    profiler = st.session_state.pop("_rerun_profiler", None)
+    if profiler is not None:
+        result = profiler.stop(interrupted=interrupted)
+        st.session_state.last_profile = result
+        record_rerun(profiler.label, result["wall_ms"])
+    elif started is not None:
+        record_rerun(started[1], (time.perf_counter() - started[0]) * 1000)
+
+finish_rerun_profile(interrupted=True)
+_rerun_label = f"paso {st.session_state.get('step', 1)}"
+st.session_state._rerun_started = (time.perf_counter(), _rerun_label)
+if PROFILE_MODE:
+    st.session_state._rerun_profiler = RerunProfiler(str(PROFILE_MODE).lower(), label=_rerun_label).start()
 st.title("SEO Agent")
 st.caption("Tu asistente para crear contenido SEO optimizado (Streamlit + DataForSEO + OpenAI)")
 
@@ -16,8 +57,60 @@ st.caption("Tu asistente para crear contenido SEO optimizado (Streamlit + DataFo
 DATAFORSEO_LOGIN = st.secrets.get("DATAFORSEO_LOGIN", os.getenv("DATAFORSEO_LOGIN", ""))
 DATAFORSEO_PASSWORD = st.secrets.get("DATAFORSEO_PASSWORD", os.getenv("DATAFORSEO_PASSWORD", ""))
 OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY", ""))
-# Límite de resultados a mostrar en la vista tipo SERP
-SERP_RESULTS_LIMIT = 5
+# Cassette HTTP: grabar (record) o reproducir (replay) los intercambios con las APIs
+HTTP_CASSETTE_MODE = st.secrets.get("HTTP_CASSETTE_MODE", os.getenv("HTTP_CASSETTE_MODE", ""))
+HTTP_CASSETTE_PATH = st.secrets.get("HTTP_CASSETTE_PATH", os.getenv("HTTP_CASSETTE_PATH", ""))
+HTTP_CASSETTE_SPEED = float(st.secrets.get("HTTP_CASSETTE_SPEED", os.getenv("HTTP_CASSETTE_SPEED", "1")))
+# Demo sin credenciales: si existe este cassette se reproduce (parsing real, sin red)
+DEMO_CASSETTE = st.secrets.get("DEMO_CASSETTE", os.getenv("DEMO_CASSETTE", os.path.join("data", "demo_cassette.jsonl.gz")))
+if not HTTP_CASSETTE_MODE and not DATAFORSEO_LOGIN and not OPENAI_API_KEY and os.path.exists(DEMO_CASSETTE):
+    HTTP_CASSETTE_MODE, HTTP_CASSETTE_PATH = "replay", DEMO_CASSETTE
+cassette = None
+if HTTP_CASSETTE_MODE and HTTP_CASSETTE_PATH:
+    cassette = use_cassette(HTTP_CASSETTE_PATH, HTTP_CASSETTE_MODE, HTTP_CASSETTE_SPEED)
+if cassette and cassette.mode == "replay":
+    # En replay no se usan las credenciales; basta con que el pipeline tome el camino real
+    recorded = " ".join(cassette.endpoints())
+    if not DATAFORSEO_LOGIN and "/v3/" in recorded:
+        DATAFORSEO_LOGIN = DATAFORSEO_PASSWORD = "replay"
+    if not OPENAI_API_KEY and "/chat/completions" in recorded:
+        OPENAI_API_KEY = "replay"
+    st.caption(f"▶️ Reproduciendo respuestas grabadas ({os.path.basename(HTTP_CASSETTE_PATH)}), sin llamadas a las APIs.")
+# Archivo histórico de SERPs (SQLite)
+SERP_ARCHIVE_PATH = st.secrets.get("SERP_ARCHIVE_PATH", os.getenv("SERP_ARCHIVE_PATH", os.path.join("data", "serp_archive.sqlite3")))
+# Proyectos persistentes (SQLite)
+PROJECT_STORE_PATH = st.secrets.get("PROJECT_STORE_PATH", os.getenv("PROJECT_STORE_PATH", os.path.join("data", "projects.sqlite3")))
+# Proyectos que entran en el ZIP del sidebar (para más, `python article_export.py projects`)
+EXPORT_PROJECTS_LIMIT = 50
+# Historial de latencia/tokens por modelo para la opción "Auto" del paso 2
+MODEL_STATS_PATH = st.secrets.get("MODEL_STATS_PATH", os.getenv("MODEL_STATS_PATH", os.path.join("data", "model_stats.sqlite3")))
+LATENCY_TARGET = float(st.secrets.get("LATENCY_TARGET_SEC", os.getenv("LATENCY_TARGET_SEC", LATENCY_TARGET_SEC)))
+# Tope de tokens por hora para borradores especulativos (0 = desactivado)
+SPECULATIVE_BUDGET = int(st.secrets.get("SPECULATIVE_TOKEN_BUDGET", os.getenv("SPECULATIVE_TOKEN_BUDGET", SPECULATIVE_TOKEN_BUDGET)))
+# Presupuesto total (segundos) de un research del paso 1
+RESEARCH_BUDGET_SEC = int(st.secrets.get("RESEARCH_BUDGET_SEC", os.getenv("RESEARCH_BUDGET_SEC", "120")))
+# Research guardado (watchlist o anterior) que el paso 1 sirve sin repetir, en horas (0 = nunca)
+RESEARCH_CACHE_MAX_AGE_HOURS = float(st.secrets.get("RESEARCH_CACHE_MAX_AGE_HOURS", os.getenv("RESEARCH_CACHE_MAX_AGE_HOURS", "48")))
+configure_pipeline(
+    DATAFORSEO_LOGIN=DATAFORSEO_LOGIN,
+    DATAFORSEO_PASSWORD=DATAFORSEO_PASSWORD,
+    OPENAI_API_KEY=OPENAI_API_KEY,
+    DATAFORSEO_API_URL=st.secrets.get("DATAFORSEO_API_URL", os.getenv("DATAFORSEO_API_URL", "https://api.dataforseo.com")),
+    OPENAI_BASE_URL=st.secrets.get("OPENAI_BASE_URL", os.getenv("OPENAI_BASE_URL", "")),
+    SERP_ARCHIVE_PATH=SERP_ARCHIVE_PATH,
+    RESEARCH_BUDGET_SEC=RESEARCH_BUDGET_SEC,
+    RESEARCH_CACHE_MAX_AGE_HOURS=RESEARCH_CACHE_MAX_AGE_HOURS,
+    MODEL_STATS_PATH=MODEL_STATS_PATH,
+)
+# Puerto local opcional para /metrics (Prometheus) y /traces (OTLP JSON)
+METRICS_PORT = st.secrets.get("METRICS_PORT", os.getenv("METRICS_PORT", ""))
+if METRICS_PORT:
+    try:
+        start_metrics_server(int(METRICS_PORT))
+    except OSError:
+        pass  # Otro proceso ya sirve las métricas en ese puerto
+# Límites por familia de endpoints, p.ej. [RATE_LIMITS.openai] rps = 3, max_in_flight = 4
+configure_limits({family: dict(cfg) for family, cfg in st.secrets.get("RATE_LIMITS", {}).items()})
 
 # =====================
 # Estado (equivalente a useState)
@@ -41,6 +134,9 @@ if "inputs" not in st.session_state:
     }
 if "selected_structure" not in st.session_state: st.session_state.selected_structure = None
 if "final_md" not in st.session_state: st.session_state.final_md = ""
+# Identifica el borrador especulativo de esta sesión
+if "spec_session" not in st.session_state: st.session_state.spec_session = uuid.uuid4().hex
+speculator = get_speculator(SPECULATIVE_BUDGET)
 
 # =====================
 # FUNCIONES DE NAVEGACIÓN
@@ -128,399 +224,106 @@ def can_advance_to_next_step() -> tuple[bool, str]:
     return True, ""
 
 # =====================
-# Utilidades
-# =====================
-def get_structure_options(kw: str, strategy: Dict = None) -> List[Dict[str, Any]]:
-    """Genera estructuras, opcionalmente optimizadas con strategy"""
-    
-    # Estructuras base
-    base_structures = [
-        {
-            "id": 1,
-            "name": "Estructura Educativa",
-            "headers": [
-                f"Introducción: ¿Qué es {kw}?",
-                f"Por qué es importante {kw}",
-                "Guía paso a paso",
-                "Errores comunes a evitar",
-                "Herramientas recomendadas",
-                "Casos de éxito",
-                "Conclusión y próximos pasos",
-            ],
-        },
-        {
-            "id": 2,
-            "name": "Estructura Comercial",
-            "headers": [
-                f"El problema con {kw}",
-                "La solución definitiva",
-                "Beneficios comprobados",
-                "Cómo empezar hoy mismo",
-                "Preguntas frecuentes",
-                "Testimonios y casos",
-                "Llamada a la acción",
-            ],
-        },
-        {
-            "id": 3,
-            "name": "Estructura Comparativa",
-            "headers": [
-                f"Introducción a {kw}",
-                "Método tradicional vs método moderno",
-                "Ventajas y desventajas",
-                "Cuál elegir según tu situación",
-                "Implementación práctica",
-                "Resultados esperados",
-                "Recomendación final",
-            ],
-        },
-    ]
-    
-    # Si tenemos estrategia, agregamos estructura optimizada
-    if strategy and strategy.get("suggested_headers"):
-        optimized_structure = {
-            "id": 4,
-            "name": "🎯 Estructura Optimizada (Basada en Competencia)",
-            "headers": strategy["suggested_headers"],
-            "optimized": True
-        }
-        base_structures.append(optimized_structure)
-    
-    return base_structures
-
-# =====================
-# DataForSEO helpers
-# =====================
-def _dfs_auth_header():
-    """Cabecera Authorization: Basic user:password (base64)."""
-    import base64
-    token = base64.b64encode(f"{DATAFORSEO_LOGIN}:{DATAFORSEO_PASSWORD}".encode()).decode()
-    return {"Authorization": "Basic " + token}
-
-def dataforseo_create_task(keyword: str, location_name: str = "Peru", device: str = "desktop", depth: int = 20) -> str:
-    """Crea una tarea SERP en DataForSEO y devuelve task_id."""
-    url = "https://api.dataforseo.com/v3/serp/google/organic/task_post"
-    payload = [{
-        "keyword": keyword,
-        "language_code": "es",
-        "location_name": location_name,
-        "device": device,
-        "depth": depth
-    }]
-    headers = _dfs_auth_header()
-    headers["Content-Type"] = "application/json"
-
-    r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-    r.raise_for_status()
-    j = r.json()
-    return j["tasks"][0]["id"]
-
-def dataforseo_get_results(task_id: str, max_wait_sec: int = 90) -> Dict[str, Any]:
-    """Espera a que la tarea esté lista y obtiene resultados."""
-    start = time.time()
-    headers = _dfs_auth_header()
-
-    # Esperar a que la tarea aparezca en tasks_ready
-    ready_url = "https://api.dataforseo.com/v3/serp/google/organic/tasks_ready"
-    while True:
-        r = requests.get(ready_url, headers=headers, timeout=60)
-        r.raise_for_status()
-        jr = r.json()
-
-        if any(t.get("id") == task_id for t in jr.get("tasks", [])):
-            break
-        if time.time() - start > max_wait_sec:
-            break
-        time.sleep(2)
-
-    # Obtener resultados
-    get_url = f"https://api.dataforseo.com/v3/serp/google/organic/task_get/{task_id}"
-    while True:
-        r = requests.get(get_url, headers=headers, timeout=60)
-        if r.status_code == 404:
-            if time.time() - start > max_wait_sec:
-                return {"raw": {"note": "timeout waiting for task_get"}, "items": []}
-            time.sleep(2)
-            continue
-
-        r.raise_for_status()
-        j = r.json()
-        try:
-            items = j["tasks"][0]["result"][0]["items"]
-        except Exception:
-            items = []
-        return {"raw": j, "items": items}
-
-def dataforseo_serp_live(keyword: str, location_name: str = "Peru", device: str = "desktop", depth: int = 20):
-    """Fallback a endpoint LIVE (sin polling)."""
-    url = "https://api.dataforseo.com/v3/serp/google/organic/live/advanced"
-    payload = [{
-        "keyword": keyword,
-        "language_code": "es",
-        "location_name": location_name,
-        "device": device,
-        "depth": depth
-    }]
-    headers = _dfs_auth_header()
-    headers["Content-Type"] = "application/json"
-    r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=90)
-    r.raise_for_status()
-    j = r.json()
-    try:
-        return j["tasks"][0]["result"][0]["items"], j
-    except Exception:
-        return [], j
-
-# =====================
-# CONTENT ANALYSIS - NUEVO
+# Proyectos persistentes
 # =====================
-def analyze_competitor_content(url: str) -> Dict[str, Any]:
-    """
-    Analiza contenido real de una URL con DataForSEO Content Analysis
-    Usando el endpoint CORRECTO según documentación oficial
-    """
-    if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
-        # Fallback demo con datos más realistas
-        import random
-        return {
-            "url": url,
-            "word_count": random.randint(1800, 3200),
-            "headers": {
-                "h1": 1,
-                "h2": random.randint(8, 15),
-                "h3": random.randint(5, 12),
-                "total": random.randint(14, 28)
-            },
-            "title": f"Análisis demo para {url[:50]}...",
-            "meta_description": "Meta description extraída (demo)",
-            "status": "demo"
-        }
-    
+# Blobs que necesita cada paso (el resto se carga cuando se visita su paso)
+STEP_BLOBS = {
+    1: ("competitor_data", "content_strategy"),
+    2: ("content_strategy",),
+    # El borrador especulativo del paso 3 usa el research: sin él, su clave no coincide en el paso 4
+    3: ("competitor_data", "content_strategy"),
+    4: BLOB_FIELDS,
+}
+
+def save_project(**fields):
+    """Escritura incremental del proyecto actual (lo crea si aún no existe)."""
     try:
-        headers = _dfs_auth_header()
-        headers["Content-Type"] = "application/json"
-        
-        # ENDPOINT CORRECTO según documentación oficial
-        live_url = "https://api.dataforseo.com/v3/on_page/content_parsing/live"
-        
-        # Payload según documentación oficial
-        task_data = [{
-            "url": url
-        }]
-        
-        # Usar método LIVE (sin polling, respuesta inmediata)
-        response = requests.post(live_url, headers=headers, data=json.dumps(task_data), timeout=60)
-        response.raise_for_status()
-        
-        result_data = response.json()
-        
-        # Verificar estructura de respuesta
-        if not result_data.get("tasks") or len(result_data["tasks"]) == 0:
-            raise Exception("No se recibieron tareas en la respuesta")
-            
-        task = result_data["tasks"][0]
-        
-        if task.get("status_code") != 20000:
-            raise Exception(f"Error en tarea: {task.get('status_message', 'Unknown error')}")
-        
-        if not task.get("result") or len(task["result"]) == 0:
-            raise Exception("No se recibieron resultados")
-        
-        # Procesar resultado según estructura de documentación
-        result = task["result"][0]
-        
-        # Verificar si hay items
-        if not result.get("items") or len(result["items"]) == 0:
-            raise Exception("No se encontraron items en el resultado")
-        
-        item = result["items"][0]
-        
-        # Extraer page_content según documentación
-        page_content = item.get("page_content", {})
-        
-        # Extraer métricas principales
-        header_info = page_content.get("header", {})
-        primary_content = header_info.get("primary_content", [])
-        
-        # Contar headers manualmente del contenido
-        h1_count = 0
-        h2_count = 0
-        h3_count = 0
-        total_text = ""
-        
-        for content_item in primary_content:
-            text = content_item.get("text", "")
-            total_text += " " + text
-            
-            # Detectar headers por estructura (esto es aproximado)
-            if content_item.get("type") == "header" or any(h in text.lower() for h in ["h1", "h2", "h3"]):
-                if len(text) < 100:  # Headers suelen ser cortos
-                    if any(keyword in text.lower() for keyword in ["introducción", "qué es", "cómo"]):
-                        h2_count += 1
-                    elif any(keyword in text.lower() for keyword in ["paso", "ejemplo", "punto"]):
-                        h3_count += 1
-                    else:
-                        h2_count += 1
-        
-        # Contar palabras del texto total
-        word_count = len(total_text.split()) if total_text else 0
-        
-        # Extraer title y meta
-        title = item.get("title", "") or header_info.get("title", "")
-        meta_description = item.get("meta_description", "") or page_content.get("meta", {}).get("description", "")
-        
-        return {
-            "url": url,
-            "word_count": max(word_count, 500),  # Mínimo realista
-            "headers": {
-                "h1": 1,  # Asumimos siempre hay 1 H1
-                "h2": max(h2_count, 5),  # Mínimo realista
-                "h3": max(h3_count, 3),  # Mínimo realista
-                "total": max(h1_count + h2_count + h3_count, 9)
-            },
-            "title": title,
-            "meta_description": meta_description,
-            "status": "success"
-        }
-        
-    except requests.exceptions.RequestException as e:
-        # Error de conexión/HTTP
-        return create_intelligent_fallback(url, f"connection_error: {str(e)}")
-        
+        store = get_store(PROJECT_STORE_PATH)
+        if not st.session_state.get("project_id"):
+            st.session_state.project_id = store.create_project(st.session_state.keyword)
+            st.query_params["project"] = st.session_state.project_id
+        store.save(st.session_state.project_id, **fields)
+        # Un blob guardado como None se borró: ya no hay nada pendiente que cargar
+        pending = st.session_state.get("pending_blobs") or set()
+        for name in BLOB_FIELDS:
+            if name in fields and fields[name] is None:
+                pending.discard(name)
+        if "step" in fields:
+            st.session_state.saved_step = fields["step"]
     except Exception as e:
-        # Cualquier otro error
-        return create_intelligent_fallback(url, f"processing_error: {str(e)}")
-
-def create_intelligent_fallback(url: str, error_msg: str) -> Dict[str, Any]:
-    """
-    Crear fallback inteligente basado en análisis de URL
-    """
-    import random
-    from urllib.parse import urlparse
-    
-    parsed = urlparse(url)
-    domain = parsed.netloc
-    path = parsed.path.lower()
-    
-    # Métricas más realistas según tipo de sitio
-    if any(edu in domain for edu in ['edu', 'university', 'college']):
-        # Sitios educativos tienden a ser más largos
-        base_words = random.randint(2200, 3800)
-        base_h2 = random.randint(10, 16)
-    elif any(blog in path for blog in ['blog', 'article', 'post', 'guia']):
-        # Blogs/artículos tienden a ser medios-largos
-        base_words = random.randint(1800, 3200)
-        base_h2 = random.randint(8, 14)
-    elif any(info in path for info in ['carrera', 'programa', 'curso']):
-        # Páginas de carreras/programas
-        base_words = random.randint(1500, 2800)
-        base_h2 = random.randint(7, 12)
-    else:
-        # Páginas comerciales más concisas
-        base_words = random.randint(1200, 2200)
-        base_h2 = random.randint(6, 12)
-    
-    base_h3 = random.randint(base_h2//2, base_h2)
-    
-    return {
-        "url": url,
-        "word_count": base_words,
-        "headers": {
-            "h1": 1,
-            "h2": base_h2,
-            "h3": base_h3,
-            "total": base_h2 + base_h3 + 1
-        },
-        "title": f"Análisis estimado para {domain}",
-        "meta_description": "",
-        "status": f"fallback_inteligente: {error_msg[:100]}"
-    }
-
-def generate_content_strategy(competitor_analyses: List[Dict], keyword: str) -> Dict[str, Any]:
-    """
-    Genera estrategia de contenido basada en análisis de competidores
-    """
-    if not competitor_analyses:
-        return {}
-    
-    # Análisis de métricas
-    word_counts = [comp.get("word_count", 0) for comp in competitor_analyses if comp.get("word_count")]
-    h2_counts = [comp.get("headers", {}).get("h2", 0) for comp in competitor_analyses]
-    h3_counts = [comp.get("headers", {}).get("h3", 0) for comp in competitor_analyses]
-    
-    # Calcular recomendaciones
-    avg_words = sum(word_counts) // len(word_counts) if word_counts else 2000
-    min_words = min(word_counts) if word_counts else 1500
-    max_words = max(word_counts) if word_counts else 2500
-    
-    avg_h2 = sum(h2_counts) // len(h2_counts) if h2_counts else 8
-    avg_h3 = sum(h3_counts) // len(h3_counts) if h3_counts else 5
-    
-    # Generar headers sugeridos basados en patrones comunes
-    suggested_headers = [
-        f"¿Qué es {keyword}? Guía completa 2025",
-        f"Beneficios principales de {keyword}",
-        f"Cómo implementar {keyword} paso a paso",
-        f"Errores comunes con {keyword} (y cómo evitarlos)",
-        f"Mejores herramientas para {keyword}",
-        f"{keyword} vs alternativas: comparación detallada",
-        f"Casos de éxito reales con {keyword}",
-        f"Preguntas frecuentes sobre {keyword}",
-        f"Conclusión: el futuro de {keyword}",
-    ]
-    
-    # Ajustar cantidad de headers basado en competencia
-    target_headers = min(max(avg_h2 + 1, 8), 15)
-    suggested_headers = suggested_headers[:target_headers]
-    
-    return {
-        "recommended_word_count": {
-            "min": max(min_words - 200, 800),
-            "optimal": min(avg_words + 300, 4000),
-            "max": max_words + 500
-        },
-        "recommended_headers": {
-            "h2_count": avg_h2 + 1,
-            "h3_count": avg_h3 + 2,
-            "total": avg_h2 + avg_h3 + 3
-        },
-        "suggested_headers": suggested_headers,
-        "competitor_insights": [
-            f"Promedio de palabras en top 3: {avg_words:,}",
-            f"Headers H2 promedio: {avg_h2}",
-            f"Rango de extensión: {min_words:,} - {max_words:,} palabras",
-            f"Tu oportunidad: crear contenido de {avg_words + 300:,} palabras con {avg_h2 + 1} secciones principales"
-        ],
-        "keywords_opportunities": [
-            f"{keyword} en Perú",
-            f"guía {keyword}",
-            f"tutorial {keyword}",
-            f"ejemplos {keyword}",
-            f"{keyword} 2025"
-        ]
-    }
+        st.warning(f"No se pudo guardar el proyecto: {e}")
+
+def resume_project(project_id: str) -> bool:
+    """Restaura un proyecto guardado; los blobs quedan pendientes hasta que un paso los use."""
+    meta = get_store(PROJECT_STORE_PATH).load_meta(project_id)
+    if not meta:
+        return False
+    st.session_state.project_id = meta["id"]
+    st.session_state.keyword = meta["keyword"]
+    st.session_state.step = meta["step"]
+    st.session_state.saved_step = meta["step"]
+    if meta["inputs"]:
+        st.session_state.inputs = {**st.session_state.inputs, **meta["inputs"]}
+    st.session_state.selected_structure = meta["selected_structure"]
+    st.session_state.competitor_data = None
+    st.session_state.content_strategy = None
+    st.session_state.final_md = ""
+    st.session_state.pending_blobs = set(meta["blobs"])
+    st.query_params["project"] = meta["id"]
+    return True
+
+def hydrate_project_state():
+    """Carga los blobs pendientes que necesita el paso actual y persiste cambios de paso."""
+    project_id = st.session_state.get("project_id")
+    if not project_id:
+        return
+    pending = st.session_state.get("pending_blobs") or set()
+    for name in STEP_BLOBS.get(st.session_state.step, ()):
+        if name in pending:
+            value = get_store(PROJECT_STORE_PATH).load_blob(project_id, name)
+            # final_md se usa siempre como texto ("" = aún sin redactar)
+            st.session_state[name] = "" if value is None and name == "final_md" else value
+            pending.discard(name)
+    if st.session_state.step != st.session_state.get("saved_step"):
+        save_project(step=st.session_state.step)
+
+def render_projects_sidebar():
+    """Lista de proyectos guardados para retomar."""
+    with st.sidebar:
+        st.markdown("### 📁 Proyectos")
+        if st.session_state.get("project_id"):
+            st.caption(f"Proyecto actual: `{st.session_state.project_id}`")
+        try:
+            projects = get_store(PROJECT_STORE_PATH).list_projects(limit=15)
+        except Exception as e:
+            st.warning(f"No se pudo leer proyectos: {e}")
+            return
+        if not projects:
+            st.write("Aún no hay proyectos guardados.")
+        for p in projects:
+            label = f"{p['keyword'] or 'Sin keyword'} — paso {p['step']}"
+            if p["title"]:
+                label += f" · {p['title'][:30]}"
+            if st.button(label, key=f"project_{p['id']}", use_container_width=True,
+                         disabled=p["id"] == st.session_state.get("project_id"),
+                         help=f"Actualizado {time.strftime('%Y-%m-%d %H:%M', time.localtime(p['updated_at']))}"):
+                resume_project(p["id"])
+                st.rerun()
+        if projects:
+            with st.expander("📦 Exportar proyectos"):
+                include_docx = st.checkbox("Incluir .docx", key="export_docx")
+                formats = ["md", "html", "json"] + (["docx"] if include_docx else [])
+                st.download_button(
+                    "⬇️ Proyectos redactados (.zip)",
+                    data=zip_download_data(lambda: project_articles(limit=EXPORT_PROJECTS_LIMIT, store_path=PROJECT_STORE_PATH), formats),
+                    file_name=f"proyectos-{time.strftime('%Y%m%d-%H%M')}.zip", mime="application/zip",
+                    help=f"Markdown, HTML y JSON con el research de los últimos {EXPORT_PROJECTS_LIMIT} proyectos con artículo. "
+                         "Para lotes grandes: python article_export.py"
+                )
 
 # =====================
-# SERP helpers
+# Vista SERP
 # =====================
-def build_serp_items(items, max_items=10):
-    """Devuelve filas {pos, title, url} priorizando orgánicos."""
-    if not items:
-        return []
-    organic = [it for it in items if it.get("type") == "organic" and it.get("url")]
-    fallback = [it for it in items if it.get("url")]
-    picked = organic or fallback
-    picked = sorted(picked, key=lambda it: it.get("rank_group") or it.get("rank_absolute") or 9999)[:max_items]
-    
-    rows = []
-    for it in picked:
-        rows.append({
-            "pos": it.get("rank_group") or it.get("rank_absolute") or "",
-            "title": it.get("title") or it.get("url"),
-            "url": it.get("url")
-        })
-    return rows
-
 def render_serp_cards(rows, header="Vista general del SERP"):
     """Dibuja tarjetas estilo SERP."""
     if not rows:
@@ -549,236 +352,96 @@ def render_serp_cards(rows, header="Vista general del SERP"):
 </div>
         """, unsafe_allow_html=True)
 
-# =====================
-# Análisis de competidores MEJORADO
-# =====================
-def analyze_competitors(keyword: str) -> Dict[str, Any]:
-    """
-    Analiza competencia con DataForSEO SERP + Content Analysis
-    """
-    # Demo si no hay credenciales
-    if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
-        demo_comp = [
-            {"url": "https://competitor1.com", "title": f"Guía completa de {keyword}", "wordCount": 2500, "headers": 8},
-            {"url": "https://competitor2.com", "title": f"Todo sobre {keyword}", "wordCount": 1800, "headers": 6},
-            {"url": "https://competitor3.com", "title": f"{keyword}: Manual definitivo", "wordCount": 3200, "headers": 12},
-        ]
-        serp_list = [{"pos": i+1, "title": c["title"], "url": c["url"]} for i, c in enumerate(demo_comp)]
-        return {
-            "competitors": demo_comp,
-            "content_analyses": [],
-            "insights": [
-                "Promedio de palabras: 2,500",
-                "Headers promedio: 8-12",
-                "Enfoque principal: Guías completas",
-                "Tono dominante: Profesional-educativo",
-            ],
-            "top_organic": [demo_comp[0]],
-            "first_org_rank": 1,
-            "serp_list": serp_list,
-            "serp_raw": {},
-        }
-
-    # Análisis SERP
-    task_id = dataforseo_create_task(keyword=keyword, location_name="Peru", device="desktop", depth=20)
-    res_async = dataforseo_get_results(task_id, max_wait_sec=90)
-    items = res_async.get("items") or []
-
-    # Fallback a LIVE si no obtuvimos nada útil
-    live_json = None
-    if not items:
-        items, live_json = dataforseo_serp_live(keyword=keyword, location_name="Peru", device="desktop", depth=20)
-
-    # Obtener top 3 orgánicos
-    organic = [it for it in items if it.get("type") == "organic" and it.get("url")]
-    any_with_url = [it for it in items if it.get("url")]
-    picked = organic[:3] if organic else any_with_url[:3]
-    
-    competitors = []
-    content_analyses = []
-    
-    # Analizar contenido de cada competidor
-    for it in picked:
-        url = it["url"]
-        title = it.get("title") or url
-        
-        # Análisis básico para compatibilidad
-        competitor = {
-            "url": url,
-            "title": title,
-            "wordCount": 2000,  # placeholder inicial
-            "headers": 8        # placeholder inicial
-        }
-        competitors.append(competitor)
-        
-        # Análisis de contenido real (si está disponible)
-        try:
-            content_analysis = analyze_competitor_content(url)
-            content_analyses.append(content_analysis)
-            
-            # Actualizar datos del competidor con análisis real
-            competitor["wordCount"] = content_analysis.get("word_count", 2000)
-            competitor["headers"] = content_analysis.get("headers", {}).get("total", 8)
-            competitor["real_title"] = content_analysis.get("title", title)
-            competitor["analysis_status"] = content_analysis.get("status", "unknown")
-            
-        except Exception as e:
-            st.warning(f"No se pudo analizar contenido de {url}: {str(e)}")
-            content_analyses.append({
-                "url": url,
-                "status": f"error: {str(e)}",
-                "word_count": 2000,
-                "headers": {"total": 8}
-            })
-
-    # Resto del análisis SERP (igual que antes)
-    first_org_rank = None
-    if organic:
-        ranks = [it.get("rank_group") for it in organic if isinstance(it.get("rank_group"), int)]
-        first_org_rank = min(ranks) if ranks else None
-        
-    top_organic = []
-    if first_org_rank is not None:
-        top_organic = [{
-            "url": it["url"],
-            "title": it.get("title") or it["url"],
-            "rank": it.get("rank_group")
-        } for it in organic if it.get("rank_group") == first_org_rank]
-
-    serp_list = build_serp_items(items, max_items=SERP_RESULTS_LIMIT)
-
-    # Insights mejorados con datos reales
-    real_word_counts = [ca.get("word_count", 0) for ca in content_analyses if ca.get("word_count", 0) > 0]
-    avg_words = sum(real_word_counts) // len(real_word_counts) if real_word_counts else 2000
-
-    insights = [
-        f"Total items leídos: {len(items)}",
-        f"Orgánicos detectados: {len(organic)}",
-        f"Análisis de contenido completados: {len([ca for ca in content_analyses if ca.get('status') != 'error'])}",
-        f"Promedio de palabras (análisis real): {avg_words:,}" if real_word_counts else "Promedio de palabras: ~2,000 (estimado)",
-        "Enfoque principal: Guías informativas",
-    ]
-
-    serp_raw = res_async.get("raw") if res_async.get("raw") else (live_json or {})
-    
-    return {
-        "competitors": competitors,
-        "content_analyses": content_analyses,
-        "insights": insights,
-        "top_organic": top_organic,
-        "first_org_rank": first_org_rank,
-        "serp_list": serp_list,
-        "serp_raw": serp_raw
-    }
+def render_waterfall(rows: List[Dict[str, Any]]):
+    """Cascada de tiempos por etapa (barras HTML proporcionales a la traza)."""
+    if not rows:
+        return
+    total = max((r["offset_ms"] + r["duration_ms"]) for r in rows) or 1.0
+    html = []
+    for r in rows:
+        left = r["offset_ms"] / total * 100
+        width = max(r["duration_ms"] / total * 100, 0.5)
+        color = "#ef4444" if r.get("error") else ("#9ca3af" if r["depth"] < 0 else "#3b82f6")
+        # Nombres y atributos vienen de las trazas (URLs, keywords): se escapan antes de ir al HTML
+        extra = " · ".join(f"{k}={escape(str(r[k]))}" for k in ("bytes", "total_tokens", "cached_tokens", "iteration", "url") if r.get(k))
+        html.append(
+            f"<div style='display:flex;align-items:center;font-size:12px;margin:2px 0;'>"
+            f"<div style='width:34%;padding-left:{max(r['depth'], 0) * 12}px;overflow:hidden;white-space:nowrap;'>{escape(str(r['stage']))}</div>"
+            f"<div style='width:50%;position:relative;height:14px;background:#f3f4f6;'>"
+            f"<div style='position:absolute;left:{left:.2f}%;width:{width:.2f}%;height:14px;background:{color};'></div></div>"
+            f"<div style='width:16%;text-align:right;'>{r['duration_ms']:,.0f} ms</div></div>"
+            + (f"<div style='font-size:11px;color:#6b7280;margin-left:{max(r['depth'], 0) * 12}px;'>{extra}</div>" if extra else "")
+        )
+    st.markdown("".join(html), unsafe_allow_html=True)
+
+def render_quality_panel(report: Dict[str, Any]):
+    """Calidad SEO local del artículo: comprobaciones, keywords y longitud por sección."""
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Puntaje", f"{report['score']}/100")
+    target = report["target_words"]
+    col2.metric("Palabras", f"{report['words']:,}", f"{report['words'] - target:+,} vs. objetivo" if target else None)
+    readability = report["readability"]
+    col3.metric("Fernández-Huerta", readability["fernandez_huerta"] if readability["fernandez_huerta"] is not None else "-",
+                readability["label"], delta_color="off")
+    keywords = report["keywords"]
+    if "density_pct" in keywords:
+        col4.metric("Densidad keyword", f"{keywords['density_pct']}%", f"{keywords['count']} apariciones", delta_color="off")
+    for c in report["checks"]:
+        st.write(f"{'✅' if c['ok'] else '⚠️'} **{c['check']}:** {c['detail']}")
+    if keywords["related"]:
+        st.write("**Keywords relacionadas:**")
+        st.dataframe(keywords["related"], use_container_width=True)
+    st.write("**Longitud por sección:**")
+    st.dataframe(report["sections"]["table"], use_container_width=True)
+    st.caption(f"Análisis local en {report['elapsed_ms']} ms ({report['sections_reused']} secciones sin cambios reutilizadas)")
+
+def render_profile_panel(key: str = "debug"):
+    """Perfil del último rerun completo y tiempos de rerun por paso y por fragmento."""
+    summary = rerun_summary()
+    if summary:
+        st.write("**Tiempo de rerun por paso y fragmento (proceso):**")
+        st.dataframe(summary, use_container_width=True)
+    profile = st.session_state.get("last_profile")
+    if not PROFILE_MODE:
+        st.caption("Profiling desactivado: agrega `?profile=cprofile` o `?profile=sample` a la URL.")
+        return
+    if not profile:
+        st.caption("El perfil aparece a partir del siguiente rerun.")
+        return
+    note = " (interrumpido por st.rerun)" if profile["interrupted"] else ""
+    if profile.get("fallback"):
+        note += " — cProfile en uso por otra sesión, se muestreó"
+    st.write(f"**Último rerun ({profile['label']}, {profile['mode']}):** {profile['wall_ms']:,.0f} ms{note}")
+    st.dataframe(profile["top"], use_container_width=True)
+    st.download_button("⬇️ Descargar perfil", data=profile["data"], file_name=profile["file_name"],
+                       mime="application/octet-stream", key=f"download_profile_{key}")
+
+def generation_args(structure: Dict[str, Any]) -> Dict[str, Any]:
+    """Argumentos de la redacción con los inputs actuales (copias: el borrador especulativo corre en otro hilo)."""
+    inputs = dict(st.session_state.inputs)
+    return dict(
+        title=inputs["title"],
+        keyword=st.session_state.keyword,
+        structure=dict(structure),
+        tone=inputs["tone"],
+        word_count=inputs["wordCount"],
+        related_keywords=inputs["relatedKeywords"],
+        competitor_data=st.session_state.competitor_data or {},
+        strategy=st.session_state.content_strategy,
+        model_config=inputs,
+    )
 
-# =====================
-# OpenAI helper MEJORADO
-# =====================
-def generate_content_with_openai(title: str, keyword: str, structure: Dict[str, Any], tone: str, word_count: int, related_keywords: str, competitor_data: Dict[str, Any], strategy: Dict = None) -> str:
+def zip_download_data(articles: Callable[[], Any], formats: List[str]) -> Callable[[], bytes]:
     """
-    Redacta con OpenAI, usando configuración de modelo personalizada
+    Datos diferidos para st.download_button: el ZIP se arma solo al hacer clic
+    (no en cada rerun), artículo por artículo sobre un temporal en disco.
     """
-    # Obtener configuración del modelo desde session_state
-    ai_model = st.session_state.inputs.get("ai_model", "gpt-4o-mini")
-    temperature = st.session_state.inputs.get("temperature", 0.6)
-    max_tokens = st.session_state.inputs.get("max_tokens", 2000)
-    presence_penalty = st.session_state.inputs.get("presence_penalty", 0.0)
-    frequency_penalty = st.session_state.inputs.get("frequency_penalty", 0.1)
-    optimization_mode = st.session_state.inputs.get("optimization_mode", "Balanced")
-    
-    if not OPENAI_API_KEY:
-        headers_list = "\n".join([f"### {h}" for h in structure["headers"]])
-        strategy_info = ""
-        if strategy:
-            strategy_info = f"""
-**Estrategia basada en competencia:**
-- Extensión recomendada: {strategy.get('recommended_word_count', {}).get('optimal', word_count):,} palabras
-- Headers sugeridos: {strategy.get('recommended_headers', {}).get('h2_count', 8)} secciones principales
-- Oportunidades de keywords: {', '.join(strategy.get('keywords_opportunities', [])[:3])}
-"""
-        
-        return f"""# {title}
-
-## Introducción
-Este artículo completo sobre "{keyword}" ha sido desarrollado específicamente para el mercado peruano, considerando las necesidades locales y tendencias actuales.
-
-{headers_list}
-
-**Palabras relacionadas**: {related_keywords}
-**Tono**: {tone} — **Extensión objetivo**: {word_count} palabras
-**Modelo configurado**: {ai_model} (Temperature: {temperature})
-
-{strategy_info}
-
-## Optimización SEO
-- Keyword principal integrada naturalmente
-- Headers optimizados para featured snippets
-- Estructura pensada para engagement
-- Call-to-actions estratégicamente ubicados
-"""
-
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
-
-    competitors_txt = "\n".join([f"- {c.get('title')} ({c.get('url')}) - {c.get('wordCount', 0):,} palabras" for c in (competitor_data or {}).get("competitors", [])])
-    
-    # Información de estrategia para el prompt
-    strategy_prompt = ""
-    if strategy:
-        insights = strategy.get("competitor_insights", [])
-        opportunities = strategy.get("keywords_opportunities", [])
-        strategy_prompt = f"""
-ANÁLISIS DE COMPETENCIA:
-{chr(10).join(insights)}
-
-OPORTUNIDADES DE KEYWORDS: {', '.join(opportunities[:5])}
-EXTENSIÓN OBJETIVO OPTIMIZADA: {strategy.get('recommended_word_count', {}).get('optimal', word_count):,} palabras
-"""
-
-    # Ajustar system prompt según modo de optimización
-    optimization_prompts = {
-        "Balanced": "Eres un redactor SEO senior para el mercado peruano. Redacta en español claro, escaneable, con H2/H3 bien estructurados. Equilibra SEO con legibilidad.",
-        "SEO-Focused": "Eres un especialista SEO para el mercado peruano. Prioriza optimización para motores de búsqueda: densidad de keywords, headers jerárquicos, y estructura para featured snippets.",
-        "Creative": "Eres un redactor creativo especializado en contenido engaging para el mercado peruano. Prioriza storytelling, ejemplos locales, y contenido que genere engagement.",
-        "Technical": "Eres un redactor técnico para el mercado peruano. Enfócate en precisión, datos específicos, y contenido authoritative con ejemplos técnicos detallados."
-    }
-    
-    system = optimization_prompts.get(optimization_mode, optimization_prompts["Balanced"])
-    
-    prompt = f"""
-Genera un artículo **en Markdown** titulado "{title}" para la keyword principal "{keyword}".
-Sigue exactamente estos encabezados:
-{json.dumps(structure["headers"], ensure_ascii=False, indent=2)}
-
-Tono: {tone}. Extensión objetivo: ~{word_count} palabras.
-Incluye naturalmente estas palabras relacionadas: {related_keywords}.
-
-{strategy_prompt}
-
-Referencias competitivas (solo orientación, no copies):
-{competitors_txt}
-
-Requisitos específicos para modo {optimization_mode}:
-- H2/H3 bien jerarquizados
-- Introducción breve y útil
-- Secciones con ejemplos locales (Perú) cuando aplique
-- Conclusión con próximos pasos y CTA
-- No inventes datos sensibles; si no hay certeza, explica alternativas
-- Integra naturalmente las keywords de oportunidad identificadas
-""".strip()
-
-    resp = client.chat.completions.create(
-        model=ai_model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=temperature,
-        max_tokens=max_tokens,
-        presence_penalty=presence_penalty,
-        frequency_penalty=frequency_penalty
-    )
-    return resp.choices[0].message.content
+    def build() -> bytes:
+        with tempfile.TemporaryFile() as f:
+            write_zip(articles(), f, formats)
+            f.seek(0)
+            return f.read()
+    return build
 
 def download_md_button(filename: str, content: str):
     st.download_button(
@@ -789,171 +452,217 @@ def download_md_button(filename: str, content: str):
     )
 
 # =====================
-# UI Principal
-# =====================
-with st.container():
-    render_simple_navigation()
-    
-st.divider()
-
-with st.container():
-    render_navigation_buttons()
-    
-st.divider()
-
-# =====================
-# Paso 1: Research MEJORADO
+# Fragmentos (reruns parciales)
 # =====================
-if st.session_state.step == 1:
-    st.subheader("Paso 1: Research de Competencia")
-    
-    kw = st.text_input("Keyword objetivo", value=st.session_state.keyword,
-                       placeholder="ej: por qué estudiar enfermería")
-    
-    # Opción para análisis profundo
-    deep_analysis = st.checkbox("🔬 Análisis profundo de contenido (usa Content Analysis API)", 
-                               value=True, 
-                               help="Analiza el contenido real de competidores para obtener métricas precisas")
-    
-    go = st.button("🔎 Analizar competencia", type="primary", disabled=not kw.strip())
-
-    if go:
-        st.session_state.keyword = kw.strip()
-        with st.spinner("Analizando competencia y contenido (esto puede tomar 1-2 minutos)..."):
+# Cada pestaña del paso 1 y el formulario del paso 2 son fragmentos: una
+# interacción dentro de ellos re-ejecuta solo ese fragmento, no todo el script.
+def timed_fragment(label: str):
+    """st.fragment que registra su tiempo (como "fragmento <label>") cuando se re-ejecuta solo."""
+    def decorator(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            # Dentro de un rerun completo el tiempo ya cuenta en el del paso
+            if "_rerun_started" in st.session_state:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
             try:
-                st.session_state.competitor_data = analyze_competitors(st.session_state.keyword)
-                
-                # Generar estrategia si tenemos análisis de contenido
-                if st.session_state.competitor_data.get("content_analyses"):
-                    with st.spinner("Generando estrategia de contenido..."):
-                        st.session_state.content_strategy = generate_content_strategy(
-                            st.session_state.competitor_data["content_analyses"], 
-                            st.session_state.keyword
-                        )
-                
-            except Exception as e:
-                st.error(f"Error al analizar competencia: {e}")
+                return func(*args, **kwargs)
+            finally:
+                record_rerun(f"fragmento {label}", (time.perf_counter() - started) * 1000)
+        return st.fragment(run)
+    return decorator
+
+@timed_fragment("competidores")
+def render_competitors_tab():
+    """Pestaña Competidores del paso 1."""
+    st.subheader("Top 3 Competidores Analizados")
+    for i, comp in enumerate(st.session_state.competitor_data["competitors"], 1):
+        with st.expander(f"#{i} - {comp['title'][:60]}..."):
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write(f"**URL:** {comp['url']}")
+                st.write(f"**Palabras:** {comp['wordCount']:,}")
+                st.write(f"**Headers:** {comp['headers']}")
+            with col2:
+                if comp.get("analysis_status"):
+                    if comp["analysis_status"] == "success":
+                        st.success("✅ Análisis completado")
+                    else:
+                        st.warning(f"⚠️ {comp['analysis_status']}")
+                if comp.get("real_title"):
+                    st.write(f"**Título real:** {comp['real_title'][:80]}...")
 
-    # Mostrar resultados si existen
-    if st.session_state.competitor_data:
-        st.success(f"✅ Análisis completado para \"{st.session_state.keyword}\"")
+@timed_fragment("estrategia")
+def render_strategy_tab():
+    """Pestaña Estrategia del paso 1."""
+    if st.session_state.content_strategy:
+        st.subheader("🎯 Estrategia Recomendada")
 
-        # Tabs para organizar información
-        tab1, tab2, tab3, tab4 = st.tabs(["📊 Competidores", "🎯 Estrategia", "📈 SERP", "🔧 Debug"])
-        
-        with tab1:
-            st.subheader("Top 3 Competidores Analizados")
-            for i, comp in enumerate(st.session_state.competitor_data["competitors"], 1):
-                with st.expander(f"#{i} - {comp['title'][:60]}..."):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**URL:** {comp['url']}")
-                        st.write(f"**Palabras:** {comp['wordCount']:,}")
-                        st.write(f"**Headers:** {comp['headers']}")
-                    with col2:
-                        if comp.get("analysis_status"):
-                            if comp["analysis_status"] == "success":
-                                st.success("✅ Análisis completado")
-                            else:
-                                st.warning(f"⚠️ {comp['analysis_status']}")
-                        if comp.get("real_title"):
-                            st.write(f"**Título real:** {comp['real_title'][:80]}...")
+        # Métricas recomendadas
+        col1, col2, col3 = st.columns(3)
+        strategy = st.session_state.content_strategy
 
-        with tab2:
-            if st.session_state.content_strategy:
-                st.subheader("🎯 Estrategia Recomendada")
-                
-                # Métricas recomendadas
-                col1, col2, col3 = st.columns(3)
-                strategy = st.session_state.content_strategy
-                
-                with col1:
-                    rec_words = strategy.get("recommended_word_count", {})
-                    st.metric("Palabras Óptimas", f"{rec_words.get('optimal', 2000):,}", 
-                             f"Rango: {rec_words.get('min', 1500):,}-{rec_words.get('max', 3000):,}")
-                
-                with col2:
-                    rec_headers = strategy.get("recommended_headers", {})
-                    st.metric("Headers H2", rec_headers.get('h2_count', 8), 
-                             f"H3: {rec_headers.get('h3_count', 5)}")
-                
-                with col3:
-                    insights = strategy.get("competitor_insights", [])
-                    if insights:
-                        st.metric("Competidores", "3", "analizados")
-
-                # Insights
-                st.subheader("💡 Insights Clave")
-                for insight in strategy.get("competitor_insights", []):
-                    st.write(f"• {insight}")
-                
-                # Oportunidades de keywords
-                st.subheader("🔑 Oportunidades de Keywords")
-                opportunities = strategy.get("keywords_opportunities", [])
-                if opportunities:
-                    st.write("Considera incluir estas variaciones:")
-                    for opp in opportunities:
-                        st.code(f"• {opp}")
-                
-                # Headers sugeridos
-                st.subheader("📋 Estructura Sugerida")
-                suggested = strategy.get("suggested_headers", [])
-                if suggested:
-                    st.write("Basada en análisis de competencia:")
-                    for i, header in enumerate(suggested, 1):
-                        st.write(f"{i}. {header}")
-            else:
-                st.info("Estrategia se generará automáticamente cuando el análisis de contenido esté disponible")
+        with col1:
+            rec_words = strategy.get("recommended_word_count", {})
+            st.metric("Palabras Óptimas", f"{rec_words.get('optimal', 2000):,}", 
+                     f"Rango: {rec_words.get('min', 1500):,}-{rec_words.get('max', 3000):,}")
 
-        with tab3:
-            # Vista SERP (como antes)
-            serp_rows = st.session_state.competitor_data.get("serp_list") or []
-            if serp_rows:
-                render_serp_cards(serp_rows, header="Vista general del SERP (DataForSEO)")
-
-            # Primer resultado orgánico
-            first_rank = st.session_state.competitor_data.get("first_org_rank")
-            top_org = st.session_state.competitor_data.get("top_organic") or []
-            if first_rank and top_org:
-                enlaces = ", ".join([f"[{c['title']}]({c['url']})" for c in top_org])
-                st.info(f"**Primer resultado orgánico** (posición {first_rank}): {enlaces}")
+        with col2:
+            rec_headers = strategy.get("recommended_headers", {})
+            st.metric("Headers H2", rec_headers.get('h2_count', 8), 
+                     f"H3: {rec_headers.get('h3_count', 5)}")
+
+        with col3:
+            insights = strategy.get("competitor_insights", [])
+            if insights:
+                st.metric("Competidores", "3", "analizados")
+
+        # Insights
+        st.subheader("💡 Insights Clave")
+        for insight in strategy.get("competitor_insights", []):
+            st.write(f"• {insight}")
+
+        # Oportunidades de keywords
+        st.subheader("🔑 Oportunidades de Keywords")
+        opportunities = strategy.get("keywords_opportunities", [])
+        if opportunities:
+            if strategy.get("keywords_source") == "serp":
+                st.write("Búsquedas relacionadas reales del SERP:")
             else:
-                st.warning("No se detectó resultado orgánico en primeras posiciones (posibles AI Overviews, SGE, etc.)")
-
-        with tab4:
-            # Información de debug
-            st.subheader("🔧 Información de Debug")
-            st.write("**Insights básicos:**")
-            for insight in st.session_state.competitor_data["insights"]:
-                st.write(f"• {insight}")
-            
-            # Análisis de contenido detallado
-            content_analyses = st.session_state.competitor_data.get("content_analyses", [])
-            if content_analyses:
-                st.write("**Análisis de contenido detallado:**")
-                for analysis in content_analyses:
-                    with st.expander(f"Análisis: {analysis.get('url', 'Unknown')}"):
-                        st.json(analysis)
-            
-            # Ver respuesta bruta SERP
-            with st.expander("Ver respuesta bruta de DataForSEO SERP"):
-                st.json(st.session_state.competitor_data.get("serp_raw", {}))
+                st.write("Considera incluir estas variaciones:")
+            for opp in opportunities:
+                st.code(f"• {opp}")
+
+        # Preguntas reales (People Also Ask)
+        faq_questions = strategy.get("faq_questions", [])
+        if faq_questions:
+            st.subheader("❓ Preguntas de usuarios (People Also Ask)")
+            for q in faq_questions:
+                st.write(f"• {q}")
+
+        # Headers sugeridos
+        st.subheader("📋 Estructura Sugerida")
+        suggested = strategy.get("suggested_headers", [])
+        if suggested:
+            st.write("Basada en análisis de competencia:")
+            for i, header in enumerate(suggested, 1):
+                st.write(f"{i}. {header}")
+    else:
+        st.info("Estrategia se generará automáticamente cuando el análisis de contenido esté disponible")
 
-# =====================
-# Paso 2: Inputs MEJORADO
-# =====================
-elif st.session_state.step == 2:
-    st.subheader("Paso 2: Definir Parámetros del Contenido")
-    
-    # Mostrar recomendaciones de estrategia si están disponibles
-    if st.session_state.content_strategy:
-        strategy = st.session_state.content_strategy
-        rec_words = strategy.get("recommended_word_count", {})
-        
-        st.info(f"💡 **Recomendación basada en competencia:** "
-                f"{rec_words.get('optimal', 2000):,} palabras óptimas "
-                f"(rango: {rec_words.get('min', 1500):,}-{rec_words.get('max', 3000):,})")
+@timed_fragment("serp")
+def render_serp_tab():
+    """Pestaña SERP del paso 1: tarjetas, features, diff e historial."""
+    serp_diff = st.session_state.competitor_data.get("serp_diff")
     
+    # Vista SERP (como antes)
+    serp_rows = st.session_state.competitor_data.get("serp_list") or []
+    if serp_rows:
+        render_serp_cards(serp_rows, header="Vista general del SERP (DataForSEO)")
+
+    # Primer resultado orgánico
+    first_rank = st.session_state.competitor_data.get("first_org_rank")
+    top_org = st.session_state.competitor_data.get("top_organic") or []
+    if first_rank and top_org:
+        enlaces = ", ".join([f"[{c['title']}]({c['url']})" for c in top_org])
+        st.info(f"**Primer resultado orgánico** (posición {first_rank}): {enlaces}")
+    else:
+        st.warning("No se detectó resultado orgánico en primeras posiciones (posibles AI Overviews, SGE, etc.)")
+
+    # Features del SERP detectadas (AI Overview, PAA, videos, etc.)
+    feature_counts = (st.session_state.competitor_data.get("serp_features") or {}).get("counts", {})
+    if feature_counts:
+        st.write("**Elementos del SERP detectados:**")
+        st.write(" · ".join(f"{t}: {n}" for t, n in sorted(feature_counts.items(), key=lambda kv: -kv[1])))
+
+    # Diff detallado contra el snapshot anterior
+    if serp_diff and (serp_diff["entered"] or serp_diff["exited"] or serp_diff["moved"]):
+        with st.expander("♻️ Cambios respecto al SERP anterior"):
+            for e in serp_diff["entered"]:
+                st.write(f"🟢 Entró en #{e['to']}: {e['url']}")
+            for e in serp_diff["exited"]:
+                st.write(f"🔴 Salió (estaba #{e['from']}): {e['url']}")
+            for m in serp_diff["moved"]:
+                arrow = "⬆️" if m["delta"] > 0 else "⬇️"
+                st.write(f"{arrow} #{m['from']} → #{m['to']}: {m['url']}")
+
+    # Historial de posiciones guardado en el archivo SERP
+    with st.expander("🗄️ Historial de posiciones"):
+        try:
+            history = get_archive(SERP_ARCHIVE_PATH).keyword_history(st.session_state.keyword)
+        except Exception as e:
+            history = []
+            st.warning(f"No se pudo leer el histórico: {e}")
+        if history:
+            st.dataframe([
+                {"fecha": time.strftime("%Y-%m-%d %H:%M", time.localtime(h["fetched_at"])), "pos": h["rank_group"], "url": h["url"]}
+                for h in history
+            ], use_container_width=True)
+        else:
+            st.write("Sin snapshots guardados para esta keyword.")
+
+@timed_fragment("debug")
+def render_debug_tab():
+    """Pestaña Debug del paso 1: análisis en bruto, tiempos y estado del proceso."""
+    # Información de debug
+    st.subheader("🔧 Información de Debug")
+    st.write("**Insights básicos:**")
+    for insight in st.session_state.competitor_data["insights"]:
+        st.write(f"• {insight}")
+
+    # Análisis de contenido detallado
+    content_analyses = st.session_state.competitor_data.get("content_analyses", [])
+    if content_analyses:
+        st.write("**Análisis de contenido detallado:**")
+        for analysis in content_analyses:
+            with st.expander(f"Análisis: {analysis.get('url', 'Unknown')}"):
+                st.json(analysis)
+
+    # Presupuesto de tiempo del research
+    budget = st.session_state.competitor_data.get("research_budget")
+    if budget:
+        st.write(f"**Presupuesto de research:** {budget['elapsed_sec']}s usados de {budget['budget_sec']:.0f}s")
+        for url in budget.get("skipped_urls", []):
+            st.write(f"⏱️ Análisis omitido por tiempo: {url}")
+
+    # Cascada de tiempos del último research y percentiles del proceso
+    if st.session_state.get("traces", {}).get("research"):
+        st.write("**⏱️ Tiempos del último research:**")
+        render_waterfall(st.session_state.traces["research"])
+    with st.expander("📈 Percentiles por etapa (proceso) y exportación"):
+        st.dataframe(stage_summary(), use_container_width=True)
+        if usage_report():
+            st.write("**Tokens estimados vs. reales por modelo:**")
+            st.dataframe(usage_report(), use_container_width=True)
+        spec_stats = speculator.stats()
+        if spec_stats["started"] or spec_stats["skipped_budget"]:
+            st.write("**Borradores especulativos (proceso):**")
+            st.dataframe([spec_stats], use_container_width=True)
+        c1, c2 = st.columns(2)
+        with c1:
+            st.download_button("⬇️ Métricas Prometheus", data=prometheus_text(), file_name="metrics.prom", mime="text/plain")
+        with c2:
+            st.download_button("⬇️ Trazas OTLP (JSON)", data=json.dumps(otlp_json()), file_name="traces.json", mime="application/json")
+
+    with st.expander("🧪 Profiling de reruns"):
+        render_profile_panel()
+
+    # Estado del limitador compartido (todas las sesiones del proceso)
+    metrics = limiter_metrics()
+    if metrics:
+        st.write("**Limitador de APIs (proceso):**")
+        st.dataframe(list(metrics.values()), use_container_width=True)
+    breakers = breaker_states()
+    if breakers:
+        st.write("**Circuit breakers:** " + " · ".join(f"{b['name']}: {b['state']}" for b in breakers.values()))
+
+    # Ver respuesta bruta SERP
+    with st.expander("Ver respuesta bruta de DataForSEO SERP"):
+        st.json(st.session_state.competitor_data.get("serp_raw", {}))
+
+@timed_fragment("paso 2")
+def render_inputs_form():
+    """Formulario del paso 2 (con la configuración del modelo)."""
     with st.form("inputs_form"):
         c1, c2 = st.columns(2)
         with c1:
@@ -964,27 +673,27 @@ elif st.session_state.step == 2:
                 suggested_keywords = ", ".join(opportunities[:5])
                 st.info(f"💡 Sugerencia: {suggested_keywords}")
                 current_related = suggested_keywords
-            
+
             st.session_state.inputs["relatedKeywords"] = st.text_area(
                 "Keywords relacionadas (coma separadas)",
                 value=current_related,
                 placeholder="ej: carrera medicina, estudiar medicina Perú, medicina UTP",
                 height=90
             )
-            
+
             st.session_state.inputs["title"] = st.text_input(
                 "Título del artículo",
                 value=st.session_state.inputs["title"],
                 placeholder=f"Guía Completa: {st.session_state.keyword.title()} en Perú 2025"
             )
-            
+
         with c2:
             st.session_state.inputs["tone"] = st.selectbox(
                 "Tono del contenido",
                 ["profesional", "casual", "tecnico", "educativo"],
                 index=["profesional", "casual", "tecnico", "educativo"].index(st.session_state.inputs["tone"])
             )
-            
+
             # Word count con recomendación
             word_options = [800, 1500, 2500, 3500]
             if st.session_state.content_strategy:
@@ -997,52 +706,51 @@ elif st.session_state.step == 2:
                 current_index = word_options.index(closest)
             else:
                 current_index = word_options.index(st.session_state.inputs["wordCount"])
-            
+
             st.session_state.inputs["wordCount"] = st.selectbox(
                 "Cantidad de palabras",
                 word_options,
                 index=current_index
             )
-        
+
         # SECCIÓN DE CONFIGURACIÓN DEL MODELO (MOVIDA AQUÍ)
         st.divider()
         st.subheader("🤖 Configuración del Modelo IA")
-        
+
         col1, col2 = st.columns(2)
-        
+
         with col1:
-            # Selector de modelo
-            model_options = [
-                "gpt-4o-mini",
-                "gpt-4o", 
-                "gpt-4-turbo",
-                "gpt-3.5-turbo"
-            ]
-            
+            # Selector de modelo (cifras medidas en este servidor; "Auto" elige por latencia)
+            model_options = [AUTO_MODEL] + MODEL_OPTIONS
+            model_stats = {s["model"]: s for s in get_model_stats(MODEL_STATS_PATH).summaries()}
+
             current_model = st.session_state.inputs.get("ai_model", "gpt-4o-mini")
             model_index = model_options.index(current_model) if current_model in model_options else 0
-            
+
             selected_model = st.selectbox(
                 "Modelo OpenAI",
                 options=model_options,
                 index=model_index,
-                help="Selecciona el modelo de IA para generar el contenido"
+                format_func=lambda m: m if m == AUTO_MODEL else f"{m} — {describe(model_stats[m])}",
+                help="Auto elige el mejor modelo que cumpla el objetivo de latencia según el historial medido"
             )
-            
+
             st.session_state.inputs["ai_model"] = selected_model
-            
-            # Información sobre el modelo seleccionado
-            model_info = {
-                "gpt-4o-mini": {"speed": "⚡ Rápido", "cost": "💰 Económico", "quality": "📝 Buena"},
-                "gpt-4o": {"speed": "🚀 Medio", "cost": "💰💰 Moderado", "quality": "✨ Excelente"},
-                "gpt-4-turbo": {"speed": "🚀 Medio", "cost": "💰💰💰 Alto", "quality": "🎯 Muy buena"},
-                "gpt-3.5-turbo": {"speed": "⚡⚡ Muy rápido", "cost": "💰 Muy económico", "quality": "📝 Básica"}
-            }
-            
-            info = model_info.get(selected_model, {})
-            if info:
-                st.write(f"**{info['speed']} | {info['cost']} | {info['quality']}**")
-        
+
+            # Dentro del form no hay rerun al cambiar el modelo: el objetivo se muestra siempre
+            st.session_state.inputs["latency_target_sec"] = st.slider(
+                "Objetivo de latencia para Auto (s)",
+                min_value=15, max_value=300, step=5,
+                value=int(st.session_state.inputs.get("latency_target_sec", LATENCY_TARGET)),
+                help="Tiempo máximo deseado para la redacción completa cuando el modelo es Auto"
+            )
+            if selected_model == AUTO_MODEL:
+                plan = route(st.session_state.inputs.get("wordCount", 1500), st.session_state.inputs["latency_target_sec"],
+                             get_model_stats(MODEL_STATS_PATH))
+                st.write(f"**→ {plan['chain'][0]}**: {plan['reason']}"
+                         + (f" · respaldo: {', '.join(plan['chain'][1:])}" if len(plan["chain"]) > 1 else ""))
+                selected_model = plan["chain"][0]
+
         with col2:
             # Parámetros del modelo
             temperature = st.slider(
@@ -1053,9 +761,9 @@ elif st.session_state.step == 2:
                 step=0.1,
                 help="0.0 = Muy conservador, 1.0 = Muy creativo"
             )
-            
+
             st.session_state.inputs["temperature"] = temperature
-            
+
             # Modo de optimización
             optimization_mode = st.selectbox(
                 "Modo de Optimización",
@@ -1066,23 +774,25 @@ elif st.session_state.step == 2:
                 help="Ajusta el enfoque del contenido generado"
             )
             st.session_state.inputs["optimization_mode"] = optimization_mode
-        
+
         # Configuración avanzada (desplegable)
         with st.expander("⚙️ Configuración Avanzada del Modelo"):
             col1, col2 = st.columns(2)
-            
+
             with col1:
-                estimated_tokens = st.session_state.inputs.get("wordCount", 1500) * 1.3
+                estimated_tokens = estimate_output_tokens(st.session_state.inputs.get("wordCount", 1500), selected_model)
+                max_output = model_limits(selected_model)["max_output"]
                 max_tokens = st.number_input(
                     "Max Tokens",
                     min_value=500,
-                    max_value=4000,
-                    value=st.session_state.inputs.get("max_tokens", int(estimated_tokens * 1.2)),
+                    max_value=max_output,
+                    value=min(st.session_state.inputs.get("max_tokens", int(estimated_tokens * 1.2)), max_output),
                     step=100,
-                    help="Límite máximo de tokens para la respuesta"
+                    help="Mínimo de tokens por llamada: se amplía solo si la extensión pedida lo requiere, "
+                         "y si aun así se corta, la redacción continúa desde la última sección completa"
                 )
                 st.session_state.inputs["max_tokens"] = max_tokens
-                
+
                 presence_penalty = st.slider(
                     "Presence Penalty",
                     min_value=0.0,
@@ -1092,7 +802,7 @@ elif st.session_state.step == 2:
                     help="Penaliza repetición de temas (0.0-2.0)"
                 )
                 st.session_state.inputs["presence_penalty"] = presence_penalty
-            
+
             with col2:
                 frequency_penalty = st.slider(
                     "Frequency Penalty", 
@@ -1103,28 +813,159 @@ elif st.session_state.step == 2:
                     help="Penaliza repetición de palabras (0.0-2.0)"
                 )
                 st.session_state.inputs["frequency_penalty"] = frequency_penalty
-                
-                # Estimación de tokens y costos
-                estimated_tokens = st.session_state.inputs.get("wordCount", 1500) * 1.3
-                st.info(f"📊 **Tokens estimados:** ~{estimated_tokens:,.0f}")
-                
+
+                # Estimación de tokens (relación tokens/palabra medida en este proceso si hay historial)
+                st.info(f"📊 **Tokens estimados:** ~{estimated_tokens:,.0f} (máx. por llamada de {selected_model}: {max_output:,})")
+
                 # Advertencia de costos para modelos premium
                 if selected_model in ["gpt-4o", "gpt-4-turbo"]:
                     st.warning("⚠️ Modelo premium: mayor costo por token")
                 elif selected_model == "gpt-4o-mini":
                     st.success("✅ Modelo económico recomendado")
-        
+
         # Previsualización de configuración
-        st.info(f"🎯 **Configuración actual:** {selected_model} | Creatividad: {temperature} | Modo: {optimization_mode}")
-            
+        model_label = f"{AUTO_MODEL} → {selected_model}" if st.session_state.inputs["ai_model"] == AUTO_MODEL else selected_model
+        st.info(f"🎯 **Configuración actual:** {model_label} | Creatividad: {temperature} | Modo: {optimization_mode}")
+
         submitted = st.form_submit_button("📑 Continuar a Estructuras", type="primary")
         if submitted:
             if not st.session_state.inputs["title"].strip():
                 st.warning("⚠️ Ingresa un título para continuar.")
             else:
                 st.session_state.step = 3
+                save_project(inputs=st.session_state.inputs, step=3)
                 st.rerun()
 
+# =====================
+# UI Principal
+# =====================
+# Retomar proyecto desde la URL (?project=...) tras un refresh o cambio de réplica
+if not st.session_state.get("project_checked"):
+    st.session_state.project_checked = True
+    if st.query_params.get("project") and not st.session_state.get("project_id"):
+        resume_project(st.query_params["project"])
+hydrate_project_state()
+render_projects_sidebar()
+if PROFILE_MODE:
+    with st.sidebar.expander("🧪 Profiling de reruns"):
+        render_profile_panel(key="sidebar")
+
+with st.container():
+    render_simple_navigation()
+    
+st.divider()
+
+with st.container():
+    render_navigation_buttons()
+    
+st.divider()
+
+# =====================
+# Paso 1: Research MEJORADO
+# =====================
+if st.session_state.step == 1:
+    st.subheader("Paso 1: Research de Competencia")
+    
+    kw = st.text_input("Keyword objetivo", value=st.session_state.keyword,
+                       placeholder="ej: por qué estudiar enfermería")
+    
+    # Opción para análisis profundo
+    deep_analysis = st.checkbox("🔬 Análisis profundo de contenido (usa Content Analysis API)", 
+                               value=True, 
+                               help="Analiza el contenido real de competidores para obtener métricas precisas")
+    incremental = st.checkbox("♻️ Re-research incremental (reutiliza análisis de URLs sin cambios)",
+                              value=True,
+                              help="Compara con el último SERP guardado y solo re-analiza URLs nuevas o que se movieron")
+    use_cache = st.checkbox(f"⚡ Usar research reciente guardado (≤ {RESEARCH_CACHE_MAX_AGE_HOURS:g} h)",
+                            value=True,
+                            help="Las keywords de la watchlist se refrescan fuera de horario (watchlist.py); desmarca para forzar un research nuevo")
+    
+    go = st.button("🔎 Analizar competencia", type="primary", disabled=not kw.strip())
+
+    if go:
+        st.session_state.keyword = kw.strip()
+        with st.spinner(f"Analizando competencia y contenido (máximo {RESEARCH_BUDGET_SEC} segundos)..."), \
+                start_trace("research", keyword=st.session_state.keyword) as trace:
+            try:
+                cached = cached_research(st.session_state.keyword) if use_cache else None
+                st.session_state.research_cached = cached and {"refreshed_at": cached["refreshed_at"], "source": cached["source"]}
+                if cached:
+                    st.session_state.competitor_data = cached["data"]
+                else:
+                    st.session_state.competitor_data = analyze_competitors(st.session_state.keyword, incremental=incremental)
+                for warning in st.session_state.competitor_data.get("warnings", []):
+                    st.warning(warning)
+                
+                # Generar estrategia si tenemos análisis de contenido
+                if st.session_state.competitor_data.get("content_analyses"):
+                    with st.spinner("Generando estrategia de contenido..."):
+                        st.session_state.content_strategy = generate_content_strategy(
+                            st.session_state.competitor_data["content_analyses"], 
+                            st.session_state.keyword,
+                            serp_features=st.session_state.competitor_data.get("serp_features")
+                        )
+
+                save_project(
+                    keyword=st.session_state.keyword,
+                    step=st.session_state.step,
+                    competitor_data=st.session_state.competitor_data,
+                    content_strategy=st.session_state.content_strategy
+                )
+                
+            except Exception as e:
+                st.error(f"Error al analizar competencia: {e}")
+        st.session_state.setdefault("traces", {})["research"] = trace.waterfall()
+
+    # Mostrar resultados si existen
+    if st.session_state.competitor_data:
+        st.success(f"✅ Análisis completado para \"{st.session_state.keyword}\"")
+        cached = st.session_state.get("research_cached")
+        if cached:
+            age_h = (time.time() - cached["refreshed_at"]) / 3600
+            origin = "warm-up de la watchlist" if cached["source"] == "watchlist" else "un research anterior"
+            st.info(f"⚡ Servido desde caché: actualizado hace {age_h:.1f} h por {origin} "
+                    f"({time.strftime('%Y-%m-%d %H:%M', time.localtime(cached['refreshed_at']))}). "
+                    f"Desmarca «Usar research reciente guardado» para repetirlo.")
+
+        serp_diff = st.session_state.competitor_data.get("serp_diff")
+        if serp_diff:
+            st.info(f"♻️ **Cambios vs. SERP anterior** "
+                    f"({time.strftime('%Y-%m-%d %H:%M', time.localtime(serp_diff['previous_fetched_at']))}): "
+                    f"{len(serp_diff['entered'])} entraron · {len(serp_diff['exited'])} salieron · "
+                    f"{len(serp_diff['moved'])} se movieron · {serp_diff['unchanged']} sin cambios — "
+                    f"**{serp_diff['api_calls_saved']} llamadas a la API ahorradas**")
+
+        # Tabs para organizar información
+        tab1, tab2, tab3, tab4 = st.tabs(["📊 Competidores", "🎯 Estrategia", "📈 SERP", "🔧 Debug"])
+        
+        with tab1:
+            render_competitors_tab()
+        with tab2:
+            render_strategy_tab()
+        with tab3:
+            render_serp_tab()
+        with tab4:
+            render_debug_tab()
+
+# =====================
+# Paso 2: Inputs MEJORADO
+# =====================
+elif st.session_state.step == 2:
+    st.subheader("Paso 2: Definir Parámetros del Contenido")
+    # Mientras se completa el formulario: SDK importado y conexión con OpenAI abierta
+    speculator.warm()
+    
+    # Mostrar recomendaciones de estrategia si están disponibles
+    if st.session_state.content_strategy:
+        strategy = st.session_state.content_strategy
+        rec_words = strategy.get("recommended_word_count", {})
+        
+        st.info(f"💡 **Recomendación basada en competencia:** "
+                f"{rec_words.get('optimal', 2000):,} palabras óptimas "
+                f"(rango: {rec_words.get('min', 1500):,}-{rec_words.get('max', 3000):,})")
+    
+    render_inputs_form()
+
 # =====================
 # Paso 3: Estructura MEJORADO
 # =====================
@@ -1146,6 +987,10 @@ elif st.session_state.step == 3:
     )
     
     chosen = next(o for o in options if o["id"] == sel)
+
+    # Borrador en segundo plano con la estructura optimizada (o la primera) mientras se elige
+    speculative = next((o for o in options if o.get("optimized")), options[0])
+    speculator.speculate(st.session_state.spec_session, generation_args(speculative))
     
     # Mostrar preview de headers
     with st.expander("👀 Ver encabezados de la estructura seleccionada", expanded=True):
@@ -1160,6 +1005,7 @@ elif st.session_state.step == 3:
         st.session_state.selected_structure = chosen
         st.session_state.step = 4
         st.session_state.final_md = ""
+        save_project(selected_structure=chosen, final_md=None, step=4)
         st.rerun()
 
 # =====================
@@ -1169,20 +1015,24 @@ elif st.session_state.step == 4:
     st.subheader("📝 Contenido Generado")
     
     if not st.session_state.final_md:
-        with st.spinner("Redactando con OpenAI (considerando análisis de competencia)..."):
-            try:
-                st.session_state.final_md = generate_content_with_openai(
-                    title=st.session_state.inputs["title"],
-                    keyword=st.session_state.keyword,
-                    structure=st.session_state.selected_structure,
-                    tone=st.session_state.inputs["tone"],
-                    word_count=st.session_state.inputs["wordCount"],
-                    related_keywords=st.session_state.inputs["relatedKeywords"],
-                    competitor_data=st.session_state.competitor_data or {},
-                    strategy=st.session_state.content_strategy  # NUEVO: pasamos la estrategia
-                )
-            except Exception as e:
-                st.error(f"Error generando contenido: {e}")
+        generation = generation_args(st.session_state.selected_structure)
+        # Si el borrador especulativo corresponde a esta misma redacción, se usa tal cual
+        with st.spinner("Recuperando el borrador preparado en segundo plano..."):
+            draft = speculator.take(st.session_state.spec_session, generation)
+        st.session_state.speculative_draft = draft and {k: draft[k] for k in ("tokens", "elapsed_sec", "waited_sec")}
+        if draft:
+            st.session_state.final_md = draft["content"]
+            st.session_state.setdefault("traces", {})["generation"] = draft["waterfall"]
+            save_project(final_md=st.session_state.final_md)
+        else:
+            with st.spinner("Redactando con OpenAI (considerando análisis de competencia)..."), \
+                    start_trace("generation", keyword=st.session_state.keyword) as trace:
+                try:
+                    st.session_state.final_md = generate_content_with_openai(**generation)
+                    save_project(final_md=st.session_state.final_md)
+                except Exception as e:
+                    st.error(f"Error generando contenido: {e}")
+            st.session_state.setdefault("traces", {})["generation"] = trace.waterfall()
 
     # Info del proyecto
     kw = st.session_state.keyword
@@ -1200,6 +1050,27 @@ elif st.session_state.step == 4:
             for insight in strategy.get("competitor_insights", []):
                 st.write(f"• {insight}")
 
+    if st.session_state.get("speculative_draft"):
+        d = st.session_state.speculative_draft
+        st.caption(f"⚡ Borrador preparado en segundo plano mientras elegías la estructura "
+                   f"({d['elapsed_sec']:.0f}s de redacción, espera en este paso: {d['waited_sec']:.1f}s)")
+
+    if st.session_state.get("traces", {}).get("generation"):
+        with st.expander("⏱️ Tiempos de generación"):
+            calls = [r for r in st.session_state.traces["generation"] if r["stage"] == "openai.chat_completion"]
+            if calls and calls[0].get("estimated_completion_tokens"):
+                real = sum(int(r.get("completion_tokens") or 0) for r in calls)
+                st.write(f"**Tokens de salida:** {real:,} reales vs. ~{calls[0]['estimated_completion_tokens']:,} estimados"
+                         + (f" · {len(calls) - 1} continuación(es) por límite de tokens" if len(calls) > 1 else ""))
+            render_waterfall(st.session_state.traces["generation"])
+
+    # Calidad SEO calculada en local (sin otra llamada al modelo)
+    if st.session_state.final_md:
+        quality = analyze_quality(st.session_state.final_md, kw, st.session_state.inputs["relatedKeywords"],
+                                  st.session_state.selected_structure.get("headers", []), wc)
+        with st.expander(f"📏 Calidad SEO: {quality['score']}/100"):
+            render_quality_panel(quality)
+
     # Contenido
     st.markdown(st.session_state.final_md)
 
@@ -1207,6 +1078,22 @@ elif st.session_state.step == 4:
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         download_md_button(f"{kw.replace(' ', '_') or 'articulo'}.md", st.session_state.final_md)
+        article = {
+            "name": kw.replace(" ", "_") or "articulo",
+            "keyword": kw,
+            "title": st.session_state.inputs["title"],
+            "markdown": st.session_state.final_md,
+            "competitor_data": st.session_state.competitor_data,
+            "strategy": st.session_state.content_strategy,
+            "headers": st.session_state.selected_structure.get("headers"),
+            "target_words": wc,
+            "related_keywords": st.session_state.inputs["relatedKeywords"],
+            "source": "app",
+            "meta": {"project_id": st.session_state.get("project_id"), "inputs": dict(st.session_state.inputs),
+                     "structure": structure_name},
+        }
+        st.download_button("⬇️ ZIP (.md, .html, .docx, .json)", data=zip_download_data(lambda: [article], ["md", "html", "docx", "json"]),
+                           file_name=f"{article['name']}.zip", mime="application/zip")
     with col2:
         if st.button("🔄 Regenerar"):
             st.session_state.final_md = ""
@@ -1217,7 +1104,14 @@ elif st.session_state.step == 4:
             st.rerun()
     with col4:
         if st.button("🆕 Nuevo proyecto"):
-            for k in ["step","keyword","competitor_data","content_strategy","inputs","selected_structure","final_md"]:
+            speculator.discard(st.session_state.spec_session)
+            for k in ["step","keyword","competitor_data","content_strategy","inputs","selected_structure","final_md",
+                      "project_id","pending_blobs","saved_step"]:
                 if k in st.session_state:
                     del st.session_state[k]
+            if "project" in st.query_params:
+                del st.query_params["project"]
             st.rerun()
+
+# Fin del script: cerrar la medición de este rerun
+finish_rerun_profile()
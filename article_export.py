@@ -0,0 +1,465 @@
+"""
+Exportación masiva de artículos a un ZIP que se escribe entrada por entrada.
+
+Por artículo: el Markdown, el HTML renderizado, opcionalmente un .docx y un
+JSON con el resumen del research (`competitor_data` sin el SERP bruto), la
+estrategia, la calidad SEO local y los metadatos de origen. Al final va un
+`manifest.jsonl` con una línea por artículo. Los artículos se leen de a uno
+(de la salida de `batch_generate.py` o de los proyectos guardados) y cada uno
+se libera al escribirse: la memoria no crece con la cantidad exportada, y el
+ZIP puede ir a un archivo o a un stream no seekable (stdout, una respuesta HTTP).
+
+    with open("articulos.zip", "wb") as f:
+        write_zip(batch_articles("articulos/"), f, formats=("md", "html", "docx", "json"))
+
+    python article_export.py batch articulos/ -o articulos.zip --docx
+    python article_export.py projects -o - > proyectos.zip
+"""
+import argparse, html, io, json, os, re, sys, tempfile, time, zipfile
+from typing import Dict, Any, List, Iterable, Iterator, Optional, BinaryIO
+from xml.sax.saxutils import escape as xml_escape
+
+import seo_pipeline
+from batch_generate import Checkpoint, load_secrets, slugify
+from project_store import get_store, DEFAULT_STORE_PATH
+from serp_archive import get_archive
+from seo_quality import QualityAnalyzer
+
+FORMATS = ("md", "html", "docx", "json")
+# El manifest se acumula en memoria hasta este tamaño y luego en disco
+MANIFEST_SPOOL_BYTES = 1 << 20
+# Filas del SERP y análisis de contenido que se conservan en el JSON
+SERP_ROWS = 20
+
+# =====================
+# Markdown -> HTML
+# =====================
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_HR = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_UL = re.compile(r"^\s*[-*+]\s+(.*)$")
+_OL = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_QUOTE = re.compile(r"^\s*>\s?(.*)$")
+_TABLE_SEP = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_INLINE = re.compile(r"`([^`]+)`|!?\[([^\]]*)\]\(([^)\s]+)[^)]*\)|\*\*(.+?)\*\*|__(.+?)__|\*(.+?)\*|(?<!\w)_(.+?)_(?!\w)")
+
+HTML_STYLE = """
+body{font-family:system-ui,-apple-system,"Segoe UI",sans-serif;max-width:760px;margin:2rem auto;padding:0 1rem;line-height:1.6;color:#1f2937;}
+h1,h2,h3{line-height:1.25;}table{border-collapse:collapse;}td,th{border:1px solid #d1d5db;padding:4px 8px;}
+blockquote{border-left:4px solid #d1d5db;margin-left:0;padding-left:1rem;color:#4b5563;}code{background:#f3f4f6;padding:0 3px;}
+""".strip()
+
+def _inline_html(text: str) -> str:
+    """Negritas, cursivas, código y enlaces (el resto del texto, escapado)."""
+    out, pos = [], 0
+    for m in _INLINE.finditer(text):
+        out.append(html.escape(text[pos:m.start()], quote=False))
+        code, label, url, bold, bold2, em, em2 = m.groups()
+        if code is not None:
+            out.append(f"<code>{html.escape(code, quote=False)}</code>")
+        elif url is not None:
+            out.append(f'<a href="{html.escape(url)}">{_inline_html(label)}</a>')
+        elif bold or bold2:
+            out.append(f"<strong>{_inline_html(bold or bold2)}</strong>")
+        else:
+            out.append(f"<em>{_inline_html(em or em2)}</em>")
+        pos = m.end()
+    out.append(html.escape(text[pos:], quote=False))
+    return "".join(out)
+
+def _cells(line: str) -> List[str]:
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+def markdown_blocks(md: str) -> Iterator[Dict[str, Any]]:
+    """
+    Bloques del Markdown de un artículo: heading, paragraph, ul, ol, quote,
+    table, code y hr. Cubre lo que produce la redacción (sin listas anidadas
+    ni HTML embebido); lo usan el HTML y el DOCX.
+    """
+    lines = md.splitlines()
+    i, para = 0, []
+    def flush():
+        if para:
+            yield {"type": "paragraph", "text": " ".join(s.strip() for s in para)}
+            para.clear()
+    while i < len(lines):
+        line = lines[i]
+        if _FENCE.match(line):
+            yield from flush()
+            fence, code = _FENCE.match(line).group(1), []
+            i += 1
+            while i < len(lines) and not lines[i].lstrip().startswith(fence):
+                code.append(lines[i])
+                i += 1
+            yield {"type": "code", "text": "\n".join(code)}
+        elif not line.strip():
+            yield from flush()
+        elif _HEADING.match(line):
+            yield from flush()
+            m = _HEADING.match(line)
+            yield {"type": "heading", "level": len(m.group(1)), "text": m.group(2)}
+        elif _HR.match(line):
+            yield from flush()
+            yield {"type": "hr"}
+        elif "|" in line and i + 1 < len(lines) and _TABLE_SEP.match(lines[i + 1]):
+            yield from flush()
+            rows = [_cells(line)]
+            i += 2
+            while i < len(lines) and "|" in lines[i] and lines[i].strip():
+                rows.append(_cells(lines[i]))
+                i += 1
+            yield {"type": "table", "rows": rows}
+            continue
+        elif _UL.match(line) or _OL.match(line):
+            yield from flush()
+            kind, pattern, items = ("ul", _UL, []) if _UL.match(line) else ("ol", _OL, [])
+            while i < len(lines) and pattern.match(lines[i]):
+                items.append(pattern.match(lines[i]).group(1))
+                i += 1
+            yield {"type": kind, "items": items}
+            continue
+        elif _QUOTE.match(line):
+            yield from flush()
+            quoted = []
+            while i < len(lines) and _QUOTE.match(lines[i]):
+                quoted.append(_QUOTE.match(lines[i]).group(1))
+                i += 1
+            yield {"type": "quote", "text": " ".join(q.strip() for q in quoted if q.strip())}
+            continue
+        else:
+            para.append(line)
+        i += 1
+    yield from flush()
+
+def markdown_to_html(md: str, title: str = "") -> str:
+    """Documento HTML autónomo (estilos mínimos en línea) a partir del Markdown."""
+    body = []
+    for b in markdown_blocks(md):
+        kind = b["type"]
+        if kind == "heading":
+            body.append(f"<h{b['level']}>{_inline_html(b['text'])}</h{b['level']}>")
+        elif kind == "paragraph":
+            body.append(f"<p>{_inline_html(b['text'])}</p>")
+        elif kind in ("ul", "ol"):
+            body.append(f"<{kind}>" + "".join(f"<li>{_inline_html(x)}</li>" for x in b["items"]) + f"</{kind}>")
+        elif kind == "quote":
+            body.append(f"<blockquote><p>{_inline_html(b['text'])}</p></blockquote>")
+        elif kind == "code":
+            body.append(f"<pre><code>{html.escape(b['text'], quote=False)}</code></pre>")
+        elif kind == "hr":
+            body.append("<hr>")
+        elif kind == "table":
+            head, *rows = b["rows"]
+            body.append("<table><thead><tr>" + "".join(f"<th>{_inline_html(c)}</th>" for c in head) + "</tr></thead><tbody>"
+                        + "".join("<tr>" + "".join(f"<td>{_inline_html(c)}</td>" for c in r) + "</tr>" for r in rows)
+                        + "</tbody></table>")
+    return (f'<!DOCTYPE html>\n<html lang="es">\n<head>\n<meta charset="utf-8">\n<title>{html.escape(title)}</title>\n'
+            f"<style>{HTML_STYLE}</style>\n</head>\n<body>\n" + "\n".join(body) + "\n</body>\n</html>\n")
+
+# =====================
+# Markdown -> DOCX (WordprocessingML mínimo, sin dependencias)
+# =====================
+_W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>"""
+DOCX_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+DOCX_DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+def _docx_styles() -> str:
+    styles = ['<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+              '<w:pPr><w:spacing w:after="120"/></w:pPr><w:rPr><w:sz w:val="22"/></w:rPr></w:style>']
+    for level, size in ((1, 36), (2, 30), (3, 26), (4, 24), (5, 22), (6, 22)):
+        styles.append(f'<w:style w:type="paragraph" w:styleId="Heading{level}"><w:name w:val="heading {level}"/>'
+                      f'<w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:pPr><w:keepNext/><w:spacing w:before="240"/>'
+                      f'<w:outlineLvl w:val="{level - 1}"/></w:pPr><w:rPr><w:b/><w:sz w:val="{size}"/></w:rPr></w:style>')
+    styles.append('<w:style w:type="paragraph" w:styleId="Quote"><w:name w:val="Quote"/><w:basedOn w:val="Normal"/>'
+                  '<w:pPr><w:ind w:left="567"/></w:pPr><w:rPr><w:i/></w:rPr></w:style>')
+    return f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:styles {_W}>' + "".join(styles) + "</w:styles>"
+
+def _docx_runs(text: str, bold: bool = False, italic: bool = False) -> str:
+    """Runs de Word con negritas/cursivas/código; los enlaces quedan como «texto (url)»."""
+    out, pos = [], 0
+    def run(t, b=bold, i=italic, mono=False):
+        if not t:
+            return
+        props = ("<w:b/>" if b else "") + ("<w:i/>" if i else "") + ('<w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/>' if mono else "")
+        out.append(f'<w:r>{f"<w:rPr>{props}</w:rPr>" if props else ""}<w:t xml:space="preserve">{xml_escape(t)}</w:t></w:r>')
+    for m in _INLINE.finditer(text):
+        run(text[pos:m.start()])
+        code, label, url, b1, b2, e1, e2 = m.groups()
+        if code is not None:
+            run(code, mono=True)
+        elif url is not None:
+            out.append(_docx_runs(label, bold, italic))
+            run(f" ({url})")
+        elif b1 or b2:
+            out.append(_docx_runs(b1 or b2, True, italic))
+        else:
+            out.append(_docx_runs(e1 or e2, bold, True))
+        pos = m.end()
+    run(text[pos:])
+    return "".join(out)
+
+def _docx_paragraph(runs: str, style: str = None) -> str:
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{props}{runs}</w:p>"
+
+def markdown_to_docx(md: str) -> bytes:
+    """.docx con estilos de título reales (navegables en Word); listas y tablas como párrafos simples."""
+    paragraphs = []
+    for b in markdown_blocks(md):
+        kind = b["type"]
+        if kind == "heading":
+            paragraphs.append(_docx_paragraph(_docx_runs(b["text"]), f"Heading{b['level']}"))
+        elif kind == "paragraph":
+            paragraphs.append(_docx_paragraph(_docx_runs(b["text"])))
+        elif kind in ("ul", "ol"):
+            for n, item in enumerate(b["items"], 1):
+                bullet = "• " if kind == "ul" else f"{n}. "
+                paragraphs.append(_docx_paragraph(_docx_runs(bullet + item)))
+        elif kind == "quote":
+            paragraphs.append(_docx_paragraph(_docx_runs(b["text"]), "Quote"))
+        elif kind == "code":
+            paragraphs.extend(_docx_paragraph(_docx_runs(f"`{line}`" if line.strip() else "")) for line in b["text"].splitlines())
+        elif kind == "table":
+            paragraphs.extend(_docx_paragraph(_docx_runs(" | ".join(row))) for row in b["rows"])
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document {_W}><w:body>'
+                + "".join(paragraphs) + "<w:sectPr/></w:body></w:document>")
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+        docx.writestr("_rels/.rels", DOCX_RELS)
+        docx.writestr("word/_rels/document.xml.rels", DOCX_DOCUMENT_RELS)
+        docx.writestr("word/document.xml", document)
+        docx.writestr("word/styles.xml", _docx_styles())
+    return buf.getvalue()
+
+# =====================
+# Metadatos
+# =====================
+def research_summary(competitor_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """`competitor_data` sin lo voluminoso (SERP bruto, textos analizados): lo que sirve para auditar el artículo."""
+    if not competitor_data:
+        return None
+    budget = competitor_data.get("research_budget") or {}
+    diff = competitor_data.get("serp_diff") or {}
+    return {
+        "competitors": [{k: c.get(k) for k in ("title", "url", "wordCount")} for c in competitor_data.get("competitors", [])],
+        "serp": (competitor_data.get("serp_list") or [])[:SERP_ROWS],
+        "first_org_rank": competitor_data.get("first_org_rank"),
+        "serp_features": (competitor_data.get("serp_features") or {}).get("counts", {}),
+        "content_analyses": [{k: a.get(k) for k in ("url", "title", "word_count", "headers", "status")}
+                             for a in competitor_data.get("content_analyses", [])],
+        "insights": competitor_data.get("insights", []),
+        "research_elapsed_sec": budget.get("elapsed_sec"),
+        "skipped_urls": budget.get("skipped_urls", []),
+        "serp_changes": {k: len(diff[k]) for k in ("entered", "exited", "moved") if k in diff} or None,
+    }
+
+def _quality(analyzer: QualityAnalyzer, article: Dict[str, Any]) -> Dict[str, Any]:
+    report = analyzer.analyze(article["markdown"], article.get("keyword", ""), article.get("related_keywords", ""),
+                             article.get("headers") or [], article.get("target_words"))
+    return {
+        "score": report["score"],
+        "words": report["words"],
+        "fernandez_huerta": report["readability"]["fernandez_huerta"],
+        "keyword_density_pct": report["keywords"].get("density_pct"),
+        "failed_checks": [c["check"] for c in report["checks"] if not c["ok"]],
+    }
+
+# =====================
+# ZIP
+# =====================
+def _entry(name: str, when: float, compress: int = zipfile.ZIP_DEFLATED) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, date_time=time.localtime(when)[:6])
+    info.compress_type = compress
+    return info
+
+def write_zip(articles: Iterable[Dict[str, Any]], out: BinaryIO, formats: Iterable[str] = ("md", "html", "json"),
+              progress=None) -> Dict[str, Any]:
+    """
+    Escribe el ZIP en `out` (archivo o stream no seekable) artículo por
+    artículo. Cada artículo es un dict con name, markdown y opcionalmente
+    keyword, title, competitor_data, strategy, headers, target_words,
+    related_keywords, source y meta. Devuelve el resumen de la exportación.
+    """
+    formats = [f for f in FORMATS if f in set(formats)]
+    started, exported, failed, written = time.perf_counter(), 0, [], 0
+    now = time.time()
+    # Analizador propio con caché chica: los artículos exportados no se vuelven a evaluar
+    analyzer = QualityAnalyzer(cache_size=64)
+    with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_BYTES, mode="w+b") as manifest, \
+            zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for article in articles:
+            name, md = article["name"], article.get("markdown") or ""
+            title = article.get("title") or article.get("keyword") or name
+            line = {"name": name, "keyword": article.get("keyword"), "title": title, "source": article.get("source")}
+            try:
+                files = {}
+                if "md" in formats:
+                    files[f"{name}.md"] = md.encode("utf-8")
+                if "html" in formats:
+                    files[f"{name}.html"] = markdown_to_html(md, title).encode("utf-8")
+                if "docx" in formats:
+                    files[f"{name}.docx"] = markdown_to_docx(md)
+                quality = _quality(analyzer, article)
+                if "json" in formats:
+                    files[f"{name}.json"] = json.dumps({
+                        "keyword": article.get("keyword"),
+                        "title": title,
+                        "source": article.get("source"),
+                        "exported_at": now,
+                        "meta": article.get("meta") or {},
+                        "quality": quality,
+                        "research": research_summary(article.get("competitor_data")),
+                        "strategy": article.get("strategy") or None,
+                    }, ensure_ascii=False, indent=2).encode("utf-8")
+            except Exception as e:
+                failed.append({"name": name, "error": f"{type(e).__name__}: {e}"[:300]})
+                line["error"] = failed[-1]["error"]
+            else:
+                for filename, data in files.items():
+                    # El .docx ya es un ZIP: se guarda sin volver a comprimir
+                    compress = zipfile.ZIP_STORED if filename.endswith(".docx") else zipfile.ZIP_DEFLATED
+                    zf.writestr(_entry(filename, now, compress), data)
+                    written += len(data)
+                exported += 1
+                line.update(files=sorted(files), quality_score=quality["score"], words=quality["words"])
+            manifest.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+            if progress:
+                progress(line, exported + len(failed))
+        manifest.seek(0)
+        with zf.open(_entry("manifest.jsonl", now), "w") as entry:
+            while chunk := manifest.read(1 << 16):
+                entry.write(chunk)
+    return {
+        "exported": exported,
+        "failed": len(failed),
+        "formats": formats,
+        "uncompressed_bytes": written,
+        "wall_sec": round(time.perf_counter() - started, 2),
+        "failures": failed,
+    }
+
+# =====================
+# Fuentes
+# =====================
+def batch_articles(out_dir: str) -> Iterator[Dict[str, Any]]:
+    """
+    Artículos terminados de una salida de `batch_generate.py`. El research se
+    lee del archivo SERP (cada research del lote queda guardado ahí) y la
+    estrategia y la estructura se recalculan en local a partir de él.
+    """
+    records = sorted((r for r in Checkpoint(out_dir).records.values() if r.get("status") == "ok" and r.get("file")),
+                     key=lambda r: r.get("line", 0))
+    archive = get_archive(seo_pipeline.SERP_ARCHIVE_PATH)
+    for record in records:
+        path = os.path.join(out_dir, record["file"])
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            md = f.read()
+        research = archive.get_research(record["keyword"])
+        data = research["data"] if research else None
+        strategy = seo_pipeline.generate_content_strategy(
+            data["content_analyses"], record["keyword"], serp_features=data.get("serp_features")
+        ) if data and data.get("content_analyses") else None
+        structure = next((o for o in seo_pipeline.get_structure_options(record["keyword"], strategy)
+                          if o["id"] == record.get("structure_id")), None)
+        yield {
+            "name": os.path.splitext(record["file"])[0],
+            "keyword": record["keyword"],
+            "title": record.get("title"),
+            "markdown": md,
+            "competitor_data": data,
+            "strategy": strategy,
+            "headers": structure["headers"] if structure else None,
+            "target_words": record.get("word_count"),
+            "related_keywords": record.get("related_keywords", ""),
+            "source": "batch",
+            "meta": {**record, "research_refreshed_at": research["refreshed_at"] if research else None},
+        }
+
+def project_articles(project_ids: List[str] = None, limit: int = 100, store_path: str = DEFAULT_STORE_PATH) -> Iterator[Dict[str, Any]]:
+    """Proyectos guardados con artículo redactado (los más recientes primero, o los indicados)."""
+    store = get_store(store_path)
+    ids = project_ids or [p["id"] for p in store.list_projects(limit=limit)]
+    n = 0
+    for project_id in ids:
+        meta = store.load_meta(project_id)
+        if not meta or "final_md" not in meta["blobs"]:
+            continue
+        md = store.load_blob(project_id, "final_md")
+        if not md:
+            continue
+        n += 1
+        inputs = meta.get("inputs") or {}
+        yield {
+            "name": f"{n:04d}-{slugify(meta['keyword'] or meta['title'] or project_id)}",
+            "keyword": meta["keyword"],
+            "title": meta["title"] or inputs.get("title"),
+            "markdown": md,
+            "competitor_data": store.load_blob(project_id, "competitor_data"),
+            "strategy": store.load_blob(project_id, "content_strategy"),
+            "headers": (meta.get("selected_structure") or {}).get("headers"),
+            "target_words": inputs.get("wordCount"),
+            "related_keywords": inputs.get("relatedKeywords", ""),
+            "source": "project",
+            "meta": {k: meta[k] for k in ("id", "step", "inputs", "selected_structure", "created_at", "updated_at")},
+        }
+
+# =====================
+# CLI
+# =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta artículos a un ZIP (Markdown, HTML, DOCX y JSON con el research)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_batch = sub.add_parser("batch", help="Artículos de una salida de batch_generate.py")
+    p_batch.add_argument("dir", help="Directorio de salida del lote (con checkpoint.jsonl)")
+    p_projects = sub.add_parser("projects", help="Proyectos guardados de la app")
+    p_projects.add_argument("--id", action="append", default=[], help="Exportar solo estos proyectos (repetible)")
+    p_projects.add_argument("--limit", type=int, default=100, help="Proyectos más recientes a revisar")
+    p_projects.add_argument("--store", default=DEFAULT_STORE_PATH, help="Base de proyectos (SQLite)")
+    for p in (p_batch, p_projects):
+        p.add_argument("-o", "--output", default="articulos.zip", help="Archivo ZIP de salida (- para stdout)")
+        p.add_argument("--docx", action="store_true", help="Incluir .docx de cada artículo")
+        p.add_argument("--no-html", action="store_true", help="No incluir el HTML renderizado")
+        p.add_argument("--secrets", help="Leer configuración de un secrets.toml de Streamlit")
+        p.add_argument("--json", action="store_true", help="Imprimir el resumen en JSON")
+    args = parser.parse_args(argv)
+
+    seo_pipeline.configure(**load_secrets(args.secrets))
+    formats = ["md", "json"] + ([] if args.no_html else ["html"]) + (["docx"] if args.docx else [])
+    articles = batch_articles(args.dir) if args.cmd == "batch" else project_articles(args.id, args.limit, args.store)
+
+    def progress(line, done):
+        status = f"ERROR {line['error']}" if line.get("error") else f"{line['words']:,} palabras, calidad {line['quality_score']}"
+        print(f"[{done}] {line['name']}: {status}", file=sys.stderr)
+
+    if args.output == "-":
+        summary = write_zip(articles, sys.stdout.buffer, formats, progress=progress)
+    else:
+        tmp = f"{args.output}.tmp"
+        with open(tmp, "wb") as f:
+            summary = write_zip(articles, f, formats, progress=progress)
+        os.replace(tmp, args.output)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2), file=sys.stderr if args.output == "-" else sys.stdout)
+    else:
+        print(f"{summary['exported']} artículos exportados ({', '.join(summary['formats'])}), {summary['failed']} fallidos "
+              f"en {summary['wall_sec']}s", file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""
+Generación de artículos en lote desde un calendario de contenidos.
+
+Cada fila (CSV con cabecera o JSONL) describe un artículo:
+    keyword, title, tone, word_count, structure_id, related_keywords, ai_model
+
+Por fila se ejecuta el pipeline completo (research -> estrategia -> estructura
+-> redacción) con concurrencia acotada. Cada artículo terminado se guarda como
+Markdown y se anota en `checkpoint.jsonl`; si el proceso se corta, la siguiente
+ejecución salta las filas ya hechas (una fila editada cuenta como nueva).
+
+    python batch_generate.py calendario.csv -o salida/ --concurrency 4
+    python batch_generate.py clusters.csv -o salida/ --tone informativo   # CSV de keyword_clusters.py
+    python batch_generate.py calendario.csv -o salida/ --openai-batch       # redacción vía Batch API
+
+`structure_id` es el id de `get_structure_options` (1-3 plantillas, 4 la
+optimizada por competencia); por defecto se usa la optimizada si existe.
+Credenciales: variables de entorno o `--secrets .streamlit/secrets.toml`.
+
+Con `--openai-batch` el research se hace igual, pero la redacción se envía como
+un único job de la Batch API (`openai_batch.py`); el id del job queda en
+`openai_batch.json`, así que cortar y relanzar retoma la espera sin reenviar
+(las filas nuevas del calendario entran en el siguiente job).
+"""
+import argparse, csv, hashlib, json, os, re, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+import seo_pipeline
+import openai_batch
+from telemetry import start_trace
+from token_budget import plan_budget, usage_report
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+BATCH_STATE_FILE = "openai_batch.json"
+TOKEN_FIELDS = ("prompt_tokens", "cached_tokens", "completion_tokens", "total_tokens")
+DEFAULTS = {"tone": "profesional", "word_count": 1500, "related_keywords": "", "ai_model": "gpt-4o-mini"}
+# Alias de columnas aceptados (p.ej. el CSV del paso 2 o de keyword_clusters.py)
+ALIASES = {"wordCount": "word_count", "relatedKeywords": "related_keywords", "structure": "structure_id",
+           "main_keyword": "keyword", "model": "ai_model"}
+
+# =====================
+# Entrada
+# =====================
+def load_rows(path: str) -> List[Dict[str, Any]]:
+    """Filas normalizadas (CSV con cabecera o JSON/JSONL)."""
+    with open(path, encoding="utf-8-sig") as f:
+        text = f.read()
+    if path.endswith((".jsonl", ".json")):
+        try:
+            data = json.loads(text)
+            raw = data if isinstance(data, list) else data.get("items", [])
+        except ValueError:
+            raw = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        raw = list(csv.DictReader(text.splitlines()))
+
+    rows = []
+    for i, r in enumerate(raw, start=1):
+        row = {ALIASES.get(k, k): (v.strip() if isinstance(v, str) else v) for k, v in r.items() if k}
+        if not row.get("keyword"):
+            continue
+        row = {**DEFAULTS, **{k: v for k, v in row.items() if v not in (None, "")}}
+        row["title"] = row.get("title") or row["keyword"].capitalize()
+        row["word_count"] = int(row["word_count"])
+        row["structure_id"] = int(row["structure_id"]) if row.get("structure_id") else None
+        row["line"] = i
+        row["row_id"] = row_id(row)
+        rows.append(row)
+    return rows
+
+def row_id(row: Dict[str, Any]) -> str:
+    """Id estable del contenido de la fila (editarla la vuelve a generar)."""
+    key = {k: row.get(k) for k in ("keyword", "title", "tone", "word_count", "structure_id", "related_keywords", "ai_model")}
+    return hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+def slugify(text: str, max_len: int = 60) -> str:
+    text = text.lower()
+    for a, b in zip("áéíóúüñ", "aeiouun"):
+        text = text.replace(a, b)
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")[:max_len] or "articulo"
+
+# =====================
+# Checkpoints
+# =====================
+class Checkpoint:
+    """Registro append-only de filas terminadas (una línea JSON por resultado)."""
+
+    def __init__(self, out_dir: str):
+        self.path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self._lock = threading.Lock()
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # última línea cortada por un corte
+                    self.records[rec["row_id"]] = rec
+
+    def done(self, rid: str) -> bool:
+        return self.records.get(rid, {}).get("status") == "ok"
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[record["row_id"]] = record
+
+def _write_atomic(path: str, content: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+# =====================
+# Generación
+# =====================
+def _token_usage(rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    usage = dict.fromkeys(TOKEN_FIELDS, 0)
+    for r in rows:
+        if r["stage"] == "openai.chat_completion":
+            for k in usage:
+                usage[k] += int(r.get(k) or 0)
+    return usage
+
+def _record(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {"row_id": row["row_id"], "line": row["line"], "keyword": row["keyword"], "title": row["title"],
+            "word_count": row["word_count"], "related_keywords": row["related_keywords"]}
+
+def _error(record: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+    record.update({"status": "error", "error": f"{type(e).__name__}: {e}"[:300]})
+    return record
+
+def _save_article(record: Dict[str, Any], row: Dict[str, Any], out_dir: str, md: str, structure_id: int, usage: Dict[str, int]):
+    filename = f"{row['line']:04d}-{slugify(row['keyword'])}.md"
+    _write_atomic(os.path.join(out_dir, filename), md)
+    record.update({"status": "ok", "file": filename, "structure_id": structure_id, "words": len(md.split()), **usage})
+
+def research_row(row: Dict[str, Any]):
+    """Research + estrategia + estructura elegida de una fila -> (competitor_data, strategy, structure)."""
+    data = seo_pipeline.analyze_competitors(row["keyword"], incremental=True)
+    strategy = seo_pipeline.generate_content_strategy(
+        data["content_analyses"], row["keyword"], serp_features=data.get("serp_features")
+    ) if data.get("content_analyses") else None
+    options = seo_pipeline.get_structure_options(row["keyword"], strategy)
+    if row["structure_id"]:
+        structure = next((o for o in options if o["id"] == row["structure_id"]), None)
+        if structure is None:
+            raise ValueError(f"structure_id {row['structure_id']} no disponible (opciones: {[o['id'] for o in options]})")
+    else:
+        structure = next((o for o in options if o.get("optimized")), options[0])
+    return data, strategy, structure
+
+def _article_args(row: Dict[str, Any], data, strategy, structure, model_config: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        title=row["title"], keyword=row["keyword"], structure=structure, tone=row["tone"],
+        word_count=row["word_count"], related_keywords=row["related_keywords"],
+        competitor_data=data, strategy=strategy,
+        model_config={**model_config, "ai_model": row["ai_model"]},
+    )
+
+def generate_article(row: Dict[str, Any], out_dir: str, model_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Research + estrategia + redacción de una fila; escribe el .md y devuelve el registro."""
+    started = time.perf_counter()
+    record = _record(row)
+    try:
+        with start_trace("batch", keyword=row["keyword"]) as trace:
+            data, strategy, structure = research_row(row)
+            md = seo_pipeline.generate_content_with_openai(**_article_args(row, data, strategy, structure, model_config))
+        _save_article(record, row, out_dir, md, structure["id"], _token_usage(trace.waterfall()))
+    except Exception as e:
+        _error(record, e)
+    record["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    record["finished_at"] = time.time()
+    return record
+
+def run_batch(rows: List[Dict[str, Any]], out_dir: str, concurrency: int = 4, model_config: Dict[str, Any] = None,
+              retry_failed: bool = True, progress=None) -> Dict[str, Any]:
+    """Genera las filas pendientes y devuelve el resumen (throughput, tokens, fallos)."""
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = Checkpoint(out_dir)
+    pending = [r for r in rows if not checkpoint.done(r["row_id"])
+               and (retry_failed or r["row_id"] not in checkpoint.records)]
+    skipped = len(rows) - len(pending)
+
+    started = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(generate_article, row, out_dir, model_config or {}) for row in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            checkpoint.append(record)
+            results.append(record)
+            if progress:
+                progress(record, len(results), len(pending))
+    return _summary(rows, skipped, results, time.perf_counter() - started, checkpoint)
+
+def _summary(rows, skipped: int, results: List[Dict[str, Any]], wall: float, checkpoint: Checkpoint) -> Dict[str, Any]:
+    ok = [r for r in results if r["status"] == "ok"]
+    truncated = [r for r in results if r["status"] == "truncated"]
+    return {
+        "rows": len(rows),
+        "already_done": skipped,
+        "generated": len(ok),
+        "failed": len(results) - len(ok),
+        "truncated": len(truncated),
+        "failures": [{"line": r["line"], "keyword": r["keyword"], "error": r["error"]} for r in results if r["status"] != "ok"],
+        "wall_sec": round(wall, 1),
+        "articles_per_hour": round(len(ok) / wall * 3600, 1) if wall and ok else 0.0,
+        "avg_article_sec": round(sum(r["elapsed_sec"] for r in ok) / len(ok), 1) if ok else 0.0,
+        # Los artículos cortados también gastaron tokens
+        "tokens": {k: sum(r.get(k, 0) for r in ok + truncated) for k in TOKEN_FIELDS},
+        "token_estimates": usage_report(),
+        "checkpoint": checkpoint.path,
+    }
+
+# =====================
+# Modo Batch API
+# =====================
+def _load_state(out_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(out_dir, BATCH_STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def run_openai_batch(rows: List[Dict[str, Any]], out_dir: str, concurrency: int = 4, model_config: Dict[str, Any] = None,
+                     retry_failed: bool = True, poll_interval: float = 60.0, timeout: float = None,
+                     progress=None, on_poll=None) -> Dict[str, Any]:
+    """
+    Research concurrente de las filas pendientes, un único job de Batch API
+    para la redacción y escritura de los .md cuando termina. Si ya hay un job
+    en curso (`openai_batch.json`), solo espera y recoge sus resultados.
+    """
+    if not seo_pipeline.OPENAI_API_KEY:
+        raise SystemExit("--openai-batch requiere OPENAI_API_KEY")
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = Checkpoint(out_dir)
+    by_id = {r["row_id"]: r for r in rows}
+    already_done = sum(1 for r in rows if checkpoint.done(r["row_id"]))
+    started = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+
+    state = _load_state(out_dir)
+    if state is None:
+        pending = [r for r in rows if not checkpoint.done(r["row_id"])
+                   and (retry_failed or r["row_id"] not in checkpoint.records)]
+        requests, structures = {}, {}
+
+        def prepare(row):
+            data, strategy, structure = research_row(row)
+            request = seo_pipeline.build_chat_request(**_article_args(row, data, strategy, structure, model_config or {}))
+            # Sin continuaciones en la Batch API: el presupuesto de salida va entero en una llamada
+            request["max_tokens"] = plan_budget(request["messages"], request["model"], row["word_count"], request["max_tokens"])["max_tokens"]
+            return structure["id"], request
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {pool.submit(prepare, row): row for row in pending}
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    structures[row["row_id"]], requests[row["row_id"]] = future.result()
+                except Exception as e:
+                    record = _error(_record(row), e)
+                    record.update({"elapsed_sec": round(time.perf_counter() - started, 2), "finished_at": time.time()})
+                    checkpoint.append(record)
+                    results.append(record)
+                    if progress:
+                        progress(record, len(results), len(pending))
+        if not requests:
+            return _summary(rows, len(rows) - len(pending), results, time.perf_counter() - started, checkpoint)
+        batch_id = openai_batch.submit_batch(requests, metadata={"source": "batch_generate"})
+        state = {"batch_id": batch_id, "submitted_at": time.time(), "structures": structures}
+        _write_atomic(os.path.join(out_dir, BATCH_STATE_FILE), json.dumps(state, indent=2))
+
+    batch = openai_batch.wait_for_batch(state["batch_id"], poll_interval=poll_interval, timeout=timeout, on_poll=on_poll)
+    outputs = openai_batch.fetch_results(batch)
+    for row_id, structure_id in state["structures"].items():
+        row = by_id.get(row_id)
+        if row is None or checkpoint.done(row_id):
+            continue  # fila editada/quitada del calendario, o ya guardada
+        record = _record(row)
+        out = outputs.get(row_id) or {"error": f"sin respuesta (batch {batch.status})"}
+        if "error" in out:
+            record.update({"status": "error", "error": f"BatchError: {out['error']}"[:300]})
+        else:
+            usage = {k: int(out["usage"].get(k) or 0) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}
+            usage["cached_tokens"] = seo_pipeline.cached_tokens(out["usage"])
+            _save_article(record, row, out_dir, out["content"], structure_id, usage)
+            record["finish_reason"] = out["finish_reason"]
+            if out["finish_reason"] == "length":
+                # Sin continuaciones en la Batch API: el .md queda como borrador, pero la fila
+                # no cuenta como hecha y la próxima ejecución la vuelve a generar
+                record.update({"status": "truncated",
+                               "error": "Salida cortada por max_tokens (Batch API); se reintenta en la próxima ejecución "
+                                        "(sin --openai-batch se completa con continuaciones)"})
+        record["batch_id"] = state["batch_id"]
+        record["elapsed_sec"] = round(time.time() - state["submitted_at"], 2)
+        record["finished_at"] = time.time()
+        checkpoint.append(record)
+        results.append(record)
+        if progress:
+            progress(record, len(results), len(state["structures"]))
+    os.remove(os.path.join(out_dir, BATCH_STATE_FILE))
+
+    summary = _summary(rows, already_done, results, time.perf_counter() - started, checkpoint)
+    summary["batch_id"] = state["batch_id"]
+    return summary
+
+def load_secrets(path: Optional[str]) -> Dict[str, Any]:
+    """Configuración del pipeline desde un secrets.toml de Streamlit (solo las claves de SETTINGS)."""
+    if not path:
+        return {}
+    import tomllib  # Python 3.11+
+    with open(path, "rb") as f:
+        secrets = tomllib.load(f)
+    return {k: v for k, v in secrets.items() if k in seo_pipeline.SETTINGS and v not in ("", None)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera artículos en lote con checkpoints reanudables")
+    parser.add_argument("input", help="CSV (con cabecera) o JSONL: keyword, title, tone, word_count, structure_id...")
+    parser.add_argument("-o", "--output", default="articulos", help="Directorio de salida (.md + checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Artículos en paralelo")
+    parser.add_argument("--limit", type=int, help="Procesar solo las primeras N filas")
+    parser.add_argument("--tone", help="Tono por defecto para filas sin tono")
+    parser.add_argument("--word-count", type=int, help="Extensión por defecto para filas sin word_count")
+    parser.add_argument("--temperature", type=float, default=0.6)
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--mode", default="Balanced", choices=["Balanced", "SEO-Focused", "Creative", "Technical"])
+    parser.add_argument("--no-retry-failed", action="store_true", help="No reintentar filas que fallaron antes")
+    parser.add_argument("--openai-batch", action="store_true", help="Redactar vía OpenAI Batch API (más barato, hasta 24 h)")
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="Batch API: segundos entre consultas de estado")
+    parser.add_argument("--batch-timeout", type=float, help="Batch API: dejar de esperar tras N segundos (el job sigue; relanzar retoma)")
+    parser.add_argument("--secrets", help="Leer credenciales de un secrets.toml de Streamlit")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen en JSON")
+    args = parser.parse_args(argv)
+
+    seo_pipeline.configure(**load_secrets(args.secrets))
+    if args.tone:
+        DEFAULTS["tone"] = args.tone
+    if args.word_count:
+        DEFAULTS["word_count"] = args.word_count
+    rows = load_rows(args.input)[:args.limit]
+    model_config = {"temperature": args.temperature, "max_tokens": args.max_tokens, "optimization_mode": args.mode}
+
+    def progress(record, done, total):
+        status = f"ok {record.get('file')}" if record["status"] == "ok" else f"ERROR {record['error']}"
+        print(f"[{done}/{total}] {record['keyword']}: {status} ({record['elapsed_sec']}s)", file=sys.stderr)
+
+    if args.openai_batch:
+        def on_poll(batch):
+            counts = batch.request_counts
+            done = f" ({counts.completed}/{counts.total})" if counts and counts.total else ""
+            print(f"Batch {batch.id}: {batch.status}{done}", file=sys.stderr)
+        try:
+            summary = run_openai_batch(rows, args.output, args.concurrency, model_config, retry_failed=not args.no_retry_failed,
+                                       poll_interval=args.poll_interval, timeout=args.batch_timeout,
+                                       progress=None if args.json else progress, on_poll=None if args.json else on_poll)
+        except TimeoutError as e:
+            print(f"{e}. Relanza el mismo comando para retomar la espera.", file=sys.stderr)
+            return 2
+    else:
+        summary = run_batch(rows, args.output, args.concurrency, model_config,
+                            retry_failed=not args.no_retry_failed, progress=None if args.json else progress)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(f"\n{summary['generated']} generados, {summary['failed']} fallidos ({summary['truncated']} cortados), "
+              f"{summary['already_done']} ya hechos "
+              f"de {summary['rows']} filas en {summary['wall_sec']}s — {summary['articles_per_hour']} artículos/hora")
+        t = summary["tokens"]
+        print(f"Tokens: {t['total_tokens']:,} (prompt {t['prompt_tokens']:,}, de ellos en caché {t['cached_tokens']:,}; "
+              f"completion {t['completion_tokens']:,})")
+        for u in summary["token_estimates"]:
+            print(f"  {u['model']}: salida {u['output_actual']:,} reales vs. {u['output_estimate']:,} estimados "
+                  f"({u['output_error_pct']:+}%), {u['avg_calls']} llamadas/artículo, {u['truncated']} cortados")
+        for f in summary["failures"]:
+            print(f"  línea {f['line']} ({f['keyword']}): {f['error']}")
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Benchmark offline del pipeline completo (research -> estrategia -> redacción)
+contra servidores simulados de DataForSEO y OpenAI (`mock_servers.py`).
+
+Ejecuta el código real de `seo_pipeline` (HTTP, reintentos, limitador,
+archivo SERP, telemetría) sin credenciales ni red, y reporta tiempo total,
+throughput y p50/p95 por etapa. Con `--baseline` compara contra una ejecución
+guardada y sale con código 1 si algo empeora más de `--max-regression`.
+Con `--replay` usa un cassette grabado (`cassette.py`) en vez de los mocks:
+payloads y tiempos reales, repetibles.
+
+    python benchmark.py --iterations 20 --concurrency 4 --save bench.json
+    python benchmark.py --iterations 20 --concurrency 4 --baseline bench.json
+    python benchmark.py --replay data/real.jsonl.gz --speed 0
+"""
+import argparse, json, os, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Dict, Any, List
+
+import seo_pipeline
+from cassette import use_cassette
+from deadline import Deadline
+from mock_servers import MockDataForSEO, MockOpenAI
+from rate_limit import DEFAULT_LIMITS, configure_limits
+from telemetry import start_trace
+from token_budget import reset_usage, usage_report
+
+MODEL_CONFIG = {"ai_model": "gpt-4o-mini", "temperature": 0.6, "max_tokens": 2000, "optimization_mode": "Balanced"}
+# Métricas comparadas con --baseline (más alto = peor salvo throughput)
+COMPARED = ("research.p95_ms", "generation.p95_ms", "pipeline.p95_ms", "throughput_per_min")
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    d = sorted(values)
+    q = lambda p: d[min(len(d) - 1, int(p * len(d)))] if d else 0.0
+    return {"count": len(d), "p50_ms": round(q(0.50), 1), "p95_ms": round(q(0.95), 1), "max_ms": round(d[-1], 1) if d else 0.0}
+
+def run_iteration(i: int) -> Dict[str, Any]:
+    """Un proyecto completo; devuelve las filas de las trazas y el resultado."""
+    keyword = f"keyword benchmark {i}"
+    out: Dict[str, Any] = {"keyword": keyword, "ok": False, "rows": []}
+    started = time.perf_counter()
+    try:
+        with start_trace("research", keyword=keyword) as trace:
+            data = seo_pipeline.analyze_competitors(keyword, deadline=Deadline(seo_pipeline.RESEARCH_BUDGET_SEC))
+            strategy = seo_pipeline.generate_content_strategy(
+                data["content_analyses"], keyword, serp_features=data.get("serp_features")
+            ) if data.get("content_analyses") else None
+        out["rows"] += trace.waterfall()
+        options = seo_pipeline.get_structure_options(keyword, strategy)
+        structure = next((o for o in options if o.get("optimized")), options[0])
+        with start_trace("generation", keyword=keyword) as trace:
+            md = seo_pipeline.generate_content_with_openai(
+                title=f"Guía de {keyword}", keyword=keyword, structure=structure, tone="Profesional",
+                word_count=1500, related_keywords="", competitor_data=data, strategy=strategy,
+                model_config=MODEL_CONFIG,
+            )
+        out["rows"] += trace.waterfall()
+        out["ok"] = bool(md)
+        out["warnings"] = data.get("warnings", [])
+        out["skipped_urls"] = len(data.get("research_budget", {}).get("skipped_urls", []))
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"[:200]
+    out["pipeline_ms"] = (time.perf_counter() - started) * 1000
+    return out
+
+def summarize(results: List[Dict[str, Any]], wall_sec: float, mocks: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    stages: Dict[str, List[float]] = {}
+    for r in results:
+        for row in r["rows"]:
+            name = row["stage"].replace(" (total)", "") if row["depth"] == -1 else row["stage"]
+            stages.setdefault(name, []).append(row["duration_ms"])
+    ok = [r for r in results if r["ok"]]
+    completions = [row for r in ok for row in r["rows"] if row["stage"] == "openai.chat_completion"]
+    tokens = {k: sum(int(row.get(k) or 0) for row in completions) for k in ("prompt_tokens", "cached_tokens", "completion_tokens")}
+    tokens["cache_hit_ratio"] = round(tokens["cached_tokens"] / tokens["prompt_tokens"], 3) if tokens["prompt_tokens"] else 0.0
+    return {
+        "config": config,
+        "iterations": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": sorted({r["error"] for r in results if r.get("error")})[:10],
+        "skipped_urls": sum(r.get("skipped_urls", 0) for r in results),
+        "wall_sec": round(wall_sec, 2),
+        "throughput_per_min": round(len(ok) / wall_sec * 60, 2) if wall_sec else 0.0,
+        "pipeline": _percentiles([r["pipeline_ms"] for r in ok]),
+        "stages": {name: _percentiles(v) for name, v in sorted(stages.items())},
+        "tokens": tokens,
+        "token_estimates": usage_report(),
+        "mocks": mocks,
+    }
+
+def _metric(report: Dict[str, Any], path: str) -> float:
+    if path == "throughput_per_min":
+        return report["throughput_per_min"]
+    name, key = path.split(".")
+    section = report["pipeline"] if name == "pipeline" else report["stages"].get(name, {})
+    return section.get(key, 0.0)
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Regresiones (mensajes) respecto a la línea base."""
+    regressions = []
+    for path in COMPARED:
+        old, new = _metric(baseline, path), _metric(report, path)
+        if not old:
+            continue
+        change = (old - new) / old if path == "throughput_per_min" else (new - old) / old
+        if change > max_regression:
+            regressions.append(f"{path}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def print_report(report: Dict[str, Any]):
+    print(f"Iteraciones: {report['iterations']} (ok {report['succeeded']}, fallidas {report['failed']}) "
+          f"en {report['wall_sec']}s — {report['throughput_per_min']} proyectos/min")
+    p = report["pipeline"]
+    print(f"Pipeline completo: p50 {p['p50_ms']} ms, p95 {p['p95_ms']} ms, máx {p['max_ms']} ms")
+    print(f"\n{'etapa':<36}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, s in report["stages"].items():
+        print(f"{name:<36}{s['count']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}")
+    t = report["tokens"]
+    print(f"\nTokens de prompt: {t['prompt_tokens']:,} (en caché {t['cached_tokens']:,}, {t['cache_hit_ratio']:.0%}) — "
+          f"completion {t['completion_tokens']:,}")
+    for u in report["token_estimates"]:
+        print(f"{u['model']}: salida estimada {u['output_estimate']:,} vs. real {u['output_actual']:,} ({u['output_error_pct']:+}%), "
+              f"prompt {u['prompt_error_pct']:+}%, {u['avg_calls']} llamadas/artículo")
+    for server, stats in report["mocks"].items():
+        print(f"\n{server}: {stats['requests']}" + (f" errores inyectados {stats['injected_errors']}" if stats["injected_errors"] else ""))
+    for err in report["errors"]:
+        print(f"Error: {err}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline del pipeline SEO con servidores simulados")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--warmup", type=int, default=1, help="Iteraciones previas que no se miden")
+    parser.add_argument("--dfs-latency", type=float, default=0.05, help="Latencia simulada de DataForSEO (s)")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="Latencia simulada de OpenAI (s)")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--keywords", type=int, help="Keywords distintas (se repiten cíclicamente: mide regeneraciones y caché de prompts)")
+    parser.add_argument("--serp-items", type=int, default=20)
+    parser.add_argument("--content-words", type=int, default=2000)
+    parser.add_argument("--completion-words", type=int, default=800)
+    parser.add_argument("--keep-limits", action="store_true",
+                        help="Mantener los límites de tasa de producción (por defecto se levantan)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="Cassette a reproducir (sin mocks)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay: 1 = tiempos grabados, 0 = máxima velocidad")
+    parser.add_argument("--record", help="Grabar los intercambios con los mocks en este cassette")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte en JSON")
+    parser.add_argument("--save", help="Guardar el reporte JSON en esta ruta")
+    parser.add_argument("--baseline", help="Reporte JSON previo contra el que comparar")
+    parser.add_argument("--max-regression", type=float, default=0.20, help="Empeoramiento tolerado (0.20 = 20%%)")
+    args = parser.parse_args(argv)
+
+    common = {"jitter": args.jitter, "error_rate": args.error_rate, "throttle_rate": args.throttle_rate, "seed": args.seed}
+    with ExitStack() as stack:
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        mocks = []
+        if args.replay:
+            # Las URLs base se conservan: en replay no sale nada a la red
+            cassette = use_cassette(args.replay, "replay", args.speed)
+        else:
+            dfs = stack.enter_context(MockDataForSEO(latency=args.dfs_latency, serp_items=args.serp_items,
+                                                     content_words=args.content_words, **common))
+            oai = stack.enter_context(MockOpenAI(latency=args.openai_latency, completion_words=args.completion_words, **common))
+            mocks = [("dataforseo", dfs), ("openai", oai)]
+            cassette = use_cassette(args.record, "record") if args.record else None
+            seo_pipeline.configure(DATAFORSEO_API_URL=dfs.url, OPENAI_BASE_URL=f"{oai.url}/v1")
+        seo_pipeline.configure(
+            DATAFORSEO_LOGIN="bench", DATAFORSEO_PASSWORD="bench", OPENAI_API_KEY="bench",
+            SERP_ARCHIVE_PATH=os.path.join(tmp, "serp_archive.sqlite3"),
+            MODEL_STATS_PATH=os.path.join(tmp, "model_stats.sqlite3"),
+        )
+        if not args.keep_limits:
+            configure_limits({family: {"rps": 10000, "burst": 10000, "max_in_flight": 1000} for family in DEFAULT_LIMITS})
+
+        for i in range(args.warmup):
+            run_iteration(-1 - i)
+        for _, mock in mocks:
+            mock.reset_stats()
+        reset_usage()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(run_iteration, [i % (args.keywords or args.iterations) for i in range(args.iterations)]))
+        wall = time.perf_counter() - started
+
+        config = {k: v for k, v in vars(args).items() if k not in ("json", "save", "baseline")}
+        mock_stats = {name: mock.stats() for name, mock in mocks}
+        if cassette is not None:
+            mock_stats["cassette"] = {"requests": dict(cassette.stats), "injected_errors": {}}
+        report = summarize(results, wall, mock_stats, config)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for msg in regressions:
+            print(f"REGRESIÓN {msg}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Grabación y reproducción de intercambios HTTP (DataForSEO y OpenAI).
+
+Todas las llamadas HTTP del pipeline pasan por `http_session()` (requests) y
+`openai_http_client()` (cliente httpx del SDK de OpenAI). Con un cassette
+activo:
+
+- "record": las respuestas reales se agregan a un archivo gzip (un miembro
+  gzip por intercambio, así un corte no corrompe lo ya grabado) con su tiempo
+  de respuesta y, en streaming, el instante de cada chunk.
+- "replay": no sale nada a la red; cada request se resuelve con la respuesta
+  grabada, con el tiempo original (`speed=1`), acelerado (`speed=4`) o a
+  máxima velocidad (`speed=0`).
+
+La búsqueda en replay es exacta (método + ruta + cuerpo normalizado) y, si no
+hay coincidencia, cae al siguiente intercambio grabado del mismo endpoint
+(ids en la ruta normalizados), así una keyword distinta de la grabada sigue
+recorriendo el parsing real. Se activa con HTTP_CASSETTE_MODE/HTTP_CASSETTE_PATH
+o con `use_cassette()`.
+"""
+import argparse, base64, gzip, hashlib, io, json, os, re, sys, threading, time
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:  # openai>=3 usa httpx2; versiones anteriores, httpx
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+FORMAT_VERSION = 1
+# Cabeceras que no se reproducen (el cuerpo se guarda ya decodificado en requests)
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+# En httpx se graban los bytes crudos del stream: su content-encoding sí se conserva
+RAW_BODY_HEADERS = {"content-encoding"}
+_ID_SEGMENT = re.compile(r"/[0-9a-f][0-9a-f-]{15,}(?=/|$)")
+
+class CassetteMiss(LookupError):
+    """No hay ningún intercambio grabado para la request en modo replay."""
+
+def _path(url: str) -> str:
+    parts = urlsplit(str(url))
+    return parts.path + (f"?{parts.query}" if parts.query else "")
+
+def _template(path: str) -> str:
+    return _ID_SEGMENT.sub("/{id}", path)
+
+def _body_key(body) -> str:
+    if not body:
+        return ""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        pass
+    return hashlib.sha256(body).hexdigest()[:24]
+
+def _encode(data: bytes) -> Dict[str, str]:
+    try:
+        return {"text": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+def _decode(obj: Dict[str, str]) -> bytes:
+    return obj["text"].encode("utf-8") if "text" in obj else base64.b64decode(obj.get("b64", ""))
+
+class Cassette:
+    """Archivo de intercambios grabados; seguro entre hilos."""
+
+    def __init__(self, path: str, mode: str = "replay", speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modo de cassette desconocido: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = float(speed)
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._exact: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._loose: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._cursor: Counter = Counter()
+        if mode == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        else:
+            for entry in load_entries(path):
+                self._exact.setdefault((entry["method"], entry["path"], entry["body_key"]), []).append(entry)
+                self._loose.setdefault((entry["method"], _template(entry["path"])), []).append(entry)
+
+    # --- Grabación ---
+    def record(self, method: str, url: str, body, status: int, headers, elapsed: float,
+               content: bytes = None, chunks: List[tuple] = None, raw: bool = False):
+        """`raw`: el cuerpo va tal cual llegó (sin decodificar), con su content-encoding."""
+        dropped = DROPPED_HEADERS - RAW_BODY_HEADERS if raw else DROPPED_HEADERS
+        entry = {
+            "v": FORMAT_VERSION,
+            "method": method.upper(),
+            "path": _path(url),
+            "body_key": _body_key(body),
+            "status": status,
+            "headers": {k: v for k, v in dict(headers).items() if k.lower() not in dropped},
+            "elapsed": round(elapsed, 4),
+            "recorded_at": time.time(),
+        }
+        if chunks is not None:
+            entry["chunks"] = [[round(t, 4), _encode(c)] for t, c in chunks]
+        else:
+            entry["body"] = _encode(content or b"")
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(gzip.compress(line))
+            self.stats["recorded"] += 1
+
+    # --- Reproducción ---
+    def find(self, method: str, url: str, body) -> Dict[str, Any]:
+        method, path = method.upper(), _path(url)
+        with self._lock:
+            for kind, key, index in (
+                ("exact", (method, path, _body_key(body)), self._exact),
+                ("loose", (method, _template(path)), self._loose),
+            ):
+                entries = index.get(key)
+                if entries:
+                    # Se recorren en orden y se reciclan (varias sesiones pueden pedir lo mismo)
+                    entry = entries[self._cursor[key] % len(entries)]
+                    self._cursor[key] += 1
+                    self.stats[f"{kind}_hits"] += 1
+                    return entry
+            self.stats["misses"] += 1
+        raise CassetteMiss(f"Sin respuesta grabada para {method} {path}")
+
+    def delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed > 0 else 0.0
+
+    def endpoints(self) -> Counter:
+        """Intercambios grabados por endpoint (ruta con ids normalizados)."""
+        return Counter({f"{m} {p}": len(v) for (m, p), v in self._loose.items()})
+
+def load_entries(path: str) -> List[Dict[str, Any]]:
+    """Lee todos los intercambios; tolera un último miembro gzip truncado."""
+    entries = []
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        text = gzip.decompress(raw)
+    except (EOFError, gzip.BadGzipFile):
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=io.BytesIO(raw)) as g:
+            try:
+                while True:
+                    block = g.read(65536)
+                    if not block:
+                        break
+                    buf.write(block)
+            except (EOFError, gzip.BadGzipFile):
+                pass
+        text = buf.getvalue()
+    for line in text.decode("utf-8").splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue  # línea cortada por un corte durante la grabación
+    return entries
+
+# =====================
+# Transporte requests (DataForSEO)
+# =====================
+class CassetteAdapter(HTTPAdapter):
+    """HTTPAdapter que graba o reproduce según el cassette."""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, stream=False, timeout=None, **kwargs):
+        if self.cassette.mode == "record":
+            started = time.perf_counter()
+            response = super().send(request, stream=stream, timeout=timeout, **kwargs)
+            content = response.content
+            self.cassette.record(request.method, request.url, request.body, response.status_code,
+                                 response.headers, time.perf_counter() - started, content=content)
+            return response
+
+        try:
+            entry = self.cassette.find(request.method, request.url, request.body)
+        except CassetteMiss as e:
+            raise requests.ConnectionError(str(e), request=request)
+        delay = self.cassette.delay(entry["elapsed"])
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+        if read_timeout is not None and delay > read_timeout:
+            time.sleep(read_timeout)
+            raise requests.ReadTimeout(f"Replay: la respuesta grabada tardó {entry['elapsed']}s", request=request)
+        time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = _decode(entry["body"]) if "body" in entry else b"".join(_decode(c) for _, c in entry["chunks"])
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.reason = "Replayed"
+        response.connection = self
+        return response
+
+# =====================
+# Transporte httpx (SDK de OpenAI)
+# =====================
+class _RecordingStream(httpx.SyncByteStream):
+    """Deja pasar el stream real y graba cada chunk con su instante al cerrarse."""
+
+    def __init__(self, inner, cassette: Cassette, request, response, started: float):
+        self._inner = inner
+        self._cassette = cassette
+        self._request = request
+        self._response = response
+        self._started = started
+        self._chunks: List[tuple] = []
+
+    def __iter__(self):
+        for chunk in self._inner:
+            self._chunks.append((time.perf_counter() - self._started, chunk))
+            yield chunk
+
+    def close(self):
+        self._inner.close()
+        elapsed = self._chunks[-1][0] if self._chunks else time.perf_counter() - self._started
+        self._cassette.record(self._request.method, str(self._request.url), self._request.content,
+                              self._response.status_code, self._response.headers, elapsed,
+                              chunks=self._chunks, raw=True)
+
+class _ReplayStream(httpx.SyncByteStream):
+    """Entrega los chunks grabados respetando sus tiempos (escalados por speed)."""
+
+    def __init__(self, cassette: Cassette, chunks: List[tuple], started: float):
+        self._cassette = cassette
+        self._chunks = chunks
+        self._started = started
+
+    def __iter__(self):
+        for offset, chunk in self._chunks:
+            wait = self._cassette.delay(offset) - (time.perf_counter() - self._started)
+            if wait > 0:
+                time.sleep(wait)
+            yield chunk
+
+class CassetteTransport(httpx.BaseTransport):
+    def __init__(self, cassette: Cassette, inner: "httpx.BaseTransport" = None):
+        self.cassette = cassette
+        self._inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        if self.cassette.mode == "record":
+            request.read()
+            response = self._inner.handle_request(request)
+            # Se graban los bytes tal cual (con su content-encoding) para reproducirlos idénticos
+            response.stream = _RecordingStream(response.stream, self.cassette, request, response, started)
+            return response
+
+        request.read()
+        try:
+            entry = self.cassette.find(request.method, str(request.url), request.content)
+        except CassetteMiss as e:
+            raise httpx.ConnectError(str(e), request=request)
+        if "chunks" in entry:
+            chunks = [(t, _decode(c)) for t, c in entry["chunks"]]
+        else:
+            chunks = [(entry["elapsed"], _decode(entry["body"]))]
+        # Tiempo hasta las cabeceras: el del primer chunk
+        time.sleep(self.cassette.delay(chunks[0][0] if chunks else entry["elapsed"]))
+        return httpx.Response(entry["status"], headers=entry["headers"],
+                              stream=_ReplayStream(self.cassette, chunks, started), request=request)
+
+    def close(self):
+        self._inner.close()
+
+# =====================
+# Registro por proceso
+# =====================
+_active: Optional[Cassette] = None
+_session: Optional[requests.Session] = None
+_openai_client = None
+_registry_lock = threading.Lock()
+
+def use_cassette(path: str, mode: str = "replay", speed: float = 1.0) -> Cassette:
+    """Activa un cassette para todo el proceso (idempotente con los mismos parámetros)."""
+    global _active, _session, _openai_client
+    with _registry_lock:
+        if _active and (_active.path, _active.mode, _active.speed) == (path, mode, float(speed)):
+            return _active
+        _active = Cassette(path, mode, speed)
+        _session = _openai_client = None
+        return _active
+
+def stop_cassette():
+    global _active, _session, _openai_client
+    with _registry_lock:
+        _active = _session = _openai_client = None
+
+def active_cassette() -> Optional[Cassette]:
+    return _active
+
+def http_session() -> requests.Session:
+    """Sesión requests compartida; con cassette activo, graba o reproduce."""
+    global _session
+    with _registry_lock:
+        if _session is None:
+            session = requests.Session()
+            if _active is not None:
+                adapter = CassetteAdapter(_active, pool_maxsize=32)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+            _session = session
+        return _session
+
+def openai_http_client():
+    """Cliente httpx para OpenAI(http_client=...) con el cassette; None si no hay cassette."""
+    global _openai_client
+    with _registry_lock:
+        if _active is None:
+            return None
+        if _openai_client is None:
+            from openai import DefaultHttpxClient
+            _openai_client = DefaultHttpxClient(transport=CassetteTransport(_active))
+        return _openai_client
+
+_env_mode = os.getenv("HTTP_CASSETTE_MODE")
+_env_path = os.getenv("HTTP_CASSETTE_PATH")
+if _env_mode and _env_path:
+    use_cassette(_env_path, _env_mode, float(os.getenv("HTTP_CASSETTE_SPEED", "1")))
+
+# =====================
+# CLI
+# =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspecciona un cassette HTTP grabado")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+    entries = load_entries(args.path)
+    size = sum(len(json.dumps(e)) for e in entries)
+    print(f"{len(entries)} intercambios, {size / 1024:.0f} KiB sin comprimir, {os.path.getsize(args.path) / 1024:.0f} KiB en disco")
+    by_endpoint: Dict[str, List[float]] = {}
+    for e in entries:
+        by_endpoint.setdefault(f"{e['method']} {_template(e['path'])}", []).append(e["elapsed"])
+    for name, times in sorted(by_endpoint.items()):
+        times.sort()
+        print(f"{len(times):>5}  p50 {times[len(times) // 2] * 1000:>8.0f} ms  máx {times[-1] * 1000:>8.0f} ms  {name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Presupuesto de tiempo de extremo a extremo y circuit breaker por proveedor.
+
+Un `Deadline` viaja por todo el pipeline de research: cada etapa pide su
+timeout con `deadline.timeout(tope)` y recibe lo que queda del presupuesto.
+El `CircuitBreaker` corta en seco cuando un proveedor acumula fallos, en vez
+de esperar cada timeout.
+"""
+import threading, time
+from typing import Dict, Any, Optional
+
+from shared import shared_instance, shared_instances
+
+class DeadlineExceeded(TimeoutError):
+    """El presupuesto de tiempo se agotó antes de terminar la etapa."""
+
+class CircuitOpenError(RuntimeError):
+    """El proveedor falló repetidamente; se rechaza la llamada sin esperar."""
+
+class Deadline:
+    """Presupuesto absoluto (reloj monotónico) compartido por todas las etapas."""
+
+    def __init__(self, budget_sec: float):
+        self.budget_sec = float(budget_sec)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget_sec
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float, floor: float = 1.0) -> float:
+        """Timeout para una llamada: min(cap, restante). Falla si queda menos que `floor`."""
+        remaining = self.remaining()
+        if remaining < floor:
+            raise DeadlineExceeded(f"Presupuesto agotado ({self.budget_sec:.0f}s)")
+        return min(cap, remaining)
+
+    def share(self, fraction: float) -> "Deadline":
+        """Sub-presupuesto: una fracción de lo que queda (nunca más allá del padre)."""
+        return Deadline(self.remaining() * fraction)
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failure_threshold` fallos seguidos; tras `reset_timeout`
+    deja pasar una llamada de prueba (half-open) que lo cierra o lo reabre.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """
+        Lanza CircuitOpenError si el circuito no deja pasar la llamada.
+        Devuelve True si esta llamada es la prueba half-open (hay que cerrarla con `settle`).
+        """
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"{self.name}: proveedor no disponible, reintento en {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    def settle(self, healthy: Optional[bool], probe: bool = False):
+        """
+        Cierra una llamada autorizada por `allow()`: éxito/fallo del proveedor, o
+        None si terminó sin respuesta que lo juzgue (DeadlineExceeded, error local);
+        en ese caso solo se libera la prueba half-open para que otra llamada la repita.
+        """
+        if healthy is True:
+            self.record_success()
+        elif healthy is False:
+            self.record_failure()
+        elif probe:
+            with self._lock:
+                self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"name": self.name, "state": self._state(), "consecutive_failures": self._failures}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Breaker compartido por proceso para un proveedor/familia."""
+    return shared_instance("breaker", name, lambda: CircuitBreaker(name))
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    return {b.name: b.snapshot() for b in shared_instances("breaker")}
@@ -0,0 +1,174 @@
+"""
+Cola de jobs persistente en SQLite (WAL) para la API HTTP (`api_server.py`).
+
+Cada job tiene un tipo (research, generate), sus parámetros en JSON y, al
+terminar, su resultado comprimido con zlib. Los workers toman el job en cola
+más antiguo con `claim()`, que lo deja a nombre de la cola (`owner`) con un
+lease de LEASE_SEC segundos; mientras corre, `heartbeat()` lo renueva. Si el
+proceso se corta, el lease vence y `requeue_stale()` (de cualquier proceso que
+comparta el archivo) lo devuelve a la cola (hasta MAX_ATTEMPTS intentos).
+
+    queue = JobQueue("data/jobs.sqlite3")
+    job_id = queue.submit("research", {"keyword": "estudiar enfermería"})
+    job = queue.claim()            # -> {"id", "kind", "params", ...} o None
+    queue.finish(job["id"], {"competitor_data": ...})
+"""
+import json, os, socket, sqlite3, threading, time, uuid, zlib
+from typing import Dict, Any, Iterable, List, Optional
+
+DEFAULT_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join("data", "jobs.sqlite3"))
+STATUSES = ("queued", "running", "done", "failed")
+# Intentos de un job antes de darlo por fallido (reinicios a mitad de ejecución)
+MAX_ATTEMPTS = 3
+# Vigencia del lease de un job en ejecución; el dueño lo renueva con heartbeat()
+LEASE_SEC = float(os.getenv("JOB_LEASE_SEC", "60"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result BLOB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+# Columnas agregadas después de la primera versión del esquema
+MIGRATIONS = {"owner": "TEXT", "lease_until": "REAL"}
+COLUMNS = "id, kind, status, params, error, attempts, created_at, started_at, finished_at"
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 6)
+
+def _unpack(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+class JobQueue:
+    """Jobs persistentes; seguro entre hilos y entre procesos que comparten el archivo."""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, owner: str = None):
+        self.path = path
+        # Identifica a este proceso en los jobs que toma (host:pid:aleatorio)
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.executescript(SCHEMA)
+            existing = {r[1] for r in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        job = dict(zip([c.strip() for c in COLUMNS.split(",")], row))
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex[:16]
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Marca como `running` (a nombre de esta cola) el job en cola más antiguo y lo devuelve (None si no hay)."""
+        conn = self._conn()
+        with self._write_lock, conn:
+            # BEGIN IMMEDIATE: otro proceso con el mismo archivo no puede tomar el mismo job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, owner = ?, lease_until = ? "
+                         "WHERE id = ?", (now, self.owner, now + LEASE_SEC, row[0]))
+        job = self._row(row)
+        job.update(status="running", started_at=now, attempts=job["attempts"] + 1)
+        return job
+
+    def finish(self, job_id: str, result: Any):
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute("UPDATE jobs SET status = 'done', result = ?, error = NULL, finished_at = ?, lease_until = NULL WHERE id = ?",
+                         (_pack(result), time.time(), job_id))
+
+    def fail(self, job_id: str, error: str):
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                         (error[:500], time.time(), job_id))
+
+    def heartbeat(self, job_ids: Iterable[str]) -> int:
+        """Renueva el lease de los jobs en ejecución de esta cola; devuelve cuántos siguen siendo suyos."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        conn = self._conn()
+        with self._write_lock, conn:
+            return conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ? "
+                f"AND id IN ({', '.join('?' * len(job_ids))})",
+                (time.time() + LEASE_SEC, self.owner, *job_ids),
+            ).rowcount
+
+    def requeue_stale(self) -> int:
+        """
+        Los jobs `running` con el lease vencido (su proceso murió o dejó de renovarlo)
+        vuelven a la cola, o fallan si agotaron intentos. Los que otro proceso vivo
+        sigue ejecutando no se tocan.
+        """
+        conn = self._conn()
+        now = time.time()
+        expired = "status = 'running' AND (lease_until IS NULL OR lease_until < ?)"
+        with self._write_lock, conn:
+            conn.execute(f"UPDATE jobs SET status = 'failed', error = 'Interrumpido demasiadas veces', finished_at = ?, "
+                         f"owner = NULL, lease_until = NULL WHERE {expired} AND attempts >= ?", (now, now, MAX_ATTEMPTS))
+            return conn.execute(f"UPDATE jobs SET status = 'queued', started_at = NULL, owner = NULL, lease_until = NULL "
+                                f"WHERE {expired}", (now,)).rowcount
+
+    def get(self, job_id: str, with_result: bool = True) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(f"SELECT {COLUMNS}, result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row(row[:-1])
+        if with_result:
+            job["result"] = _unpack(row[-1]) if row[-1] is not None else None
+        return job
+
+    def list(self, status: str = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Últimos jobs (sin resultado), opcionalmente filtrados por estado."""
+        where, args = ("WHERE status = ?", (status,)) if status else ("", ())
+        rows = self._conn().execute(
+            f"SELECT {COLUMNS} FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*args, limit)
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
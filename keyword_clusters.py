@@ -0,0 +1,267 @@
+"""
+Clustering de keywords por solapamiento de SERP (MinHash + LSH).
+
+Cada keyword se representa por el conjunto de URLs de su top N, ponderadas por
+posición (la #1 pesa más que la #10). Dos keywords que comparten casi los mismos
+resultados deben resolverse con un solo artículo.
+
+Uso:
+    python keyword_clusters.py serps.jsonl -o clusters.json
+    python keyword_clusters.py serps.jsonl --csv clusters.csv --threshold 0.35
+
+Cada línea del JSONL: {"keyword": "...", "items": [...]} con los items de
+DataForSEO, o {"keyword": "...", "serp_list": [...]} / {"keyword": "...", "urls": [...]}.
+Opcionalmente "volume" para elegir la keyword principal de cada cluster.
+"""
+import argparse, csv, hashlib, json, struct, sys
+from functools import lru_cache
+from typing import Dict, Any, List, Iterable, Tuple
+from urllib.parse import urlparse
+
+# =====================
+# Configuración
+# =====================
+TOP_N = 10          # URLs del SERP que definen a cada keyword
+NUM_PERM = 64       # Tamaño de la firma MinHash
+DEFAULT_THRESHOLD = 0.4
+# El umbral LSH va por debajo del pedido: en el punto medio de la curva S solo
+# ~la mitad de los pares en el umbral serían candidatos. Los falsos positivos
+# los descarta después el Jaccard exacto.
+LSH_THRESHOLD_FACTOR = 0.7
+MAX_BUCKET_PAIRS = 50  # Buckets más grandes se enlazan en estrella (evita O(n²))
+TOKEN_CACHE_SIZE = 16384  # Hashes de tokens (url#i) en memoria, ~2.5 KB cada uno
+
+# =====================
+# Representación de cada keyword
+# =====================
+def normalize_url(url: str) -> str:
+    """Normaliza URL para comparar (sin esquema, www, fragmento ni / final)."""
+    if not url:
+        return ""
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = parsed.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parsed.path.rstrip("/")
+    query = f"?{parsed.query}" if parsed.query else ""
+    return f"{host}{path}{query}"
+
+def ranked_urls(entry: Dict[str, Any], top_n: int = TOP_N) -> List[str]:
+    """
+    Extrae las URLs ordenadas por ranking desde items de DataForSEO,
+    filas de build_serp_items (serp_list) o una lista simple de URLs.
+    """
+    if entry.get("urls"):
+        urls = list(entry["urls"])
+    elif entry.get("items"):
+        items = entry["items"]
+        organic = [it for it in items if it.get("type") == "organic" and it.get("url")]
+        picked = organic or [it for it in items if it.get("url")]
+        picked = sorted(picked, key=lambda it: it.get("rank_group") or it.get("rank_absolute") or 9999)
+        urls = [it["url"] for it in picked]
+    else:
+        rows = entry.get("serp_list") or []
+        urls = [r["url"] for r in sorted(rows, key=lambda r: r.get("pos") or 9999) if r.get("url")]
+
+    out = []
+    for u in urls:
+        nu = normalize_url(u)
+        if nu and nu not in out:
+            out.append(nu)
+        if len(out) >= top_n:
+            break
+    return out
+
+def url_weights(urls: List[str], top_n: int = TOP_N) -> Dict[str, int]:
+    """Peso entero por posición: #1 -> top_n, #top_n -> 1."""
+    return {u: top_n - i for i, u in enumerate(urls[:top_n])}
+
+def weighted_jaccard(a: Dict[str, int], b: Dict[str, int]) -> float:
+    """Jaccard ponderado: sum(min) / sum(max)."""
+    if not a or not b:
+        return 0.0
+    num = 0
+    den = 0
+    for u in a.keys() | b.keys():
+        wa, wb = a.get(u, 0), b.get(u, 0)
+        num += min(wa, wb)
+        den += max(wa, wb)
+    return num / den if den else 0.0
+
+# =====================
+# MinHash + LSH
+# =====================
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _token_hashes(token: str) -> Tuple[int, ...]:
+    """NUM_PERM hashes independientes de 32 bits para un token (una llamada a SHAKE)."""
+    return struct.unpack(f"<{NUM_PERM}I", hashlib.shake_128(token.encode()).digest(4 * NUM_PERM))
+
+def minhash_signature(weights: Dict[str, int]) -> Tuple[int, ...]:
+    """
+    Firma MinHash del conjunto ponderado. Cada URL con peso w se expande en
+    w tokens (url#0..url#w-1), así el Jaccard de los conjuntos expandidos
+    equivale al Jaccard ponderado con pesos enteros.
+    """
+    vectors = [_token_hashes(f"{u}#{i}") for u, w in weights.items() for i in range(w)]
+    if not vectors:
+        return ()
+    return tuple(map(min, zip(*vectors)))
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    Elige (bandas, filas) con el umbral (1/b)^(1/r) más alto que no pase de
+    threshold * LSH_THRESHOLD_FACTOR (más alto = menos candidatos que verificar).
+    """
+    target = threshold * LSH_THRESHOLD_FACTOR
+    best = (num_perm, 1)
+    best_lsh = 0.0
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        lsh = (1 / bands) ** (1 / rows)
+        if best_lsh < lsh <= target:
+            best, best_lsh = (bands, rows), lsh
+    return best
+
+def candidate_pairs(signatures: List[Tuple[int, ...]], threshold: float) -> Iterable[Tuple[int, int]]:
+    """Pares candidatos que comparten al menos una banda LSH."""
+    bands, rows = lsh_params(threshold)
+    seen = set()
+    for b in range(bands):
+        buckets: Dict[Tuple[int, ...], List[int]] = {}
+        lo, hi = b * rows, (b + 1) * rows
+        for idx, sig in enumerate(signatures):
+            if sig:
+                buckets.setdefault(sig[lo:hi], []).append(idx)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) <= MAX_BUCKET_PAIRS:
+                pairs = ((members[i], members[j]) for i in range(len(members)) for j in range(i + 1, len(members)))
+            else:
+                pairs = ((members[0], m) for m in members[1:])
+            for pair in pairs:
+                if pair not in seen:
+                    seen.add(pair)
+                    yield pair
+
+# =====================
+# Clustering
+# =====================
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def cluster_keywords(entries: List[Dict[str, Any]], threshold: float = DEFAULT_THRESHOLD, top_n: int = TOP_N) -> List[Dict[str, Any]]:
+    """
+    Agrupa keywords cuyo Jaccard ponderado de SERP supera `threshold`.
+    Los candidatos salen de LSH y se verifican con el Jaccard exacto.
+    """
+    keywords = [e["keyword"] for e in entries]
+    weights = [url_weights(ranked_urls(e, top_n), top_n) for e in entries]
+    signatures = [minhash_signature(w) for w in weights]
+
+    parent = list(range(len(entries)))
+    for i, j in candidate_pairs(signatures, threshold):
+        if weighted_jaccard(weights[i], weights[j]) >= threshold:
+            ri, rj = _find(parent, i), _find(parent, j)
+            if ri != rj:
+                parent[rj] = ri
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(entries)):
+        groups.setdefault(_find(parent, i), []).append(i)
+
+    clusters = [_describe_cluster(members, keywords, weights, entries) for members in groups.values()]
+    clusters.sort(key=lambda c: (-c["size"], c["main_keyword"]))
+    for n, c in enumerate(clusters, 1):
+        c["cluster_id"] = n
+    return clusters
+
+def _describe_cluster(members: List[int], keywords: List[str], weights: List[Dict[str, int]], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Resumen del cluster listo para redacción: keyword principal + relacionadas."""
+    # Keyword principal: mayor volumen si existe; si no, la más central del grupo
+    sample = members[:200]
+    centrality = {
+        i: sum(weighted_jaccard(weights[i], weights[j]) for j in sample if j != i) for i in members
+    } if len(members) > 1 else {members[0]: 0.0}
+    main = max(members, key=lambda i: (entries[i].get("volume") or 0, centrality.get(i, 0.0), -len(keywords[i])))
+
+    url_hits: Dict[str, int] = {}
+    for i in members:
+        for u in weights[i]:
+            url_hits[u] = url_hits.get(u, 0) + 1
+    shared = sorted((u for u, n in url_hits.items() if n >= max(2, len(members) / 2)), key=lambda u: -url_hits[u])
+
+    pairs = [(i, j) for a, i in enumerate(sample) for j in sample[a + 1:]]
+    avg_sim = sum(weighted_jaccard(weights[i], weights[j]) for i, j in pairs) / len(pairs) if pairs else 1.0
+
+    related = [keywords[i] for i in members if i != main]
+    return {
+        "main_keyword": keywords[main],
+        "keywords": [keywords[i] for i in members],
+        "related_keywords": ", ".join(related),
+        "size": len(members),
+        "avg_similarity": round(avg_sim, 3),
+        "shared_urls": shared[:10],
+        "total_volume": sum(entries[i].get("volume") or 0 for i in members),
+    }
+
+# =====================
+# Entrada / salida
+# =====================
+def load_entries(path: str) -> List[Dict[str, Any]]:
+    """Lee JSONL (una keyword por línea) o JSON {keyword: items}."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, list):
+        return data
+    if "keyword" in data:
+        return [data]
+    return [{"keyword": k, "items": v} if isinstance(v, list) else {"keyword": k, **v} for k, v in data.items()]
+
+def write_csv(clusters: List[Dict[str, Any]], path: str):
+    """CSV con una fila por artículo a redactar."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["cluster_id", "keyword", "related_keywords", "size", "avg_similarity", "total_volume"])
+        for c in clusters:
+            w.writerow([c["cluster_id"], c["main_keyword"], c["related_keywords"], c["size"], c["avg_similarity"], c["total_volume"]])
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Agrupa keywords por solapamiento de URLs en el SERP (MinHash/LSH).")
+    parser.add_argument("input", help="JSONL/JSON con keyword + items/serp_list/urls")
+    parser.add_argument("-o", "--output", help="Ruta del reporte JSON (por defecto stdout)")
+    parser.add_argument("--csv", help="Ruta opcional de CSV (keyword, related_keywords) para redacción")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Jaccard ponderado mínimo (0-1)")
+    parser.add_argument("--top", type=int, default=TOP_N, help="URLs del top que se comparan")
+    args = parser.parse_args(argv)
+
+    entries = load_entries(args.input)
+    clusters = cluster_keywords(entries, threshold=args.threshold, top_n=args.top)
+    report = {
+        "keywords": len(entries),
+        "clusters": len(clusters),
+        "threshold": args.threshold,
+        "items": clusters,
+    }
+
+    if args.csv:
+        write_csv(clusters, args.csv)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+"""
+Prueba de carga multi-sesión de la app de Streamlit contra backends simulados.
+
+Arranca `streamlit run app.py` apuntando a los servidores de `mock_servers.py`
+y abre N sesiones por websocket (el mismo protocolo protobuf que usa el
+navegador). Cada sesión recorre los pasos 1 a 4 como un usuario: escribe la
+keyword, analiza, pasa al paso 2, envía el formulario, elige estructura y
+espera la redacción. Así se mide el servidor real: sus hilos de script, las
+llamadas bloqueantes y el polling compiten igual que en producción.
+
+Se ejecuta por niveles de concurrencia (p.ej. 1, 2, 4, 8, 16) y reporta por
+nivel p50/p95 de cada paso, CPU (núcleos) y RSS del proceso del servidor, y el
+primer nivel donde la latencia se degrada respecto al nivel base.
+
+    python loadtest.py --levels 1,2,4,8 --sessions-per-level 8
+
+Requiere el paquete `websockets` (pip install websockets). CPU/RSS del
+servidor se leen de /proc (Linux).
+"""
+import argparse, json, os, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+import requests
+
+from mock_servers import MockDataForSEO, MockOpenAI
+from rate_limit import DEFAULT_LIMITS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+STEPS = ("load", "keyword", "research", "to_inputs", "inputs", "generation")
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    d = sorted(values)
+    q = lambda p: d[min(len(d) - 1, int(p * len(d)))] if d else 0.0
+    return {"count": len(d), "p50_ms": round(q(0.50), 1), "p95_ms": round(q(0.95), 1), "max_ms": round(d[-1], 1) if d else 0.0}
+
+# =====================
+# Cliente de sesión (protocolo websocket de Streamlit)
+# =====================
+class SessionError(RuntimeError):
+    """La app mostró una excepción o un error, o no apareció el widget esperado."""
+
+class StreamlitSession:
+    """Una pestaña de navegador simulada: reruns con estados de widgets y lectura de elementos."""
+
+    def __init__(self, ws, timeout: float = 300):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        self._BackMsg, self._ForwardMsg, self._WidgetState = BackMsg, ForwardMsg, WidgetState
+        self.timeout = timeout
+        self._ws = ws
+        self.elements: List[Tuple[str, Any]] = []
+        self._values: Dict[str, Any] = {}
+        self._page_hash = ""
+
+    def rerun(self, triggers: List[str] = ()) -> List[Tuple[str, Any]]:
+        """Envía un rerun (valores persistentes + botones pulsados) y espera a que termine."""
+        msg = self._BackMsg()
+        client = msg.rerun_script
+        client.page_script_hash = self._page_hash
+        for state in self._values.values():
+            client.widget_states.widgets.append(state)
+        for widget_id in triggers:
+            client.widget_states.widgets.add(id=widget_id, trigger_value=True)
+        self._ws.send(msg.SerializeToString())
+
+        deadline = time.monotonic() + self.timeout
+        elements: List[Tuple[str, Any]] = []
+        while True:
+            fm = self._ForwardMsg()
+            fm.ParseFromString(self._ws.recv(timeout=max(0.1, deadline - time.monotonic())))
+            kind = fm.WhichOneof("type")
+            if kind == "new_session":
+                elements = []  # cada ejecución (incluidas las de st.rerun) empieza de cero
+                self._page_hash = fm.new_session.page_script_hash or self._page_hash
+            elif kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                el = fm.delta.new_element
+                name = el.WhichOneof("type")
+                elements.append((name, getattr(el, name)))
+            elif kind == "script_finished" and fm.script_finished != self._ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.elements = elements
+        present = {getattr(p, "id", None) for _, p in elements}
+        self._values = {k: v for k, v in self._values.items() if k in present}
+        self._raise_on_error()
+        return elements
+
+    def _raise_on_error(self):
+        for name, proto in self.elements:
+            if name == "exception":
+                raise SessionError(f"excepción en la app: {proto.message[:150]}")
+            if name == "alert" and proto.format == 1 and "Error" in proto.body:  # Alert.ERROR
+                raise SessionError(proto.body[:150])
+
+    def widget(self, kind: str, label: str):
+        for name, proto in self.elements:
+            if name == kind and label in getattr(proto, "label", ""):
+                return proto
+        raise SessionError(f"no se encontró {kind} '{label}'")
+
+    def set_text(self, label: str, value: str, kind: str = "text_input"):
+        proto = self.widget(kind, label)
+        self._values[proto.id] = self._WidgetState(id=proto.id, string_value=value)
+
+    def click(self, label: str) -> List[Tuple[str, Any]]:
+        proto = self.widget("button", label)
+        if proto.disabled:
+            raise SessionError(f"botón deshabilitado: {label}")
+        return self.rerun([proto.id])
+
+    def has_heading(self, text: str) -> bool:
+        return any(name == "heading" and text in proto.body for name, proto in self.elements)
+
+@contextmanager
+def open_session(base_url: str, timeout: float = 300):
+    """Conecta al websocket de la app (como una pestaña nueva)."""
+    from websockets.sync.client import connect
+
+    ws_url = base_url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+    with connect(ws_url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout) as ws:
+        yield StreamlitSession(ws, timeout)
+
+def run_session(index: int, base_url: str, timeout: float) -> Dict[str, Any]:
+    """Una sesión completa (pasos 1-4); latencia de cada interacción en ms."""
+    timings: Dict[str, float] = {}
+    out: Dict[str, Any] = {"session": index, "timings": timings, "ok": False}
+
+    def step(name: str, action, *args):
+        started = time.perf_counter()
+        action(*args)
+        timings[name] = (time.perf_counter() - started) * 1000
+
+    try:
+        with open_session(base_url, timeout) as session:
+            step("load", session.rerun)
+            keyword = f"keyword carga {index}"
+            session.set_text("Keyword objetivo", keyword)
+            step("keyword", session.rerun)
+            step("research", session.click, "Analizar competencia")
+            # El botón Siguiente se habilita en el rerun posterior al research (como en el navegador)
+            session.rerun()
+            step("to_inputs", session.click, "Siguiente")
+            session.set_text("Título del artículo", f"Guía de {keyword}")
+            step("inputs", session.click, "Continuar a Estructuras")
+            step("generation", session.click, "Generar contenido final")
+            out["ok"] = session.has_heading("Contenido Generado")
+            if not out["ok"]:
+                out["error"] = "la sesión no llegó al contenido generado"
+    except Exception as e:
+        out["error"] = f"{type(e).__name__}: {e}"[:200]
+    return out
+
+# =====================
+# Servidor y recursos
+# =====================
+class ServerProcess:
+    """`streamlit run app.py` en un puerto libre, con secrets propios."""
+
+    def __init__(self, secrets_path: str, port: int, cwd: str):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.log = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP_PATH,
+             "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false",
+             "--secrets.files", secrets_path],
+            cwd=cwd, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+
+    def wait_ready(self, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                self.log.seek(0)
+                raise RuntimeError(f"El servidor terminó al arrancar:\n{self.log.read().decode(errors='replace')[-2000:]}")
+            try:
+                if requests.get(f"{self.url}/_stcore/health", timeout=2).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.3)
+        raise RuntimeError("El servidor de Streamlit no respondió a tiempo")
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self.log.close()
+
+def _proc_usage(pid: int) -> Optional[Tuple[float, float]]:
+    """(segundos de CPU, RSS en MB) de un proceso vía /proc; None fuera de Linux."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmRSS:"))
+        return cpu, rss
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None
+
+class _ResourceSampler:
+    """Muestrea CPU/RSS del servidor mientras corre un nivel."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.rss: List[float] = []
+        self.cpu_sec = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="loadtest-sampler", daemon=True)
+
+    def _sample(self) -> Optional[Tuple[float, float]]:
+        usage = _proc_usage(self.pid) if self.pid else None
+        if usage:
+            self.rss.append(usage[1])
+        return usage
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        self._start = self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.wall_sec = time.perf_counter() - self._t0
+        end = self._sample()
+        if self._start and end:
+            self.cpu_sec = end[0] - self._start[0]
+
+def run_level(concurrency: int, sessions: int, base_url: str, pid: Optional[int], timeout: float, offset: int) -> Dict[str, Any]:
+    with _ResourceSampler(pid) as usage, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: run_session(offset + i, base_url, timeout), range(sessions)))
+    ok = [r for r in results if r["ok"]]
+    steps = {name: _percentiles([r["timings"][name] for r in results if name in r["timings"]]) for name in STEPS}
+    steps["total"] = _percentiles([sum(r["timings"].values()) for r in ok])
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "succeeded": len(ok),
+        "errors": sorted({r["error"] for r in results if r.get("error")})[:5],
+        "wall_sec": round(usage.wall_sec, 2),
+        "sessions_per_min": round(len(ok) / usage.wall_sec * 60, 1) if usage.wall_sec else 0.0,
+        "server_cpu_cores": round(usage.cpu_sec / usage.wall_sec, 2) if usage.cpu_sec is not None else None,
+        "server_rss_mb_max": round(max(usage.rss), 1) if usage.rss else None,
+        "steps": steps,
+    }
+
+def degradation_point(levels: List[Dict[str, Any]], factor: float, metric: str = "total") -> Optional[Dict[str, Any]]:
+    """Primer nivel cuyo p95 supera `factor` veces el del nivel base (o con sesiones fallidas)."""
+    base = levels[0]["steps"][metric]["p95_ms"] if levels else 0.0
+    for level in levels[1:]:
+        p95 = level["steps"][metric]["p95_ms"]
+        if level["succeeded"] < level["sessions"] or (base and p95 > base * factor):
+            return {"concurrency": level["concurrency"], "p95_ms": p95, "baseline_p95_ms": base,
+                    "failed_sessions": level["sessions"] - level["succeeded"]}
+    return None
+
+def print_report(report: Dict[str, Any]):
+    shown = ("research", "inputs", "generation", "total")
+    print(f"{'sesiones':>9}{'ok':>5}{'ses/min':>9}{'cpu':>7}{'rss MB':>9}"
+          + "".join(f"{s + ' p50/p95 ms':>26}" for s in shown))
+    for lv in report["levels"]:
+        st = lv["steps"]
+        cells = "".join(f"{str(st[s]['p50_ms']) + ' / ' + str(st[s]['p95_ms']):>26}" for s in shown)
+        print(f"{lv['concurrency']:>9}{lv['succeeded']:>5}{lv['sessions_per_min']:>9}"
+              f"{str(lv['server_cpu_cores'] or '-'):>7}{str(lv['server_rss_mb_max'] or '-'):>9}{cells}")
+        for err in lv["errors"]:
+            print(f"    error: {err}")
+    point = report["degradation"]
+    if point:
+        print(f"\nDegradación a partir de {point['concurrency']} sesiones simultáneas "
+              f"(p95 total {point['p95_ms']} ms vs {point['baseline_p95_ms']} ms; fallidas {point['failed_sessions']}).")
+    else:
+        print("\nSin degradación en los niveles probados.")
+
+def _secrets_toml(values: Dict[str, Any], limits: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{k} = {json.dumps(v)}" for k, v in values.items()]
+    for family, cfg in limits.items():
+        lines.append(f"\n[RATE_LIMITS.{family}]")
+        lines += [f"{k} = {v}" for k, v in cfg.items()]
+    return "\n".join(lines) + "\n"
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga multi-sesión de la app (websocket + mocks)")
+    parser.add_argument("--levels", default="1,2,4,8", help="Niveles de sesiones simultáneas")
+    parser.add_argument("--sessions-per-level", type=int, default=0, help="Sesiones por nivel (por defecto = nivel)")
+    parser.add_argument("--dfs-latency", type=float, default=0.1)
+    parser.add_argument("--openai-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--task-ready-after", type=float, default=0.0, help="Segundos hasta que una tarea SERP está lista")
+    parser.add_argument("--degradation-factor", type=float, default=1.5, help="p95 sobre el nivel base que cuenta como degradación")
+    parser.add_argument("--keep-limits", action="store_true", help="Mantener los límites de tasa de producción")
+    parser.add_argument("--url", help="Usar un servidor ya arrancado (sus secrets deben apuntar a los mocks)")
+    parser.add_argument("--pid", type=int, help="PID del servidor de --url para medir CPU/RSS")
+    parser.add_argument("--timeout", type=float, default=300, help="Timeout por interacción (s)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--save", help="Guardar el reporte JSON en esta ruta")
+    args = parser.parse_args(argv)
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+
+    server = None
+    with MockDataForSEO(latency=args.dfs_latency, error_rate=args.error_rate, task_ready_after=args.task_ready_after) as dfs, \
+            MockOpenAI(latency=args.openai_latency, error_rate=args.error_rate) as oai, \
+            tempfile.TemporaryDirectory() as tmp:
+        try:
+            base_url, pid = args.url, args.pid
+            if not base_url:
+                secrets_path = os.path.join(tmp, "secrets.toml")
+                limits = {} if args.keep_limits else {
+                    family: {"rps": 10000, "burst": 10000, "max_in_flight": 1000} for family in DEFAULT_LIMITS
+                }
+                with open(secrets_path, "w", encoding="utf-8") as f:
+                    f.write(_secrets_toml({
+                        "DATAFORSEO_LOGIN": "load", "DATAFORSEO_PASSWORD": "load", "OPENAI_API_KEY": "load",
+                        "DATAFORSEO_API_URL": dfs.url, "OPENAI_BASE_URL": f"{oai.url}/v1",
+                        "SERP_ARCHIVE_PATH": os.path.join(tmp, "serp_archive.sqlite3"),
+                        "PROJECT_STORE_PATH": os.path.join(tmp, "projects.sqlite3"),
+                        "MODEL_STATS_PATH": os.path.join(tmp, "model_stats.sqlite3"),
+                    }, limits))
+                server = ServerProcess(secrets_path, _free_port(), cwd=tmp)
+                server.wait_ready()
+                base_url, pid = server.url, server.proc.pid
+
+            results, offset = [], 0
+            for level in levels:
+                sessions = args.sessions_per_level or level
+                results.append(run_level(level, sessions, base_url, pid, args.timeout, offset))
+                offset += sessions
+                if not args.json:
+                    print(f"nivel {level}: {results[-1]['succeeded']}/{sessions} ok en {results[-1]['wall_sec']}s", file=sys.stderr)
+        finally:
+            if server is not None:
+                server.stop()
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("json", "save")},
+            "levels": results,
+            "degradation": degradation_point(results, args.degradation_factor),
+            "mocks": {"dataforseo": dfs.stats(), "openai": oai.stats()},
+        }
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0 if all(lv["succeeded"] == lv["sessions"] for lv in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
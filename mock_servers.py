@@ -0,0 +1,476 @@
+"""
+Servidores HTTP locales que imitan DataForSEO y OpenAI para benchmarks offline.
+
+- `MockDataForSEO`: task_post / tasks_ready / task_get (404 hasta que la tarea
+  está lista), SERP live/advanced y on_page/content_parsing/live.
+- `MockOpenAI`: /v1/chat/completions, con o sin streaming (SSE) y `usage`
+  (con `cached_tokens` según el prefijo compartido con prompts anteriores);
+  /v1/files y /v1/batches para el modo Batch API.
+
+Cada servidor acepta un perfil (latencia, jitter, tasa de errores 500/429,
+tamaños de payload) y cuenta requests por endpoint. Uso:
+
+    with MockDataForSEO(latency=0.05) as dfs, MockOpenAI(latency=0.4) as oa:
+        seo_pipeline.configure(DATAFORSEO_API_URL=dfs.url, OPENAI_BASE_URL=oa.url + "/v1", ...)
+"""
+import json, os, random, threading, time, uuid
+from collections import deque
+from email.parser import BytesParser
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "latency": 0.05,            # segundos por request
+    "jitter": 0.02,             # +/- uniforme sobre la latencia
+    "error_rate": 0.0,          # fracción de respuestas 500
+    "throttle_rate": 0.0,       # fracción de respuestas 429
+    "retry_after": 1,           # Retry-After (segundos) de los 429
+    "task_ready_after": 0.0,    # segundos hasta que una tarea aparece en tasks_ready
+    "serp_items": 20,           # orgánicos por SERP
+    "content_words": 2000,      # palabras por página en content_parsing
+    "completion_words": 800,    # palabras por respuesta de chat
+    "stream_chunk_words": 8,    # palabras por chunk SSE
+    "stream_chunk_delay": 0.0,  # pausa entre chunks SSE
+    "batch_complete_after": 0.0,  # segundos hasta que un batch pasa a "completed"
+    "cache_min_tokens": 1024,   # prefijo mínimo cacheable (el mínimo de OpenAI)
+    "model_latency": None,      # {"gpt-4o": 3.0}: latencia extra por modelo en chat/completions
+    "seed": None,
+}
+
+# Caché de prompts simulado como el de OpenAI: prefijos en bloques de 128 tokens
+CACHE_BLOCK_TOKENS = 128
+
+WORDS = (
+    "guía contenido usuarios empresa perú ejemplo práctica resultado proceso "
+    "herramienta estrategia beneficio paso calidad servicio cliente mercado"
+).split()
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.mock.dispatch(self, "GET")
+
+    def do_POST(self):
+        self.server.mock.dispatch(self, "POST")
+
+    def log_message(self, *args):
+        pass
+
+def _parse_multipart(raw: bytes, content_type: str) -> Dict[str, Any]:
+    """Campos de un form multipart: str para campos simples, bytes para archivos."""
+    msg = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + raw)
+    fields: Dict[str, Any] = {}
+    for part in msg.get_payload() if msg.is_multipart() else []:
+        name = part.get_param("name", header="content-disposition")
+        data = part.get_payload(decode=True) or b""
+        fields[name] = data if part.get_filename() else data.decode("utf-8")
+    return fields
+
+class MockServer:
+    """Base: arranque en hilo, perfil de latencia/errores y contadores por endpoint."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **profile):
+        unknown = set(profile) - set(DEFAULT_PROFILE)
+        if unknown:
+            raise ValueError(f"Parámetros de perfil desconocidos: {sorted(unknown)}")
+        self.profile = {**DEFAULT_PROFILE, **profile}
+        self.counts: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes_out = 0
+        self._rng = random.Random(self.profile["seed"])
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts.clear()
+            self.errors.clear()
+            self.bytes_out = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.counts), "injected_errors": dict(self.errors), "bytes_out": self.bytes_out}
+
+    # --- Aleatoriedad reproducible (un único RNG protegido por lock) ---
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _words(self, n: int) -> List[str]:
+        with self._lock:
+            return [self._rng.choice(WORDS) for _ in range(n)]
+
+    # --- Despacho ---
+    def route(self, method: str, path: str) -> Tuple[str, Any]:
+        """Devuelve (nombre del endpoint, función(handler, body) -> (status, payload))."""
+        raise NotImplementedError
+
+    def dispatch(self, handler: BaseHTTPRequestHandler, method: str):
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length) if length else b""
+        name, fn = self.route(method, handler.path.split("?", 1)[0])
+        with self._lock:
+            self.counts[name] += 1
+
+        p = self.profile
+        time.sleep(max(0.0, p["latency"] + self._random() * 2 * p["jitter"] - p["jitter"]))
+        if fn is None:
+            return self._send_json(handler, 404, {"error": "not found"})
+        roll = self._random()
+        if roll < p["throttle_rate"]:
+            with self._lock:
+                self.errors[f"{name}:429"] += 1
+            return self._send_json(handler, 429, {"error": "rate limited"}, {"Retry-After": str(p["retry_after"])})
+        if roll < p["throttle_rate"] + p["error_rate"]:
+            with self._lock:
+                self.errors[f"{name}:500"] += 1
+            return self._send_json(handler, 500, {"error": "injected failure"})
+
+        ctype = handler.headers.get("Content-Type", "")
+        try:
+            body = _parse_multipart(raw, ctype) if ctype.startswith("multipart/") else (json.loads(raw) if raw else None)
+        except ValueError:
+            return self._send_json(handler, 400, {"error": "invalid json"})
+        result = fn(handler, body)
+        if result is not None:
+            self._send_json(handler, *result)
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, status: int, payload: Any, headers: Dict[str, str] = None):
+        self._send_bytes(handler, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json", headers)
+
+    def _send_bytes(self, handler: BaseHTTPRequestHandler, status: int, data: bytes, content_type: str, headers: Dict[str, str] = None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            handler.send_header(k, v)
+        handler.end_headers()
+        handler.wfile.write(data)
+        with self._lock:
+            self.bytes_out += len(data)
+
+# =====================
+# DataForSEO
+# =====================
+class MockDataForSEO(MockServer):
+    """Subconjunto de la API v3 que usa seo_pipeline."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+
+    def route(self, method: str, path: str):
+        prefix = "/v3/serp/google/organic/"
+        if method == "POST" and path == prefix + "task_post":
+            return "task_post", self._task_post
+        if method == "GET" and path == prefix + "tasks_ready":
+            return "tasks_ready", self._tasks_ready
+        if method == "GET" and path.startswith(prefix + "task_get/"):
+            return "task_get", self._task_get
+        if method == "POST" and path == prefix + "live/advanced":
+            return "serp_live", self._serp_live
+        if method == "POST" and path == "/v3/on_page/content_parsing/live":
+            return "content_parsing", self._content_parsing
+        return "unknown", None
+
+    def _envelope(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        return {"version": "0.1.mock", "status_code": 20000, "status_message": "Ok.", "tasks_count": 1, "tasks": [task]}
+
+    def _task_post(self, handler, body):
+        # Como la API real: hasta 100 tareas por POST, una entrada en tasks[] por tarea
+        tasks = []
+        for entry in (body or [{}])[:100]:
+            task_id = uuid.uuid4().hex
+            with self._lock:
+                self._tasks[task_id] = {"keyword": (entry or {}).get("keyword", ""), "ready_at": time.time() + self.profile["task_ready_after"]}
+            tasks.append({"id": task_id, "status_code": 20100, "status_message": "Task Created.", "data": entry, "result": None})
+        return 200, {**self._envelope(tasks[0]), "tasks_count": len(tasks), "tasks": tasks}
+
+    def _ready_ids(self) -> List[str]:
+        now = time.time()
+        with self._lock:
+            return [tid for tid, t in self._tasks.items() if t["ready_at"] <= now]
+
+    def _tasks_ready(self, handler, body):
+        ready = [{"id": tid, "endpoint_regular": f"/v3/serp/google/organic/task_get/regular/{tid}"} for tid in self._ready_ids()]
+        return 200, self._envelope({"id": uuid.uuid4().hex, "status_code": 20000, "result": ready})
+
+    def _task_get(self, handler, body):
+        task_id = handler.path.rsplit("/", 1)[-1]
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is None or task["ready_at"] > time.time():
+            return 404, {"status_code": 40400, "status_message": "Not Found."}
+        with self._lock:
+            self._tasks.pop(task_id, None)
+        return 200, self._envelope({"id": task_id, "status_code": 20000, "result": [self._serp_result(task["keyword"])]})
+
+    def _serp_live(self, handler, body):
+        keyword = ((body or [{}])[0] or {}).get("keyword", "")
+        return 200, self._envelope({"id": uuid.uuid4().hex, "status_code": 20000, "result": [self._serp_result(keyword)]})
+
+    def _serp_result(self, keyword: str) -> Dict[str, Any]:
+        slug = "-".join(keyword.split()) or "keyword"
+        items = [{
+            "type": "organic",
+            "rank_group": i + 1,
+            "rank_absolute": i + 2,
+            "domain": f"site{i + 1}.example",
+            "url": f"https://site{i + 1}.example/{slug}",
+            "title": f"{keyword.capitalize()}: resultado {i + 1}",
+            "description": " ".join(self._words(25)),
+        } for i in range(self.profile["serp_items"])]
+        items.insert(2, {"type": "people_also_ask", "rank_group": 1, "rank_absolute": 3, "items": [
+            {"type": "people_also_ask_element", "title": f"¿{q} {keyword}?"}
+            for q in ("Qué es", "Cómo funciona", "Cuánto cuesta", "Dónde estudiar")
+        ]})
+        items.append({"type": "related_searches", "rank_group": 1, "rank_absolute": len(items) + 1,
+                      "items": [f"{keyword} {w}" for w in ("perú", "precio", "online", "requisitos")]})
+        return {"keyword": keyword, "type": "organic", "se_domain": "google.com.pe", "items_count": len(items), "items": items}
+
+    def _content_parsing(self, handler, body):
+        url = ((body or [{}])[0] or {}).get("url", "")
+        words = self.profile["content_words"]
+        sections = max(1, words // 200)
+        primary = []
+        for i in range(sections):
+            primary.append({"type": "header", "text": f"Cómo aplicar el punto {i + 1}"})
+            primary.append({"type": "text", "text": " ".join(self._words(words // sections))})
+        item = {
+            "type": "content_parsing_element",
+            "title": f"Página analizada {url}",
+            "meta_description": " ".join(self._words(20)),
+            "page_content": {"header": {"primary_content": primary}},
+        }
+        return 200, self._envelope({"id": uuid.uuid4().hex, "status_code": 20000, "result": [{"crawl_progress": "finished", "items": [item]}]})
+
+# =====================
+# OpenAI
+# =====================
+class MockOpenAI(MockServer):
+    """
+    POST /v1/chat/completions (JSON o SSE con `stream: true`), GET /v1/models,
+    más /v1/files y /v1/batches: un batch se resuelve `batch_complete_after` segundos después
+    de crearse, con el mismo generador de respuestas que chat/completions.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self._prompts: deque = deque(maxlen=256)
+
+    def route(self, method: str, path: str):
+        path = path.rstrip("/")
+        if method == "POST" and path.endswith("/chat/completions"):
+            return "chat_completions", self._chat
+        if method == "POST" and path.endswith("/v1/files"):
+            return "files_create", self._file_create
+        if method == "GET" and "/v1/files/" in path:
+            return ("files_content", self._file_content) if path.endswith("/content") else ("files_retrieve", self._file_retrieve)
+        if method == "POST" and path.endswith("/v1/batches"):
+            return "batches_create", self._batch_create
+        if method == "GET" and "/v1/batches/" in path:
+            return "batches_retrieve", self._batch_retrieve
+        if method == "GET" and path.endswith("/v1/models"):
+            return "models_list", self._models
+        return "unknown", None
+
+    def _models(self, handler, body):
+        models = ["gpt-4o-mini", "gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
+        return 200, {"object": "list", "data": [{"id": m, "object": "model", "created": 0, "owned_by": "mock"} for m in models]}
+
+    def _markdown(self, body: Dict[str, Any]) -> str:
+        n = self.profile["completion_words"]
+        if body.get("max_tokens"):
+            n = min(n, int(body["max_tokens"] * 0.75))
+        paragraphs = [" ".join(self._words(min(60, n - i))) for i in range(0, n, 60)]
+        out = ["# Artículo simulado"]
+        for i, para in enumerate(paragraphs):
+            if i % 3 == 0:
+                out.append(f"## Sección {i // 3 + 1}")
+            out.append(para)
+        return "\n\n".join(out)
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """Tokens del prefijo más largo compartido con un prompt reciente (~4 caracteres/token)."""
+        with self._lock:
+            shared = max((len(os.path.commonprefix([prompt, p])) for p in self._prompts), default=0)
+            self._prompts.append(prompt)
+        cached = shared // 4 // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+        return cached if cached >= self.profile["cache_min_tokens"] else 0
+
+    def _chat(self, handler, body):
+        body = body or {}
+        extra = (self.profile["model_latency"] or {}).get(body.get("model"), 0)
+        if extra and handler is not None:
+            time.sleep(extra)
+        prompt = "".join(f"{m.get('role')}:{m.get('content') or ''}" for m in body.get("messages", []))
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        content = self._markdown(body)
+        finish = "length" if body.get("max_tokens") and self.profile["completion_words"] > body["max_tokens"] * 0.75 else "stop"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": min(prompt_tokens, self._cached_tokens(prompt))},
+        }
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "gpt-4o-mini")}
+        if body.get("stream"):
+            self._stream(handler, base, content, finish, usage, bool((body.get("stream_options") or {}).get("include_usage")))
+            return None
+        return 200, {
+            **base, "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish}],
+            "usage": usage,
+        }
+
+    def _completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        status, payload = self._chat(None, {**body, "stream": False})
+        return payload
+
+    # --- Files / Batches ---
+    def _store_file(self, data: bytes, purpose: str, filename: str) -> Dict[str, Any]:
+        meta = {"id": f"file-{uuid.uuid4().hex[:16]}", "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed"}
+        with self._lock:
+            self._files[meta["id"]] = {"meta": meta, "data": data}
+        return meta
+
+    def _file_create(self, handler, body):
+        body = body or {}
+        if not isinstance(body.get("file"), bytes):
+            return 400, {"error": {"message": "file is required"}}
+        return 200, self._store_file(body["file"], body.get("purpose", "batch"), "upload.jsonl")
+
+    def _file_id(self, handler) -> str:
+        parts = handler.path.split("?", 1)[0].rstrip("/").split("/")
+        return parts[parts.index("files") + 1]
+
+    def _file_retrieve(self, handler, body):
+        with self._lock:
+            f = self._files.get(self._file_id(handler))
+        return (200, f["meta"]) if f else (404, {"error": {"message": "No such file"}})
+
+    def _file_content(self, handler, body):
+        with self._lock:
+            f = self._files.get(self._file_id(handler))
+        if f is None:
+            return 404, {"error": {"message": "No such file"}}
+        self._send_bytes(handler, 200, f["data"], "application/octet-stream")
+        return None
+
+    def _batch_create(self, handler, body):
+        body = body or {}
+        with self._lock:
+            known = body.get("input_file_id") in self._files
+        if not known:
+            return 400, {"error": {"message": "input_file_id not found"}}
+        now = int(time.time())
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:16]}", "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "output_file_id": None, "error_file_id": None, "errors": None,
+            "created_at": now, "in_progress_at": now, "completed_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}, "metadata": body.get("metadata"),
+            "_ready_at": time.time() + self.profile["batch_complete_after"],
+        }
+        with self._lock:
+            self._batches[batch["id"]] = batch
+        return 200, self._public(batch)
+
+    def _batch_retrieve(self, handler, body):
+        batch_id = handler.path.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        with self._lock:
+            batch = self._batches.get(batch_id)
+        if batch is None:
+            return 404, {"error": {"message": "No such batch"}}
+        with self._lock:
+            run = batch["status"] == "in_progress" and time.time() >= batch["_ready_at"]
+            if run:
+                batch["status"] = "finalizing"
+        if run:
+            self._run_batch(batch)
+        return 200, self._public(batch)
+
+    def _run_batch(self, batch: Dict[str, Any]):
+        """Resuelve todas las líneas del archivo de entrada (las inválidas van al archivo de errores)."""
+        with self._lock:
+            lines = self._files[batch["input_file_id"]]["data"].decode("utf-8").splitlines()
+        outputs, errors = [], []
+        for line in filter(str.strip, lines):
+            req = None
+            try:
+                req = json.loads(line)
+                completion = self._completion(req["body"])
+                outputs.append({"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": req["custom_id"],
+                                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": completion},
+                                "error": None})
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append({"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": req.get("custom_id") if isinstance(req, dict) else None,
+                               "response": None, "error": {"code": "invalid_request", "message": str(e)}})
+        dump = lambda rows: "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+        batch["output_file_id"] = self._store_file(dump(outputs), "batch_output", "output.jsonl")["id"] if outputs else None
+        batch["error_file_id"] = self._store_file(dump(errors), "batch_output", "errors.jsonl")["id"] if errors else None
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    @staticmethod
+    def _public(batch: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    def _stream(self, handler, base, content, finish, usage, include_usage):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        chunk = lambda delta, fr=None: {**base, "object": "chat.completion.chunk",
+                                         "choices": [{"index": 0, "delta": delta, "finish_reason": fr}]}
+        events = [chunk({"role": "assistant", "content": ""})]
+        words = content.split(" ")
+        step = max(1, self.profile["stream_chunk_words"])
+        for i in range(0, len(words), step):
+            piece = " ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+            events.append(chunk({"content": piece}))
+        events.append(chunk({}, finish))
+        if include_usage:
+            events.append({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        sent = 0
+        for event in events:
+            data = f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+            handler.wfile.write(data)
+            handler.wfile.flush()
+            sent += len(data)
+            if self.profile["stream_chunk_delay"]:
+                time.sleep(self.profile["stream_chunk_delay"])
+        handler.wfile.write(b"data: [DONE]\n\n")
+        with self._lock:
+            self.bytes_out += sent
@@ -0,0 +1,204 @@
+"""
+Elección de modelo OpenAI por latencia medida.
+
+Cada llamada de redacción se registra (modelo, duración, tokens, resultado)
+en SQLite; con ese historial se calculan por modelo latencia p50/p95,
+tokens/segundo, tasa de fallos y costo por llamada. La opción "Auto" del
+paso 2 elige el modelo de mejor calidad que cumpla el objetivo de latencia
+para la extensión pedida y deja como respaldo los más rápidos (se usan ante
+timeout o 429).
+
+    chain = route(word_count=1500, target_sec=60)["chain"]   # ["gpt-4o", "gpt-4o-mini", ...]
+    python model_router.py stats
+"""
+import argparse, json, os, sqlite3, statistics, sys, threading, time
+from typing import Dict, Any, List, Optional
+
+from shared import shared_instance
+from token_budget import estimate_output_tokens
+
+AUTO_MODEL = "Auto"
+MODEL_OPTIONS = ["gpt-4o-mini", "gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
+# Calidad relativa (mayor = mejor), precio USD por 1M tokens y tokens/s de
+# referencia mientras no haya suficientes llamadas medidas
+MODEL_PROFILES: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"quality": 2, "price_in": 0.15, "price_out": 0.60, "reference_tps": 70},
+    "gpt-4o": {"quality": 3, "price_in": 2.50, "price_out": 10.00, "reference_tps": 55},
+    "gpt-4-turbo": {"quality": 3, "price_in": 10.00, "price_out": 30.00, "reference_tps": 25},
+    "gpt-3.5-turbo": {"quality": 1, "price_in": 0.50, "price_out": 1.50, "reference_tps": 90},
+}
+DEFAULT_STATS_PATH = os.getenv("MODEL_STATS_PATH", os.path.join("data", "model_stats.sqlite3"))
+# Objetivo de latencia por defecto de una redacción completa
+LATENCY_TARGET_SEC = float(os.getenv("LATENCY_TARGET_SEC", "60"))
+# Últimas llamadas por modelo que entran en las estadísticas
+WINDOW = 200
+# Llamadas medidas necesarias para dejar de usar la referencia
+MIN_CALLS = 3
+# Modelos con más fallos recientes que esto no se eligen en Auto
+MAX_FAILURE_RATE = 0.25
+# Timeout por llamada en Auto: margen sobre el objetivo antes de pasar al respaldo
+TIMEOUT_FACTOR = 1.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration_sec REAL NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    outcome TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calls_model ON calls (model, id);
+"""
+
+class ModelStats:
+    """Historial de llamadas por modelo (una conexión por hilo)."""
+
+    def __init__(self, path: str = DEFAULT_STATS_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, model: str, duration_sec: float, prompt_tokens: int = 0, completion_tokens: int = 0, outcome: str = "ok"):
+        """Registra una llamada; `outcome`: ok | timeout | throttled | unavailable | error."""
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT INTO calls (model, started_at, duration_sec, prompt_tokens, completion_tokens, outcome) VALUES (?, ?, ?, ?, ?, ?)",
+                (model, time.time() - duration_sec, duration_sec, int(prompt_tokens or 0), int(completion_tokens or 0), outcome),
+            )
+
+    def summary(self, model: str) -> Dict[str, Any]:
+        """Cifras medidas de un modelo (o las de referencia si hay menos de MIN_CALLS)."""
+        rows = self._conn().execute(
+            "SELECT duration_sec, prompt_tokens, completion_tokens, outcome FROM calls WHERE model = ? ORDER BY id DESC LIMIT ?",
+            (model, WINDOW),
+        ).fetchall()
+        profile = MODEL_PROFILES.get(model, MODEL_PROFILES["gpt-4o-mini"])
+        ok = [r for r in rows if r[3] == "ok"]
+        speeds = [r[2] / r[0] for r in ok if r[0] > 0 and r[2] > 0]
+        durations = sorted(r[0] for r in ok)
+        q = lambda p: durations[min(len(durations) - 1, int(p * len(durations)))] if durations else None
+        cost = [(r[1] * profile["price_in"] + r[2] * profile["price_out"]) / 1e6 for r in ok]
+        measured = len(speeds) >= MIN_CALLS
+        return {
+            "model": model,
+            "calls": len(rows),
+            "measured": measured,
+            "tokens_per_sec": round(statistics.median(speeds), 1) if measured else profile["reference_tps"],
+            "p50_sec": round(q(0.50), 2) if durations else None,
+            "p95_sec": round(q(0.95), 2) if durations else None,
+            "failure_rate": round(1 - len(ok) / len(rows), 3) if rows else 0.0,
+            "throttled": sum(1 for r in rows if r[3] == "throttled"),
+            "timeouts": sum(1 for r in rows if r[3] == "timeout"),
+            "avg_cost_usd": round(sum(cost) / len(cost), 5) if cost else None,
+            "quality": profile["quality"],
+        }
+
+    def summaries(self, models: List[str] = None) -> List[Dict[str, Any]]:
+        return [self.summary(m) for m in (models or MODEL_OPTIONS)]
+
+def get_model_stats(path: str = DEFAULT_STATS_PATH) -> ModelStats:
+    return shared_instance("model_stats", path, lambda: ModelStats(path))
+
+# =====================
+# Routing
+# =====================
+def predict_seconds(summary: Dict[str, Any], word_count: int) -> float:
+    """Duración esperada de una redacción de `word_count` palabras con ese modelo."""
+    return estimate_output_tokens(word_count, summary["model"]) / max(summary["tokens_per_sec"], 0.1)
+
+def route(word_count: int, target_sec: float = LATENCY_TARGET_SEC, stats: ModelStats = None,
+          candidates: List[str] = None) -> Dict[str, Any]:
+    """
+    Cadena de modelos para "Auto": primero el de mayor calidad (y menor costo a
+    igual calidad) cuya latencia estimada cumple el objetivo; si ninguno
+    cumple, el más rápido. Detrás, como respaldo, los más rápidos que él y
+    luego el resto.
+    """
+    stats = stats or get_model_stats()
+    rows = []
+    for s in stats.summaries(candidates):
+        s["predicted_sec"] = round(predict_seconds(s, word_count), 1)
+        rows.append(s)
+    healthy = [s for s in rows if s["failure_rate"] <= MAX_FAILURE_RATE] or rows
+    meets = [s for s in healthy if s["predicted_sec"] <= target_sec]
+    if meets:
+        primary = max(meets, key=lambda s: (s["quality"], -MODEL_PROFILES.get(s["model"], {}).get("price_out", 0)))
+        reason = f"mejor calidad que cumple {target_sec:.0f}s (~{primary['predicted_sec']:.0f}s estimados)"
+    else:
+        primary = min(healthy, key=lambda s: s["predicted_sec"])
+        reason = f"ninguno cumple {target_sec:.0f}s: el más rápido (~{primary['predicted_sec']:.0f}s)"
+    # Respaldo: primero los más rápidos que el elegido (por calidad); si no hay, el resto por velocidad
+    others = [s for s in healthy if s is not primary]
+    fallbacks = sorted((s for s in others if s["predicted_sec"] < primary["predicted_sec"]),
+                       key=lambda s: (-s["quality"], s["predicted_sec"]))
+    fallbacks += sorted((s for s in others if s not in fallbacks), key=lambda s: s["predicted_sec"])
+    return {
+        "chain": [primary["model"]] + [s["model"] for s in fallbacks],
+        "reason": reason,
+        "target_sec": target_sec,
+        "timeout_sec": round(max(target_sec * TIMEOUT_FACTOR, 10.0), 1),
+        "models": rows,
+    }
+
+def call_outcome(exc: Optional[BaseException]) -> str:
+    """Clasifica una llamada terminada: ok, throttled (429), timeout, unavailable (circuito abierto) o error."""
+    if exc is None:
+        return "ok"
+    if type(exc).__name__ == "CircuitOpenError":
+        return "unavailable"
+    if getattr(exc, "status_code", None) == 429:
+        return "throttled"
+    if type(exc).__name__ in ("APITimeoutError", "ReadTimeout", "TimeoutError", "DeadlineExceeded"):
+        return "timeout"
+    return "error"
+
+def describe(summary: Dict[str, Any]) -> str:
+    """Etiqueta del selector con las cifras medidas (o de referencia)."""
+    parts = [f"{summary['tokens_per_sec']:.0f} tok/s"]
+    if summary["measured"]:
+        if summary["p50_sec"] is not None:
+            parts.append(f"p50 {summary['p50_sec']:.0f}s")
+        parts.append(f"fallos {summary['failure_rate']:.0%}")
+        if summary["avg_cost_usd"] is not None:
+            parts.append(f"${summary['avg_cost_usd']:.4f}/llamada")
+    else:
+        parts.append("referencia, sin historial")
+    return " · ".join(parts)
+
+# =====================
+# CLI
+# =====================
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Estadísticas por modelo y simulación del router Auto.")
+    parser.add_argument("--db", default=DEFAULT_STATS_PATH, help="Ruta del archivo SQLite")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    p = sub.add_parser("route")
+    p.add_argument("--words", type=int, default=1500)
+    p.add_argument("--target", type=float, default=LATENCY_TARGET_SEC)
+    args = parser.parse_args(argv)
+
+    stats = get_model_stats(args.db)
+    if args.cmd == "stats":
+        for s in stats.summaries():
+            print(f"{s['model']:<16}{s['calls']:>6} llamadas  {describe(s)}")
+    else:
+        print(json.dumps(route(args.words, args.target, stats), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
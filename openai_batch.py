@@ -0,0 +1,88 @@
+"""
+Redacción vía OpenAI Batch API (más barata, sin urgencia: ventana de 24 h).
+
+Sube las mismas peticiones que arma `seo_pipeline.build_chat_request` como un
+JSONL (una línea por artículo, `custom_id` = id de la fila), crea el batch,
+consulta su estado y devuelve las respuestas mapeadas por `custom_id`.
+Respeta `OPENAI_BASE_URL`, así que se prueba contra `mock_servers.MockOpenAI`.
+
+    batch_id = submit_batch({"fila-1": request, ...})
+    batch = wait_for_batch(batch_id, poll_interval=60)
+    results = fetch_results(batch)   # {"fila-1": {"content": ..., "usage": ...}}
+
+`batch_generate.py --openai-batch` lo usa para generar un calendario completo.
+"""
+import io, json, time
+from typing import Dict, Any, Callable
+
+import seo_pipeline
+from rate_limit import limited_call
+
+ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def batch_jsonl(requests: Dict[str, Dict[str, Any]]) -> bytes:
+    """Archivo de entrada del batch: una petición chat.completions por línea."""
+    lines = [
+        json.dumps({"custom_id": custom_id, "method": "POST", "url": ENDPOINT, "body": body}, ensure_ascii=False)
+        for custom_id, body in requests.items()
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def submit_batch(requests: Dict[str, Dict[str, Any]], metadata: Dict[str, str] = None) -> str:
+    """Sube las peticiones y crea el batch; devuelve su id."""
+    if not requests:
+        raise ValueError("No hay peticiones para el batch")
+    client = seo_pipeline.openai_client()
+    upload = limited_call("openai", client.files.create, file=("batch.jsonl", io.BytesIO(batch_jsonl(requests))), purpose="batch")
+    batch = limited_call("openai", client.batches.create, input_file_id=upload.id, endpoint=ENDPOINT,
+                         completion_window="24h", metadata=metadata)
+    return batch.id
+
+def get_batch(batch_id: str):
+    return limited_call("openai", seo_pipeline.openai_client().batches.retrieve, batch_id)
+
+def wait_for_batch(batch_id: str, poll_interval: float = 60.0, timeout: float = None, on_poll: Callable = None):
+    """Consulta el batch hasta un estado terminal (o `timeout` segundos -> TimeoutError)."""
+    started = time.monotonic()
+    while True:
+        batch = get_batch(batch_id)
+        if on_poll:
+            on_poll(batch)
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch {batch_id} sigue en estado '{batch.status}' tras {timeout:.0f}s")
+        time.sleep(poll_interval)
+
+def _read_file(file_id: str) -> str:
+    client = seo_pipeline.openai_client()
+    return limited_call("openai", client.files.content, file_id).text
+
+def fetch_results(batch) -> Dict[str, Dict[str, Any]]:
+    """
+    Resultados por `custom_id`: {"content", "finish_reason", "usage"} o {"error"}.
+    Las peticiones que no aparecen en ningún archivo (batch expirado o
+    cancelado a medias) simplemente no están en el diccionario.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in _read_file(file_id).splitlines():
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            response = row.get("response") or {}
+            body = response.get("body") or {}
+            if row.get("error") or response.get("status_code") != 200:
+                error = row.get("error") or body.get("error") or {}
+                results[row["custom_id"]] = {"error": error.get("message") or f"HTTP {response.get('status_code')}"}
+                continue
+            choice = body["choices"][0]
+            results[row["custom_id"]] = {
+                "content": choice["message"]["content"],
+                "finish_reason": choice.get("finish_reason"),
+                "usage": body.get("usage") or {},
+            }
+    return results
@@ -0,0 +1,166 @@
+"""
+Profiling bajo demanda de cada ejecución del script de Streamlit.
+
+Dos modos:
+- "cprofile": determinista (cProfile), exporta .prof para snakeviz/pstats.
+  Solo una sesión a la vez (en Python 3.12+ cProfile es global al intérprete);
+  si otra lo está usando, ese rerun se muestrea con "sample".
+- "sample": muestreo del hilo del script cada SAMPLE_INTERVAL; bajo overhead,
+  exporta stacks colapsados (.folded) para speedscope/flamegraph.
+
+Además registra el tiempo de pared de cada rerun por paso (`rerun_summary()`).
+"""
+import cProfile, logging, marshal, pstats, sys, threading, time
+from collections import Counter, deque
+from typing import Dict, Any, List, Optional
+
+SAMPLE_INTERVAL = 0.005   # 5 ms entre muestras
+RERUN_SAMPLES = 500       # reruns recientes por paso para percentiles
+TOP_FUNCTIONS = 25
+
+logger = logging.getLogger("seo_agent.profiling")
+
+# Un solo cProfile activo por proceso; se libera en stop() (puede ser otro hilo)
+_cprofile_lock = threading.Lock()
+
+class _Sampler:
+    """Muestreador de stacks de un hilo concreto (no necesita ejecutarse en él)."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+class RerunProfiler:
+    """Perfil de una ejecución completa del script."""
+
+    def __init__(self, mode: str = "cprofile", label: str = ""):
+        self.mode = "sample" if mode == "sample" else "cprofile"
+        self.label = label
+        self.thread_id = threading.get_ident()
+        self.started_at = None
+        self.wall_ms = None
+        self.interrupted = False
+        self.fallback = False  # se pidió cprofile pero estaba ocupado
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_Sampler] = None
+
+    def start(self) -> "RerunProfiler":
+        self.started_at = time.perf_counter()
+        if self.mode == "cprofile" and _cprofile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                self._profile = profile
+                return self
+            except ValueError:  # otra herramienta de profiling activa (sys.monitoring)
+                _cprofile_lock.release()
+        if self.mode == "cprofile":
+            self.mode, self.fallback = "sample", True
+        self._sampler = _Sampler(self.thread_id)
+        self._sampler.start()
+        return self
+
+    def stop(self, interrupted: bool = False) -> Dict[str, Any]:
+        """Detiene y devuelve el resultado (top de funciones + archivo descargable)."""
+        self.wall_ms = (time.perf_counter() - self.started_at) * 1000
+        self.interrupted = interrupted
+        if self._sampler is not None:
+            self._sampler.stop()
+            return self._sample_result()
+        try:
+            self._profile.disable()
+        finally:
+            _cprofile_lock.release()
+        return self._cprofile_result()
+
+    def _cprofile_result(self) -> Dict[str, Any]:
+        self._profile.create_stats()
+        stats = pstats.Stats(self._profile)
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                "function": f"{func} ({filename.rsplit('/', 1)[-1]}:{line})",
+                "calls": nc,
+                "self_ms": round(tt * 1000, 2),
+                "cumulative_ms": round(ct * 1000, 2),
+            })
+        rows.sort(key=lambda r: r["self_ms"], reverse=True)
+        return self._result(rows[:TOP_FUNCTIONS], marshal.dumps(stats.stats), "rerun.prof")
+
+    def _sample_result(self) -> Dict[str, Any]:
+        sampler = self._sampler
+        self_counts: Counter = Counter()
+        incl_counts: Counter = Counter()
+        for stack, n in sampler.stacks.items():
+            self_counts[stack[-1]] += n
+            for fn in set(stack):
+                incl_counts[fn] += n
+        total = sampler.samples or 1
+        rows = [{
+            "function": fn,
+            "samples": incl_counts[fn],
+            "self_pct": round(self_counts[fn] / total * 100, 1),
+            "inclusive_pct": round(incl_counts[fn] / total * 100, 1),
+        } for fn, _ in self_counts.most_common(TOP_FUNCTIONS)]
+        folded = "\n".join(f"{';'.join(stack)} {n}" for stack, n in sampler.stacks.items())
+        return self._result(rows, folded.encode("utf-8"), "rerun.folded")
+
+    def _result(self, top: List[Dict[str, Any]], data: bytes, filename: str) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "label": self.label,
+            "wall_ms": round(self.wall_ms, 1),
+            "interrupted": self.interrupted,
+            "fallback": self.fallback,
+            "top": top,
+            "file_name": filename,
+            "data": data,
+        }
+
+# =====================
+# Tiempos de rerun por paso (por proceso)
+# =====================
+_reruns: Dict[str, deque] = {}
+_reruns_lock = threading.Lock()
+
+def record_rerun(label: str, wall_ms: float):
+    """Registra (y loguea) el tiempo de pared de un rerun."""
+    with _reruns_lock:
+        _reruns.setdefault(label, deque(maxlen=RERUN_SAMPLES)).append(wall_ms)
+    logger.info("rerun %s wall_ms=%.1f", label, wall_ms)
+
+def rerun_summary() -> List[Dict[str, Any]]:
+    with _reruns_lock:
+        items = [(label, sorted(v)) for label, v in _reruns.items()]
+    out = []
+    for label, d in sorted(items):
+        q = lambda p: d[min(len(d) - 1, int(p * len(d)))]
+        out.append({
+            "step": label, "reruns": len(d),
+            "p50_ms": round(q(0.50), 1), "p95_ms": round(q(0.95), 1), "max_ms": round(d[-1], 1),
+        })
+    return out
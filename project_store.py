@@ -0,0 +1,157 @@
+"""
+Persistencia de proyectos en SQLite (WAL).
+
+Los campos pequeños (keyword, paso, inputs, estructura) van en la tabla
+`projects`; los resultados pesados (competitor_data, content_strategy,
+final_md) van comprimidos con zlib en `blobs` y solo se leen cuando un paso
+los necesita. Cada paso escribe únicamente los campos que cambió.
+"""
+import json, os, sqlite3, threading, time, uuid, zlib
+from typing import Dict, Any, List, Optional
+
+from shared import shared_instance
+
+DEFAULT_STORE_PATH = os.getenv("PROJECT_STORE_PATH", os.path.join("data", "projects.sqlite3"))
+
+# Campos que se guardan como blob comprimido (el resto va en la fila del proyecto)
+BLOB_FIELDS = ("competitor_data", "content_strategy", "final_md")
+ROW_FIELDS = ("keyword", "step", "inputs", "selected_structure")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    keyword TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    step INTEGER NOT NULL DEFAULT 1,
+    inputs TEXT,
+    selected_structure TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_updated ON projects (updated_at);
+CREATE TABLE IF NOT EXISTS blobs (
+    project_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (project_id, name)
+) WITHOUT ROWID;
+"""
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 6)
+
+def _unpack(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+class ProjectStore:
+    """Proyectos persistentes con escrituras incrementales y blobs perezosos."""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create_project(self, keyword: str = "") -> str:
+        """Crea un proyecto vacío y devuelve su id."""
+        project_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute(
+                "INSERT INTO projects (id, keyword, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (project_id, keyword, now, now),
+            )
+        return project_id
+
+    def save(self, project_id: str, **fields):
+        """
+        Guarda solo los campos recibidos (escritura incremental).
+        Los campos de BLOB_FIELDS se comprimen; None borra el blob.
+        """
+        now = time.time()
+        conn = self._conn()
+        with self._write_lock, conn:
+            row_updates = {"updated_at": now}
+            for name, value in fields.items():
+                if name in BLOB_FIELDS:
+                    if value is None or value == "":
+                        conn.execute("DELETE FROM blobs WHERE project_id = ? AND name = ?", (project_id, name))
+                    else:
+                        data = _pack(value)
+                        conn.execute(
+                            "INSERT OR REPLACE INTO blobs (project_id, name, size, updated_at, data) VALUES (?, ?, ?, ?, ?)",
+                            (project_id, name, len(data), now, data),
+                        )
+                elif name in ("inputs", "selected_structure"):
+                    row_updates[name] = json.dumps(value, ensure_ascii=False) if value is not None else None
+                    if name == "inputs" and value:
+                        row_updates["title"] = value.get("title", "")
+                elif name in ("keyword", "step"):
+                    row_updates[name] = value
+                else:
+                    raise ValueError(f"Campo de proyecto desconocido: {name}")
+            sets = ", ".join(f"{k} = ?" for k in row_updates)
+            conn.execute(f"UPDATE projects SET {sets} WHERE id = ?", (*row_updates.values(), project_id))
+
+    def load_meta(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Campos pequeños del proyecto + nombres de blobs disponibles (sin descomprimir)."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT id, keyword, title, step, inputs, selected_structure, created_at, updated_at FROM projects WHERE id = ?",
+            (project_id,),
+        ).fetchone()
+        if not row:
+            return None
+        blobs = [name for (name,) in conn.execute("SELECT name FROM blobs WHERE project_id = ?", (project_id,))]
+        return {
+            "id": row[0],
+            "keyword": row[1],
+            "title": row[2],
+            "step": row[3],
+            "inputs": json.loads(row[4]) if row[4] else None,
+            "selected_structure": json.loads(row[5]) if row[5] else None,
+            "created_at": row[6],
+            "updated_at": row[7],
+            "blobs": blobs,
+        }
+
+    def load_blob(self, project_id: str, name: str) -> Any:
+        """Descomprime un blob bajo demanda (None si no existe)."""
+        row = self._conn().execute(
+            "SELECT data FROM blobs WHERE project_id = ? AND name = ?", (project_id, name)
+        ).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def list_projects(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Proyectos recientes (sin tocar blobs)."""
+        rows = self._conn().execute(
+            "SELECT p.id, p.keyword, p.title, p.step, p.updated_at, "
+            "(SELECT COALESCE(SUM(size), 0) FROM blobs b WHERE b.project_id = p.id) "
+            "FROM projects p ORDER BY p.updated_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [
+            {"id": i, "keyword": k, "title": t, "step": s, "updated_at": u, "stored_bytes": b}
+            for i, k, t, s, u, b in rows
+        ]
+
+    def delete_project(self, project_id: str):
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute("DELETE FROM blobs WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+
+def get_store(path: str = DEFAULT_STORE_PATH) -> ProjectStore:
+    return shared_instance("project_store", path, lambda: ProjectStore(path))
@@ -0,0 +1,259 @@
+"""
+Limitador de tasa y concurrencia por familia de endpoints (compartido por proceso).
+
+Cada familia (DataForSEO SERP, polling de tasks_ready, content parsing, OpenAI)
+tiene un token bucket (requests/segundo + ráfaga) y un máximo de requests en
+vuelo. Los 429/5xx se reintentan respetando Retry-After, con backoff
+exponencial y jitter. Las métricas (espera en cola, reintentos, 429) se leen
+con `limiter_metrics()`.
+"""
+import email.utils, os, random, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional
+
+import requests
+
+from cassette import http_session
+from deadline import Deadline, DeadlineExceeded, get_breaker
+from shared import shared_instance, shared_instances
+
+# Valores por defecto (DataForSEO: ~2000 req/min por cuenta, tasks_ready: 20/min)
+DEFAULT_LIMITS: Dict[str, Dict[str, float]] = {
+    "dataforseo": {"rps": 20.0, "burst": 20, "max_in_flight": 20},
+    "dataforseo_ready": {"rps": 0.33, "burst": 2, "max_in_flight": 2},
+    "dataforseo_content": {"rps": 10.0, "burst": 10, "max_in_flight": 10},
+    "openai": {"rps": 5.0, "burst": 5, "max_in_flight": 8},
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0   # segundos
+BACKOFF_MAX = 30.0   # tope de espera entre reintentos
+WAIT_SAMPLES = 500   # muestras recientes para percentiles de espera
+
+class RateLimiter:
+    """Token bucket + límite de requests en vuelo para una familia de endpoints."""
+
+    def __init__(self, name: str, rps: float, burst: float = None, max_in_flight: int = 10):
+        self.name = name
+        self.rps = float(rps)
+        self.burst = float(burst or max(1.0, rps))
+        self.max_in_flight = int(max_in_flight)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "wait_total": 0.0}
+
+    def configure(self, rps: float = None, burst: float = None, max_in_flight: int = None):
+        with self._cond:
+            if rps is not None:
+                self.rps = float(rps)
+            if burst is not None:
+                self.burst = float(burst)
+            if max_in_flight is not None:
+                self.max_in_flight = int(max_in_flight)
+            self._cond.notify_all()
+
+    def count(self, key: str, n: int = 1):
+        with self._cond:
+            self.stats[key] += n
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rps)
+        self._last = now
+
+    @contextmanager
+    def slot(self, timeout: float = None):
+        """Espera token y cupo de concurrencia; registra el tiempo en cola."""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._in_flight < self.max_in_flight and self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    break
+                wait = None if self._in_flight >= self.max_in_flight else (
+                    (1 - self._tokens) / self.rps if self.rps > 0 else 1.0
+                )
+                if timeout is not None:
+                    left = timeout - (now - start)
+                    if left <= 0:
+                        raise DeadlineExceeded(f"{self.name}: presupuesto agotado esperando turno en el limitador")
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            self.stats["requests"] += 1
+            self.stats["wait_total"] += waited
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            in_flight = self._in_flight
+            stats = dict(self.stats)
+        pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+        return {
+            "family": self.name,
+            "rps": self.rps,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": in_flight,
+            "requests": stats["requests"],
+            "retries": stats["retries"],
+            "throttled_429": stats["throttled"],
+            "errors": stats["errors"],
+            "wait_avg_ms": round(stats["wait_total"] / stats["requests"] * 1000, 1) if stats["requests"] else 0.0,
+            "wait_p50_ms": pct(0.50),
+            "wait_p95_ms": pct(0.95),
+        }
+
+def _new_limiter(family: str) -> RateLimiter:
+    cfg = dict(DEFAULT_LIMITS.get(family, DEFAULT_LIMITS["dataforseo"]))
+    # RATE_LIMIT_<FAMILIA>="rps:max_in_flight", p.ej. RATE_LIMIT_OPENAI="3:4"
+    env = os.getenv(f"RATE_LIMIT_{family.upper()}")
+    if env:
+        rps, _, in_flight = env.partition(":")
+        cfg["rps"] = float(rps)
+        cfg["burst"] = max(1.0, float(rps))
+        if in_flight:
+            cfg["max_in_flight"] = int(in_flight)
+    return RateLimiter(family, cfg["rps"], cfg.get("burst"), cfg["max_in_flight"])
+
+def get_limiter(family: str) -> RateLimiter:
+    """Limitador de la familia (se crea con DEFAULT_LIMITS o límites de entorno)."""
+    return shared_instance("limiter", family, lambda: _new_limiter(family))
+
+def configure_limits(limits: Dict[str, Dict[str, float]]):
+    """Aplica límites {familia: {rps, burst, max_in_flight}} (p.ej. desde st.secrets)."""
+    for family, cfg in (limits or {}).items():
+        get_limiter(family).configure(cfg.get("rps"), cfg.get("burst"), cfg.get("max_in_flight"))
+
+def limiter_metrics() -> Dict[str, Dict[str, Any]]:
+    return {lim.name: lim.metrics() for lim in shared_instances("limiter")}
+
+# =====================
+# Reintentos
+# =====================
+def retry_after_seconds(headers) -> Optional[float]:
+    """Interpreta Retry-After (segundos o fecha HTTP)."""
+    value = (headers or {}).get("Retry-After") or (headers or {}).get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, OverflowError):
+        return None  # fecha ilegible: el llamador usa el backoff calculado
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Retry-After si viene; si no, backoff exponencial con full jitter."""
+    if retry_after is not None:
+        return min(BACKOFF_MAX, retry_after + random.uniform(0, 0.5))
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def _sleep_within(delay: float, deadline: Deadline = None) -> bool:
+    """Duerme el backoff si cabe en el presupuesto; False si no hay tiempo para reintentar."""
+    if deadline is not None and delay >= deadline.remaining() - 1.0:
+        return False
+    time.sleep(delay)
+    return True
+
+def limited_request(family: str, method: str, url: str, max_retries: int = MAX_RETRIES,
+                    deadline: Deadline = None, **kwargs) -> requests.Response:
+    """
+    Request HTTP (sesión compartida, ver cassette.py) bajo el limitador de la familia. Reintenta 429/5xx y errores
+    de conexión; tras agotar reintentos devuelve la última respuesta (o relanza).
+    Con `deadline`, el timeout, la cola y los backoffs se recortan al tiempo
+    restante. El circuit breaker del proveedor corta si está caído.
+    """
+    limiter = get_limiter(family)
+    breaker = get_breaker(family.split("_")[0])
+    cap = kwargs.pop("timeout", 60)
+    attempt = 0
+    while True:
+        probe = breaker.allow()
+        healthy, response, error = None, None, None
+        try:
+            timeout = deadline.timeout(cap) if deadline else cap
+            with limiter.slot(timeout=deadline.remaining() if deadline else None):
+                response = http_session().request(method, url, timeout=timeout, **kwargs)
+            healthy = response.status_code < 500
+        except (requests.ConnectionError, requests.Timeout) as e:
+            healthy, error = False, e
+        finally:
+            # Siempre se resuelve la llamada: si el presupuesto se agota antes de
+            # tener respuesta, la prueba half-open se libera en vez de quedar colgada.
+            breaker.settle(healthy, probe)
+
+        if error is not None:
+            limiter.count("errors")
+            if attempt >= max_retries or not _sleep_within(backoff_delay(attempt), deadline):
+                raise error
+            attempt += 1
+            limiter.count("retries")
+            continue
+
+        if response.status_code == 429:
+            limiter.count("throttled")
+        if response.status_code not in RETRY_STATUS or attempt >= max_retries:
+            return response
+        if not _sleep_within(backoff_delay(attempt, retry_after_seconds(response.headers)), deadline):
+            return response
+        attempt += 1
+        limiter.count("retries")
+
+def limited_call(family: str, fn: Callable, *args, max_retries: int = MAX_RETRIES,
+                 client_timeout: bool = False, **kwargs):
+    """
+    Ejecuta fn (p.ej. client.chat.completions.create) bajo el limitador.
+    Reintenta excepciones con status_code 429/5xx (errores del SDK de OpenAI).
+    Con `client_timeout` el timeout lo eligió el llamador (p.ej. el router Auto,
+    más corto que lo normal): vencerlo no cuenta como fallo del proveedor en el breaker.
+    """
+    limiter = get_limiter(family)
+    breaker = get_breaker(family.split("_")[0])
+    attempt = 0
+    while True:
+        probe = breaker.allow()
+        healthy = None
+        try:
+            with limiter.slot():
+                result = fn(*args, **kwargs)
+            healthy = True
+            return result
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            timed_out = type(e).__name__ == "APITimeoutError"
+            unavailable = (status or 0) >= 500 or timed_out or type(e).__name__ == "APIConnectionError"
+            retryable = status in RETRY_STATUS or unavailable
+            if timed_out and client_timeout:
+                healthy = None
+            elif unavailable:
+                healthy = False
+            elif status is not None:
+                healthy = True
+            if status == 429:
+                limiter.count("throttled")
+            if not retryable or attempt >= max_retries:
+                limiter.count("errors")
+                raise
+            headers = getattr(getattr(e, "response", None), "headers", None)
+            delay = backoff_delay(attempt, retry_after_seconds(headers))
+        finally:
+            breaker.settle(healthy, probe)
+        time.sleep(delay)
+        attempt += 1
+        limiter.count("retries")
@@ -0,0 +1,1141 @@
+"""
+Pipeline SEO sin UI: research (DataForSEO SERP + análisis de contenido),
+estrategia, estructuras y redacción con OpenAI.
+
+La app de Streamlit lo configura con `configure()` a partir de st.secrets; el
+benchmark y los scripts lo usan directamente. Las URLs base son configurables
+para apuntar a servidores simulados (`mock_servers.py`).
+"""
+import os, re, time, json, threading, contextvars
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Callable, Optional
+
+from cassette import openai_http_client
+from serp_archive import get_archive, diff_serps
+from rate_limit import limited_request, limited_call
+from deadline import CircuitOpenError, Deadline, DeadlineExceeded
+from telemetry import span, traced, annotate
+from token_budget import plan_budget, record_usage
+from model_router import AUTO_MODEL, LATENCY_TARGET_SEC, get_model_stats, route, call_outcome
+
+# =====================
+# Configuración (env por defecto; la app la sobreescribe con configure())
+# =====================
+DATAFORSEO_LOGIN = os.getenv("DATAFORSEO_LOGIN", "")
+DATAFORSEO_PASSWORD = os.getenv("DATAFORSEO_PASSWORD", "")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# URLs base (por defecto las de producción)
+DATAFORSEO_API_URL = os.getenv("DATAFORSEO_API_URL", "https://api.dataforseo.com")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+# Límite de resultados a mostrar en la vista tipo SERP
+SERP_RESULTS_LIMIT = 5
+# Archivo histórico de SERPs (SQLite)
+SERP_ARCHIVE_PATH = os.getenv("SERP_ARCHIVE_PATH", os.path.join("data", "serp_archive.sqlite3"))
+# Antigüedad máxima de un análisis de contenido reutilizable en modo incremental
+ANALYSIS_MAX_AGE_DAYS = 30
+# Presupuesto total (segundos) de un research del paso 1
+RESEARCH_BUDGET_SEC = int(os.getenv("RESEARCH_BUDGET_SEC", "120"))
+# Antigüedad máxima (horas) de un research guardado que el paso 1 sirve sin repetirlo
+RESEARCH_CACHE_MAX_AGE_HOURS = float(os.getenv("RESEARCH_CACHE_MAX_AGE_HOURS", "48"))
+# Historial de llamadas por modelo (router "Auto")
+MODEL_STATS_PATH = os.getenv("MODEL_STATS_PATH", os.path.join("data", "model_stats.sqlite3"))
+# Continuaciones máximas cuando la redacción se corta por max_tokens
+MAX_CONTINUATIONS = int(os.getenv("MAX_CONTINUATIONS", "3"))
+
+SETTINGS = (
+    "DATAFORSEO_LOGIN", "DATAFORSEO_PASSWORD", "OPENAI_API_KEY", "DATAFORSEO_API_URL",
+    "OPENAI_BASE_URL", "SERP_RESULTS_LIMIT", "SERP_ARCHIVE_PATH", "ANALYSIS_MAX_AGE_DAYS",
+    "RESEARCH_BUDGET_SEC", "MAX_CONTINUATIONS", "MODEL_STATS_PATH", "RESEARCH_CACHE_MAX_AGE_HOURS",
+)
+
+def configure(**settings):
+    """Sobrescribe la configuración del módulo (p.ej. configure(OPENAI_API_KEY=...))."""
+    for name, value in settings.items():
+        if name not in SETTINGS:
+            raise ValueError(f"Configuración desconocida: {name}")
+        if value is not None:
+            if name in ("DATAFORSEO_API_URL", "OPENAI_BASE_URL"):
+                value = str(value).rstrip("/")
+            globals()[name] = value
+
+# =====================
+# Utilidades
+# =====================
+def get_structure_options(kw: str, strategy: Dict = None) -> List[Dict[str, Any]]:
+    """Genera estructuras, opcionalmente optimizadas con strategy"""
+    
+    # Estructuras base
+    base_structures = [
+        {
+            "id": 1,
+            "name": "Estructura Educativa",
+            "headers": [
+                f"Introducción: ¿Qué es {kw}?",
+                f"Por qué es importante {kw}",
+                "Guía paso a paso",
+                "Errores comunes a evitar",
+                "Herramientas recomendadas",
+                "Casos de éxito",
+                "Conclusión y próximos pasos",
+            ],
+        },
+        {
+            "id": 2,
+            "name": "Estructura Comercial",
+            "headers": [
+                f"El problema con {kw}",
+                "La solución definitiva",
+                "Beneficios comprobados",
+                "Cómo empezar hoy mismo",
+                "Preguntas frecuentes",
+                "Testimonios y casos",
+                "Llamada a la acción",
+            ],
+        },
+        {
+            "id": 3,
+            "name": "Estructura Comparativa",
+            "headers": [
+                f"Introducción a {kw}",
+                "Método tradicional vs método moderno",
+                "Ventajas y desventajas",
+                "Cuál elegir según tu situación",
+                "Implementación práctica",
+                "Resultados esperados",
+                "Recomendación final",
+            ],
+        },
+    ]
+    
+    # Si tenemos estrategia, agregamos estructura optimizada
+    if strategy and strategy.get("suggested_headers"):
+        optimized_structure = {
+            "id": 4,
+            "name": "🎯 Estructura Optimizada (Basada en Competencia)",
+            "headers": strategy["suggested_headers"],
+            "optimized": True
+        }
+        base_structures.append(optimized_structure)
+    
+    return base_structures
+
+# =====================
+# DataForSEO helpers
+# =====================
+def _dfs_auth_header():
+    """Cabecera Authorization: Basic user:password (base64)."""
+    import base64
+    token = base64.b64encode(f"{DATAFORSEO_LOGIN}:{DATAFORSEO_PASSWORD}".encode()).decode()
+    return {"Authorization": "Basic " + token}
+
+def dataforseo_create_task(keyword: str, location_name: str = "Peru", device: str = "desktop", depth: int = 20, deadline: Deadline = None) -> Optional[str]:
+    """Crea una tarea SERP en DataForSEO y devuelve task_id (None si DataForSEO la rechazó)."""
+    return dataforseo_create_tasks([keyword], location_name, device, depth, deadline).get(keyword)
+
+# Tareas por POST que acepta task_post
+TASK_POST_BATCH = 100
+
+def dataforseo_create_tasks(keywords: List[str], location_name: str = "Peru", device: str = "desktop", depth: int = 20, deadline: Deadline = None) -> Dict[str, str]:
+    """Crea tareas SERP de varias keywords (hasta TASK_POST_BATCH por POST) y devuelve {keyword: task_id}."""
+    url = f"{DATAFORSEO_API_URL}/v3/serp/google/organic/task_post"
+    headers = _dfs_auth_header()
+    headers["Content-Type"] = "application/json"
+    task_ids: Dict[str, str] = {}
+    for i in range(0, len(keywords), TASK_POST_BATCH):
+        chunk = keywords[i:i + TASK_POST_BATCH]
+        payload = [{
+            "keyword": keyword,
+            "language_code": "es",
+            "location_name": location_name,
+            "device": device,
+            "depth": depth
+        } for keyword in chunk]
+        with span("dataforseo.task_post", **({"keyword": chunk[0]} if len(chunk) == 1 else {"tasks": len(chunk)})) as sp:
+            r = limited_request("dataforseo", "POST", url, headers=headers, data=json.dumps(payload), timeout=60, deadline=deadline)
+            sp.set(bytes=len(r.content), status=r.status_code)
+        r.raise_for_status()
+        # Las tareas vuelven en el mismo orden que se enviaron; las rechazadas no tienen id útil
+        for keyword, task in zip(chunk, r.json().get("tasks", [])):
+            if task.get("id") and str(task.get("status_code", 20100)).startswith("201"):
+                task_ids[keyword] = task["id"]
+    return task_ids
+
+def dataforseo_ready_ids(deadline: Deadline = None) -> set:
+    """Ids de tareas SERP listas para task_get (una consulta a tasks_ready)."""
+    ready_url = f"{DATAFORSEO_API_URL}/v3/serp/google/organic/tasks_ready"
+    with span("dataforseo.tasks_ready") as sp:
+        r = limited_request("dataforseo_ready", "GET", ready_url, headers=_dfs_auth_header(), timeout=60, deadline=deadline)
+        sp.set(bytes=len(r.content), status=r.status_code)
+    r.raise_for_status()
+    jr = r.json()
+    # Los ids listos vienen en tasks[].result[] (el id de tasks[] es el del propio request)
+    ready_ids = {t.get("id") for t in jr.get("tasks", [])}
+    ready_ids |= {r.get("id") for t in jr.get("tasks", []) for r in (t.get("result") or [])}
+    return ready_ids
+
+def dataforseo_task_get(task_id: str, deadline: Deadline = None, iteration: int = None):
+    """Resultados de una tarea: {"raw", "items"}, o None si aún no está (404)."""
+    get_url = f"{DATAFORSEO_API_URL}/v3/serp/google/organic/task_get/{task_id}"
+    with span("dataforseo.task_get", iteration=iteration) as sp:
+        r = limited_request("dataforseo", "GET", get_url, headers=_dfs_auth_header(), timeout=60, deadline=deadline)
+        sp.set(bytes=len(r.content), status=r.status_code)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    j = r.json()
+    try:
+        items = j["tasks"][0]["result"][0]["items"]
+    except Exception:
+        items = []
+    return {"raw": j, "items": items}
+
+def dataforseo_get_results(task_id: str, max_wait_sec: int = 90, deadline: Deadline = None) -> Dict[str, Any]:
+    """Espera a que la tarea esté lista y obtiene resultados (sin pasar del deadline)."""
+    start = time.time()
+    out_of_time = lambda: time.time() - start > max_wait_sec or (deadline is not None and deadline.remaining() < 2)
+    poll_sleep = lambda: time.sleep(min(2, deadline.remaining()) if deadline else 2)
+
+    # Esperar a que la tarea aparezca en tasks_ready
+    while task_id not in dataforseo_ready_ids(deadline) and not out_of_time():
+        poll_sleep()
+
+    # Obtener resultados
+    poll = 0
+    while True:
+        if deadline is not None and deadline.remaining() < 2:
+            return {"raw": {"note": "deadline agotado antes de task_get"}, "items": []}
+        poll += 1
+        result = dataforseo_task_get(task_id, deadline, iteration=poll)
+        if result is not None:
+            return result
+        if out_of_time():
+            return {"raw": {"note": "timeout waiting for task_get"}, "items": []}
+        poll_sleep()
+
+def dataforseo_serp_live(keyword: str, location_name: str = "Peru", device: str = "desktop", depth: int = 20, deadline: Deadline = None):
+    """Fallback a endpoint LIVE (sin polling)."""
+    url = f"{DATAFORSEO_API_URL}/v3/serp/google/organic/live/advanced"
+    payload = [{
+        "keyword": keyword,
+        "language_code": "es",
+        "location_name": location_name,
+        "device": device,
+        "depth": depth
+    }]
+    headers = _dfs_auth_header()
+    headers["Content-Type"] = "application/json"
+    with span("dataforseo.serp_live", keyword=keyword) as sp:
+        r = limited_request("dataforseo", "POST", url, headers=headers, data=json.dumps(payload), timeout=90, deadline=deadline)
+        sp.set(bytes=len(r.content), status=r.status_code)
+    r.raise_for_status()
+    j = r.json()
+    try:
+        return j["tasks"][0]["result"][0]["items"], j
+    except Exception:
+        return [], j
+
+# =====================
+# CONTENT ANALYSIS - NUEVO
+# =====================
+@traced("dataforseo.content_parsing")
+def analyze_competitor_content(url: str, deadline: Deadline = None) -> Dict[str, Any]:
+    """
+    Analiza contenido real de una URL con DataForSEO Content Analysis
+    Usando el endpoint CORRECTO según documentación oficial.
+    Si se agota el deadline lanza DeadlineExceeded, y CircuitOpenError si el
+    proveedor está caído (el llamador decide omitirla; no se inventan métricas).
+    """
+    if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
+        # Fallback demo con datos más realistas
+        import random
+        return {
+            "url": url,
+            "word_count": random.randint(1800, 3200),
+            "headers": {
+                "h1": 1,
+                "h2": random.randint(8, 15),
+                "h3": random.randint(5, 12),
+                "total": random.randint(14, 28)
+            },
+            "title": f"Análisis demo para {url[:50]}...",
+            "meta_description": "Meta description extraída (demo)",
+            "status": "demo"
+        }
+    
+    try:
+        headers = _dfs_auth_header()
+        headers["Content-Type"] = "application/json"
+        
+        # ENDPOINT CORRECTO según documentación oficial
+        live_url = f"{DATAFORSEO_API_URL}/v3/on_page/content_parsing/live"
+        
+        # Payload según documentación oficial
+        task_data = [{
+            "url": url
+        }]
+        
+        # Usar método LIVE (sin polling, respuesta inmediata)
+        response = limited_request("dataforseo_content", "POST", live_url, headers=headers, data=json.dumps(task_data), timeout=60, deadline=deadline)
+        annotate(url=url, bytes=len(response.content), status=response.status_code)
+        response.raise_for_status()
+        
+        result_data = response.json()
+        
+        # Verificar estructura de respuesta
+        if not result_data.get("tasks") or len(result_data["tasks"]) == 0:
+            raise Exception("No se recibieron tareas en la respuesta")
+            
+        task = result_data["tasks"][0]
+        
+        if task.get("status_code") != 20000:
+            raise Exception(f"Error en tarea: {task.get('status_message', 'Unknown error')}")
+        
+        if not task.get("result") or len(task["result"]) == 0:
+            raise Exception("No se recibieron resultados")
+        
+        # Procesar resultado según estructura de documentación
+        result = task["result"][0]
+        
+        # Verificar si hay items
+        if not result.get("items") or len(result["items"]) == 0:
+            raise Exception("No se encontraron items en el resultado")
+        
+        item = result["items"][0]
+        
+        # Extraer page_content según documentación
+        page_content = item.get("page_content", {})
+        
+        # Extraer métricas principales
+        header_info = page_content.get("header", {})
+        primary_content = header_info.get("primary_content", [])
+        
+        # Contar headers manualmente del contenido
+        h1_count = 0
+        h2_count = 0
+        h3_count = 0
+        total_text = ""
+        
+        for content_item in primary_content:
+            text = content_item.get("text", "")
+            total_text += " " + text
+            
+            # Detectar headers por estructura (esto es aproximado)
+            if content_item.get("type") == "header" or any(h in text.lower() for h in ["h1", "h2", "h3"]):
+                if len(text) < 100:  # Headers suelen ser cortos
+                    if any(keyword in text.lower() for keyword in ["introducción", "qué es", "cómo"]):
+                        h2_count += 1
+                    elif any(keyword in text.lower() for keyword in ["paso", "ejemplo", "punto"]):
+                        h3_count += 1
+                    else:
+                        h2_count += 1
+        
+        # Contar palabras del texto total
+        word_count = len(total_text.split()) if total_text else 0
+        
+        # Extraer title y meta
+        title = item.get("title", "") or header_info.get("title", "")
+        meta_description = item.get("meta_description", "") or page_content.get("meta", {}).get("description", "")
+        
+        return {
+            "url": url,
+            "word_count": max(word_count, 500),  # Mínimo realista
+            "headers": {
+                "h1": 1,  # Asumimos siempre hay 1 H1
+                "h2": max(h2_count, 5),  # Mínimo realista
+                "h3": max(h3_count, 3),  # Mínimo realista
+                "total": max(h1_count + h2_count + h3_count, 9)
+            },
+            "title": title,
+            "meta_description": meta_description,
+            "status": "success"
+        }
+        
+    except (DeadlineExceeded, CircuitOpenError):
+        raise
+
+    except requests.exceptions.Timeout as e:
+        # Timeout recortado por el deadline: no inventamos métricas
+        if deadline is not None and deadline.remaining() < 1:
+            raise DeadlineExceeded(str(e))
+        return create_intelligent_fallback(url, f"connection_error: {str(e)}")
+
+    except requests.exceptions.RequestException as e:
+        # Error de conexión/HTTP
+        return create_intelligent_fallback(url, f"connection_error: {str(e)}")
+        
+    except Exception as e:
+        # Cualquier otro error
+        return create_intelligent_fallback(url, f"processing_error: {str(e)}")
+
+def create_intelligent_fallback(url: str, error_msg: str) -> Dict[str, Any]:
+    """
+    Crear fallback inteligente basado en análisis de URL
+    """
+    import random
+    from urllib.parse import urlparse
+    
+    parsed = urlparse(url)
+    domain = parsed.netloc
+    path = parsed.path.lower()
+    
+    # Métricas más realistas según tipo de sitio
+    if any(edu in domain for edu in ['edu', 'university', 'college']):
+        # Sitios educativos tienden a ser más largos
+        base_words = random.randint(2200, 3800)
+        base_h2 = random.randint(10, 16)
+    elif any(blog in path for blog in ['blog', 'article', 'post', 'guia']):
+        # Blogs/artículos tienden a ser medios-largos
+        base_words = random.randint(1800, 3200)
+        base_h2 = random.randint(8, 14)
+    elif any(info in path for info in ['carrera', 'programa', 'curso']):
+        # Páginas de carreras/programas
+        base_words = random.randint(1500, 2800)
+        base_h2 = random.randint(7, 12)
+    else:
+        # Páginas comerciales más concisas
+        base_words = random.randint(1200, 2200)
+        base_h2 = random.randint(6, 12)
+    
+    base_h3 = random.randint(base_h2//2, base_h2)
+    
+    return {
+        "url": url,
+        "word_count": base_words,
+        "headers": {
+            "h1": 1,
+            "h2": base_h2,
+            "h3": base_h3,
+            "total": base_h2 + base_h3 + 1
+        },
+        "title": f"Análisis estimado para {domain}",
+        "meta_description": "",
+        "status": f"fallback_inteligente: {error_msg[:100]}"
+    }
+
+@traced("generate_content_strategy")
+def generate_content_strategy(competitor_analyses: List[Dict], keyword: str, serp_features: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Genera estrategia de contenido basada en análisis de competidores
+    y, si existen, en las búsquedas relacionadas y PAA del SERP
+    """
+    if not competitor_analyses:
+        return {}
+    
+    # Análisis de métricas
+    word_counts = [comp.get("word_count", 0) for comp in competitor_analyses if comp.get("word_count")]
+    h2_counts = [comp.get("headers", {}).get("h2", 0) for comp in competitor_analyses]
+    h3_counts = [comp.get("headers", {}).get("h3", 0) for comp in competitor_analyses]
+    
+    # Calcular recomendaciones
+    avg_words = sum(word_counts) // len(word_counts) if word_counts else 2000
+    min_words = min(word_counts) if word_counts else 1500
+    max_words = max(word_counts) if word_counts else 2500
+    
+    avg_h2 = sum(h2_counts) // len(h2_counts) if h2_counts else 8
+    avg_h3 = sum(h3_counts) // len(h3_counts) if h3_counts else 5
+    
+    # Generar headers sugeridos basados en patrones comunes
+    suggested_headers = [
+        f"¿Qué es {keyword}? Guía completa 2025",
+        f"Beneficios principales de {keyword}",
+        f"Cómo implementar {keyword} paso a paso",
+        f"Errores comunes con {keyword} (y cómo evitarlos)",
+        f"Mejores herramientas para {keyword}",
+        f"{keyword} vs alternativas: comparación detallada",
+        f"Casos de éxito reales con {keyword}",
+        f"Preguntas frecuentes sobre {keyword}",
+        f"Conclusión: el futuro de {keyword}",
+    ]
+    
+    # Ajustar cantidad de headers basado en competencia
+    target_headers = min(max(avg_h2 + 1, 8), 15)
+    suggested_headers = suggested_headers[:target_headers]
+
+    # Keywords reales del SERP (related searches + people also search); plantilla si no hay
+    serp_features = serp_features or {}
+    keywords_opportunities = list(dict.fromkeys(
+        serp_features.get("related_searches", []) + serp_features.get("people_also_search", [])
+    ))
+    if not keywords_opportunities:
+        keywords_opportunities = [
+            f"{keyword} en Perú",
+            f"guía {keyword}",
+            f"tutorial {keyword}",
+            f"ejemplos {keyword}",
+            f"{keyword} 2025"
+        ]
+    
+    return {
+        "recommended_word_count": {
+            "min": max(min_words - 200, 800),
+            "optimal": min(avg_words + 300, 4000),
+            "max": max_words + 500
+        },
+        "recommended_headers": {
+            "h2_count": avg_h2 + 1,
+            "h3_count": avg_h3 + 2,
+            "total": avg_h2 + avg_h3 + 3
+        },
+        "suggested_headers": suggested_headers,
+        "competitor_insights": [
+            f"Promedio de palabras en top 3: {avg_words:,}",
+            f"Headers H2 promedio: {avg_h2}",
+            f"Rango de extensión: {min_words:,} - {max_words:,} palabras",
+            f"Tu oportunidad: crear contenido de {avg_words + 300:,} palabras con {avg_h2 + 1} secciones principales"
+        ],
+        "keywords_opportunities": keywords_opportunities,
+        "keywords_source": "serp" if serp_features.get("related_searches") or serp_features.get("people_also_search") else "plantilla",
+        "faq_questions": serp_features.get("people_also_ask", [])
+    }
+
+# =====================
+# SERP helpers
+# =====================
+def build_serp_items(items, max_items=10):
+    """Devuelve filas {pos, title, url} priorizando orgánicos."""
+    if not items:
+        return []
+    organic = [it for it in items if it.get("type") == "organic" and it.get("url")]
+    fallback = [it for it in items if it.get("url")]
+    picked = organic or fallback
+    picked = sorted(picked, key=lambda it: it.get("rank_group") or it.get("rank_absolute") or 9999)[:max_items]
+    
+    rows = []
+    for it in picked:
+        rows.append({
+            "pos": it.get("rank_group") or it.get("rank_absolute") or "",
+            "title": it.get("title") or it.get("url"),
+            "url": it.get("url")
+        })
+    return rows
+
+def extract_serp_features(items, max_per_feature=10) -> Dict[str, Any]:
+    """
+    Indexa en una sola pasada todos los tipos de item del SERP y extrae
+    búsquedas relacionadas y preguntas (People Also Ask) sin llamadas extra.
+    """
+    counts: Dict[str, int] = {}
+    related: List[str] = []
+    people_also_search: List[str] = []
+    questions: List[str] = []
+    seen = set()
+
+    def _add(bucket: List[str], text):
+        text = (text or "").strip() if isinstance(text, str) else ""
+        key = text.lower()
+        if text and key not in seen and len(bucket) < max_per_feature:
+            seen.add(key)
+            bucket.append(text)
+
+    for it in items or []:
+        item_type = it.get("type") or "unknown"
+        counts[item_type] = counts.get(item_type, 0) + 1
+
+        if item_type == "related_searches":
+            for q in it.get("items") or []:
+                _add(related, q if isinstance(q, str) else (q or {}).get("title"))
+        elif item_type == "people_also_search":
+            for q in it.get("items") or []:
+                _add(people_also_search, q if isinstance(q, str) else (q or {}).get("title"))
+        elif item_type == "people_also_ask":
+            for q in it.get("items") or []:
+                _add(questions, (q or {}).get("title") or (q or {}).get("question"))
+
+    return {
+        "counts": counts,
+        "related_searches": related,
+        "people_also_search": people_also_search,
+        "people_also_ask": questions,
+    }
+
+# =====================
+# Análisis de competidores MEJORADO
+# =====================
+def analyze_competitors(keyword: str, incremental: bool = False, deadline: Deadline = None,
+                        serp: Dict[str, Any] = None, source: str = "interactive") -> Dict[str, Any]:
+    """
+    Analiza competencia con DataForSEO SERP + Content Analysis.
+    En modo incremental solo re-analiza URLs nuevas o que cambiaron de posición
+    respecto al último snapshot guardado; el resto reutiliza análisis previos.
+    Todo el research respeta `deadline` (por defecto RESEARCH_BUDGET_SEC): si el
+    tiempo no alcanza, se omite el análisis profundo de las URLs más lentas.
+
+    `serp` ({"raw", "items"}) es un SERP ya obtenido (p.ej. por el warm-up en
+    lote de `watchlist.py`): se salta task_post y la espera. El resultado queda
+    guardado como último research de la keyword (`source` indica quién lo hizo).
+    """
+    # Demo si no hay credenciales
+    if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
+        demo_comp = [
+            {"url": "https://competitor1.com", "title": f"Guía completa de {keyword}", "wordCount": 2500, "headers": 8},
+            {"url": "https://competitor2.com", "title": f"Todo sobre {keyword}", "wordCount": 1800, "headers": 6},
+            {"url": "https://competitor3.com", "title": f"{keyword}: Manual definitivo", "wordCount": 3200, "headers": 12},
+        ]
+        serp_list = [{"pos": i+1, "title": c["title"], "url": c["url"]} for i, c in enumerate(demo_comp)]
+        return {
+            "competitors": demo_comp,
+            "content_analyses": [],
+            "insights": [
+                "Promedio de palabras: 2,500",
+                "Headers promedio: 8-12",
+                "Enfoque principal: Guías completas",
+                "Tono dominante: Profesional-educativo",
+            ],
+            "top_organic": [demo_comp[0]],
+            "first_org_rank": 1,
+            "serp_list": serp_list,
+            "serp_features": extract_serp_features([]),
+            "serp_raw": {},
+        }
+
+    deadline = deadline or Deadline(RESEARCH_BUDGET_SEC)
+    warnings: List[str] = []
+
+    # Análisis SERP (el polling usa como mucho ~45% del presupuesto; el resto queda para LIVE y contenido)
+    if serp is not None:
+        res_async = serp
+    else:
+        task_id = dataforseo_create_task(keyword=keyword, location_name="Peru", device="desktop", depth=20, deadline=deadline)
+        if task_id:
+            res_async = dataforseo_get_results(task_id, max_wait_sec=90, deadline=deadline.share(0.45))
+        else:
+            # Tarea rechazada: se pasa directo al fallback LIVE
+            res_async = {"raw": {"note": "task_post rechazado"}, "items": []}
+    items = res_async.get("items") or []
+
+    # Fallback a LIVE si no obtuvimos nada útil
+    live_json = None
+    serp_source = "task"
+    if not items:
+        serp_source = "live"
+        items, live_json = dataforseo_serp_live(keyword=keyword, location_name="Peru", device="desktop", depth=20, deadline=deadline)
+
+    # Guardar snapshot en el histórico (nunca bloquea el research)
+    archive = None
+    previous = None
+    if items:
+        try:
+            archive = get_archive(SERP_ARCHIVE_PATH)
+            previous = archive.last_snapshot(keyword, market="Peru", device="desktop")
+            archive.append_snapshot(keyword, items, market="Peru", device="desktop")
+        except Exception as e:
+            warnings.append(f"No se pudo guardar el SERP en el histórico: {e}")
+
+    # Diff contra el snapshot anterior: qué URLs hay que volver a analizar
+    serp_diff = diff_serps(previous["rows"], items) if previous else None
+    changed_urls = set()
+    if serp_diff:
+        changed_urls = {e["url"] for e in serp_diff["entered"]} | {m["url"] for m in serp_diff["moved"]}
+
+    # Obtener top 3 orgánicos
+    organic = [it for it in items if it.get("type") == "organic" and it.get("url")]
+    any_with_url = [it for it in items if it.get("url")]
+    picked = organic[:3] if organic else any_with_url[:3]
+    
+    competitors = []
+    content_analyses = []
+    reused = 0
+    skipped = []
+    skip_reasons: Dict[str, str] = {}
+    analyses: Dict[str, Dict[str, Any]] = {}
+
+    # Análisis básico para compatibilidad + reutilización de análisis previos
+    for it in picked:
+        url = it["url"]
+        title = it.get("title") or url
+        competitors.append({
+            "url": url,
+            "title": title,
+            "wordCount": 2000,  # placeholder inicial
+            "headers": 8        # placeholder inicial
+        })
+        if incremental and archive and serp_diff and url not in changed_urls:
+            try:
+                stored = archive.get_analysis(url, max_age_sec=ANALYSIS_MAX_AGE_DAYS * 86400)
+            except Exception:
+                stored = None
+            if stored:
+                analyses[url] = {**stored, "reused": True}
+                reused += 1
+
+    # Análisis de contenido real en paralelo, acotado por el deadline
+    pending = [c["url"] for c in competitors if c["url"] not in analyses]
+    if pending:
+        executor = ThreadPoolExecutor(max_workers=len(pending))
+        # Cada hilo hereda una copia del contexto para que sus spans caigan en la traza actual
+        futures = {
+            executor.submit(contextvars.copy_context().run, analyze_competitor_content, url, deadline): url
+            for url in pending
+        }
+        done, _ = wait(futures, timeout=deadline.remaining())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future, url in futures.items():
+            if future not in done:
+                skipped.append(url)
+                skip_reasons[url] = "omitido: presupuesto de tiempo agotado"
+                continue
+            try:
+                analyses[url] = future.result()
+                if archive and analyses[url].get("status") == "success":
+                    archive.save_analysis(url, analyses[url])
+            except DeadlineExceeded:
+                skipped.append(url)
+                skip_reasons[url] = "omitido: presupuesto de tiempo agotado"
+            except CircuitOpenError as e:
+                # Proveedor caído: la URL queda fuera de los promedios, no con métricas inventadas
+                skipped.append(url)
+                skip_reasons[url] = "omitido: proveedor no disponible"
+                warnings.append(f"Análisis de contenido omitido para {url}: {e}")
+            except Exception as e:
+                warnings.append(f"No se pudo analizar contenido de {url}: {str(e)}")
+                analyses[url] = {
+                    "url": url,
+                    "status": f"error: {str(e)}",
+                    "word_count": 2000,
+                    "headers": {"total": 8}
+                }
+
+    # Actualizar datos del competidor con análisis real (las URLs omitidas quedan fuera de la estrategia)
+    for competitor in competitors:
+        content_analysis = analyses.get(competitor["url"])
+        if content_analysis is None:
+            competitor["analysis_status"] = skip_reasons.get(competitor["url"], "omitido")
+            continue
+        content_analyses.append(content_analysis)
+        competitor["wordCount"] = content_analysis.get("word_count", 2000)
+        competitor["headers"] = content_analysis.get("headers", {}).get("total", 8)
+        competitor["real_title"] = content_analysis.get("title", competitor["title"])
+        competitor["analysis_status"] = content_analysis.get("status", "unknown")
+
+    # Resto del análisis SERP (igual que antes)
+    first_org_rank = None
+    if organic:
+        ranks = [it.get("rank_group") for it in organic if isinstance(it.get("rank_group"), int)]
+        first_org_rank = min(ranks) if ranks else None
+        
+    top_organic = []
+    if first_org_rank is not None:
+        top_organic = [{
+            "url": it["url"],
+            "title": it.get("title") or it["url"],
+            "rank": it.get("rank_group")
+        } for it in organic if it.get("rank_group") == first_org_rank]
+
+    serp_list = build_serp_items(items, max_items=SERP_RESULTS_LIMIT)
+    serp_features = extract_serp_features(items)
+
+    # Insights mejorados con datos reales
+    real_word_counts = [ca.get("word_count", 0) for ca in content_analyses if ca.get("word_count", 0) > 0]
+    avg_words = sum(real_word_counts) // len(real_word_counts) if real_word_counts else 2000
+
+    insights = [
+        f"Total items leídos: {len(items)}",
+        f"Orgánicos detectados: {len(organic)}",
+        f"Análisis de contenido completados: {len([ca for ca in content_analyses if ca.get('status') != 'error'])}",
+        f"Promedio de palabras (análisis real): {avg_words:,}" if real_word_counts else "Promedio de palabras: ~2,000 (estimado)",
+        "Enfoque principal: Guías informativas",
+    ]
+    if skipped:
+        insights.append(f"Análisis omitidos (tiempo agotado o proveedor caído): {len(skipped)}")
+
+    serp_raw = res_async.get("raw") if res_async.get("raw") else (live_json or {})
+
+    if serp_diff is not None:
+        serp_diff = {
+            "entered": serp_diff["entered"],
+            "exited": serp_diff["exited"],
+            "moved": serp_diff["moved"],
+            "unchanged": len(serp_diff["unchanged"]),
+            "previous_fetched_at": previous["fetched_at"],
+            "reused_analyses": reused,
+            "api_calls_saved": reused,
+        }
+    
+    result = {
+        "competitors": competitors,
+        "content_analyses": content_analyses,
+        "insights": insights,
+        "top_organic": top_organic,
+        "first_org_rank": first_org_rank,
+        "serp_list": serp_list,
+        "serp_features": serp_features,
+        "serp_diff": serp_diff,
+        "serp_source": serp_source,  # "task" (task_post/task_get) o "live" (fallback)
+        "research_budget": {
+            "budget_sec": deadline.budget_sec,
+            "elapsed_sec": round(deadline.elapsed(), 1),
+            "skipped_urls": skipped,
+        },
+        "warnings": warnings,
+        "serp_raw": serp_raw
+    }
+    # Solo un research completo (con SERP y sin análisis omitidos) se sirve después desde caché
+    if archive and not skipped:
+        try:
+            archive.save_research(keyword, result, market="Peru", device="desktop", source=source)
+        except Exception:
+            pass
+    return result
+
+def cached_research(keyword: str, max_age_hours: float = None) -> Dict[str, Any]:
+    """
+    Último research guardado de la keyword si tiene menos de `max_age_hours`
+    (por defecto RESEARCH_CACHE_MAX_AGE_HOURS): {"data", "refreshed_at", "source"}; si no, None.
+    """
+    max_age = RESEARCH_CACHE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD or max_age <= 0:
+        return None
+    try:
+        return get_archive(SERP_ARCHIVE_PATH).get_research(keyword, market="Peru", device="desktop", max_age_sec=max_age * 3600)
+    except Exception:
+        return None
+
+# =====================
+# OpenAI helper MEJORADO
+# =====================
+# Segundos que una conexión ociosa con OpenAI sigue abierta para reutilizarse
+# (el valor por defecto de httpx, 5 s, la pierde mientras el usuario elige)
+OPENAI_KEEPALIVE_SEC = 90.0
+
+_openai_clients: Dict[tuple, Any] = {}
+_openai_clients_lock = threading.Lock()
+
+def openai_client():
+    """
+    Cliente OpenAI con la configuración del módulo (URL base, cassette),
+    compartido por proceso: las redacciones reutilizan sus conexiones.
+    """
+    cassette_client = openai_http_client()
+    key = (OPENAI_API_KEY, OPENAI_BASE_URL, id(cassette_client))
+    with _openai_clients_lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            from openai import OpenAI, DefaultHttpxClient
+            from cassette import httpx
+            http_client = cassette_client or DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=OPENAI_KEEPALIVE_SEC))
+            # Los reintentos (429/5xx con Retry-After) los gestiona el limitador compartido
+            client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None, max_retries=0, http_client=http_client)
+            _openai_clients[key] = client
+        return client
+
+def warm_openai() -> bool:
+    """
+    Deja listo el cliente OpenAI (import del SDK, DNS, TLS) con una petición
+    barata a /models, para que la redacción no pague el arranque en frío.
+    Sin clave o con un cassette activo no hace nada; un fallo aquí no importa (False).
+    """
+    if not OPENAI_API_KEY or openai_http_client() is not None:
+        return False
+    try:
+        with span("openai.warmup"):
+            openai_client().with_options(timeout=10.0).models.list()
+        return True
+    except Exception:
+        return False
+
+# Prefijo estático del prompt: idéntico entre artículos para aprovechar el
+# caché de prompts del proveedor (los prefijos compartidos se cobran y procesan
+# más barato). Cambiar su texto invalida el caché: sube PROMPT_VERSION.
+PROMPT_VERSION = "2"
+
+OPTIMIZATION_PROMPTS = {
+    "Balanced": "Eres un redactor SEO senior para el mercado peruano. Redacta en español claro, escaneable, con H2/H3 bien estructurados. Equilibra SEO con legibilidad.",
+    "SEO-Focused": "Eres un especialista SEO para el mercado peruano. Prioriza optimización para motores de búsqueda: densidad de keywords, headers jerárquicos, y estructura para featured snippets.",
+    "Creative": "Eres un redactor creativo especializado en contenido engaging para el mercado peruano. Prioriza storytelling, ejemplos locales, y contenido que genere engagement.",
+    "Technical": "Eres un redactor técnico para el mercado peruano. Enfócate en precisión, datos específicos, y contenido authoritative con ejemplos técnicos detallados."
+}
+
+ARTICLE_REQUIREMENTS = """
+Formato de salida: un artículo **en Markdown**, con el título como H1 y
+exactamente los encabezados indicados como H2/H3, en ese orden.
+
+Requisitos:
+- H2/H3 bien jerarquizados
+- Introducción breve y útil
+- Secciones con ejemplos locales (Perú) cuando aplique
+- Conclusión con próximos pasos y CTA
+- No inventes datos sensibles; si no hay certeza, explica alternativas
+- Integra naturalmente las keywords de oportunidad identificadas
+- Las referencias competitivas son solo orientación: no copies su contenido
+- Si hay preguntas reales de usuarios (People Also Ask), respóndelas donde encajen
+""".strip()
+
+def static_prompt_prefix(optimization_mode: str = "Balanced") -> str:
+    """System prompt fijo por modo (versionado): el prefijo cacheable de cada petición."""
+    mode = optimization_mode if optimization_mode in OPTIMIZATION_PROMPTS else "Balanced"
+    return f"{OPTIMIZATION_PROMPTS[mode]}\n\nModo de optimización: {mode}.\n\n{ARTICLE_REQUIREMENTS}"
+
+def build_chat_request(title: str, keyword: str, structure: Dict[str, Any], tone: str, word_count: int, related_keywords: str, competitor_data: Dict[str, Any], strategy: Dict = None, model_config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Argumentos de `chat.completions.create` para redactar un artículo (modelo,
+    mensajes, temperatura...). Lo usan la redacción directa y el modo Batch API.
+
+    Orden de más a menos compartido: prefijo estático (system), contexto de la
+    keyword (competencia, estrategia: igual al regenerar o en varios artículos
+    de la misma keyword) y al final lo propio del artículo (título, estructura,
+    tono, extensión).
+    """
+    model_config = model_config or {}
+    optimization_mode = model_config.get("optimization_mode", "Balanced")
+
+    competitors_txt = "\n".join([f"- {c.get('title')} ({c.get('url')}) - {c.get('wordCount', 0):,} palabras" for c in (competitor_data or {}).get("competitors", [])])
+    
+    # Información de estrategia para el prompt
+    strategy_prompt = ""
+    if strategy:
+        insights = strategy.get("competitor_insights", [])
+        opportunities = strategy.get("keywords_opportunities", [])
+        faq_questions = strategy.get("faq_questions", [])
+        strategy_prompt = f"""
+ANÁLISIS DE COMPETENCIA:
+{chr(10).join(insights)}
+
+OPORTUNIDADES DE KEYWORDS: {', '.join(opportunities[:5])}
+EXTENSIÓN OBJETIVO OPTIMIZADA: {strategy.get('recommended_word_count', {}).get('optimal', word_count):,} palabras
+"""
+        if faq_questions:
+            strategy_prompt += f"""
+PREGUNTAS REALES DE USUARIOS (People Also Ask):
+{chr(10).join(f"- {q}" for q in faq_questions[:6])}
+"""
+
+    prompt = f"""
+KEYWORD PRINCIPAL: "{keyword}"
+{strategy_prompt}
+REFERENCIAS COMPETITIVAS:
+{competitors_txt}
+
+ARTÍCULO A REDACTAR
+Título: "{title}"
+Encabezados (síguelos exactamente):
+{json.dumps(structure["headers"], ensure_ascii=False, indent=2)}
+
+Tono: {tone}. Extensión objetivo: ~{word_count} palabras.
+Incluye naturalmente estas palabras relacionadas: {related_keywords}.
+""".strip()
+
+    model = model_config.get("ai_model", "gpt-4o-mini")
+    if model == AUTO_MODEL:
+        model = route_models(word_count, model_config)["chain"][0]
+
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": static_prompt_prefix(optimization_mode)},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": model_config.get("temperature", 0.6),
+        "max_tokens": model_config.get("max_tokens", 2000),
+        "presence_penalty": model_config.get("presence_penalty", 0.0),
+        "frequency_penalty": model_config.get("frequency_penalty", 0.1),
+        # Agrupa en el mismo caché las peticiones que comparten prefijo
+        "prompt_cache_key": f"seo-article-v{PROMPT_VERSION}-{optimization_mode}",
+    }
+
+# Campos del cuerpo que el SDK mínimo soportado (openai>=1.40) no acepta como argumento
+BODY_ONLY_FIELDS = ("prompt_cache_key",)
+
+def _sdk_kwargs(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Argumentos de client.chat.completions.create: los campos de BODY_ONLY_FIELDS viajan en extra_body."""
+    kwargs = {k: v for k, v in request.items() if k not in BODY_ONLY_FIELDS}
+    extra = {k: request[k] for k in BODY_ONLY_FIELDS if k in request}
+    if extra:
+        kwargs["extra_body"] = {**(kwargs.get("extra_body") or {}), **extra}
+    return kwargs
+
+def generate_content_with_openai(title: str, keyword: str, structure: Dict[str, Any], tone: str, word_count: int, related_keywords: str, competitor_data: Dict[str, Any], strategy: Dict = None, model_config: Dict[str, Any] = None,
+                                 on_stream: Callable[[str, str], None] = None) -> str:
+    """
+    Redacta con OpenAI, usando configuración de modelo personalizada
+    (`model_config`: ai_model, temperature, max_tokens, penalties, optimization_mode;
+    en la app son los inputs del paso 2).
+
+    Con `on_stream` la redacción se pide en streaming y se llama
+    `on_stream("delta", fragmento)` por cada fragmento recibido, y
+    `on_stream("reset", texto)` cuando lo ya emitido deja de valer (recorte antes
+    de una continuación o cambio de modelo en Auto): el texto acumulado pasa a ser `texto`.
+    """
+    model_config = model_config or {}
+    ai_model = model_config.get("ai_model", "gpt-4o-mini")
+    temperature = model_config.get("temperature", 0.6)
+    
+    if not OPENAI_API_KEY:
+        headers_list = "\n".join([f"### {h}" for h in structure["headers"]])
+        strategy_info = ""
+        if strategy:
+            strategy_info = f"""
+**Estrategia basada en competencia:**
+- Extensión recomendada: {strategy.get('recommended_word_count', {}).get('optimal', word_count):,} palabras
+- Headers sugeridos: {strategy.get('recommended_headers', {}).get('h2_count', 8)} secciones principales
+- Oportunidades de keywords: {', '.join(strategy.get('keywords_opportunities', [])[:3])}
+"""
+        
+        return f"""# {title}
+
+## Introducción
+Este artículo completo sobre "{keyword}" ha sido desarrollado específicamente para el mercado peruano, considerando las necesidades locales y tendencias actuales.
+
+{headers_list}
+
+**Palabras relacionadas**: {related_keywords}
+**Tono**: {tone} — **Extensión objetivo**: {word_count} palabras
+**Modelo configurado**: {ai_model} (Temperature: {temperature})
+
+{strategy_info}
+
+## Optimización SEO
+- Keyword principal integrada naturalmente
+- Headers optimizados para featured snippets
+- Estructura pensada para engagement
+- Call-to-actions estratégicamente ubicados
+"""
+
+    client = openai_client()
+    if ai_model == AUTO_MODEL:
+        plan = route_models(word_count, model_config)
+        chain, timeout = plan["chain"], plan["timeout_sec"]
+        with span("model_router", chosen=chain[0], fallbacks=",".join(chain[1:]), reason=plan["reason"]):
+            pass
+    else:
+        chain, timeout = [ai_model], None
+
+    # En Auto, un timeout, 429 o circuito abierto pasa directo al siguiente modelo (más rápido) de la cadena
+    for i, model in enumerate(chain):
+        has_fallback = i < len(chain) - 1
+        try:
+            request = build_chat_request(title, keyword, structure, tone, word_count, related_keywords, competitor_data,
+                                         strategy=strategy, model_config={**model_config, "ai_model": model})
+            return _complete_article(client, request, word_count, structure, timeout=timeout,
+                                     max_retries=0 if has_fallback else None, on_stream=on_stream)
+        except Exception as e:
+            if not has_fallback or call_outcome(e) not in ("timeout", "throttled", "unavailable"):
+                raise
+            if on_stream:
+                on_stream("reset", "")
+
+def route_models(word_count: int, model_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan del router Auto para esta extensión (objetivo: `latency_target_sec` del paso 2)."""
+    target = float(model_config.get("latency_target_sec") or LATENCY_TARGET_SEC)
+    return route(word_count, target, get_model_stats(MODEL_STATS_PATH))
+
+def _complete_article(client, request: Dict[str, Any], word_count: int, structure: Dict[str, Any],
+                      timeout: float = None, max_retries: int = None, on_stream: Callable[[str, str], None] = None) -> str:
+    """Una redacción con un modelo concreto, con continuaciones si se corta por longitud."""
+    budget = plan_budget(request["messages"], request["model"], word_count, request["max_tokens"])
+    request = {**request, "max_tokens": budget["max_tokens"]}
+    if timeout:
+        request["timeout"] = timeout
+    call_opts = {} if max_retries is None else {"max_retries": max_retries}
+    if timeout:
+        # El timeout corto de Auto no es un fallo del proveedor: no abre el breaker compartido
+        call_opts["client_timeout"] = True
+    stats = get_model_stats(MODEL_STATS_PATH)
+
+    # Si la respuesta se corta por max_tokens, se conserva hasta la última
+    # sección completa y se pide el resto (el prefijo de mensajes no cambia)
+    parts: List[str] = []
+    messages = request["messages"]
+    first_prompt_tokens, completion_total, finish_reason = 0, 0, None
+    for call in range(MAX_CONTINUATIONS + 1):
+        with span("openai.chat_completion", model=request["model"], max_tokens=request["max_tokens"],
+                  prompt_version=PROMPT_VERSION, continuation=call) as sp:
+            if call == 0:
+                sp.set(estimated_prompt_tokens=budget["prompt_tokens"], estimated_completion_tokens=budget["output_estimate"])
+            started, error, usage = time.perf_counter(), None, None
+            try:
+                if on_stream:
+                    text, finish_reason, usage = _stream_completion(client, {**request, "messages": messages}, call_opts, on_stream, sp)
+                else:
+                    resp = limited_call("openai", client.chat.completions.create, **_sdk_kwargs({**request, "messages": messages}), **call_opts)
+                    usage = getattr(resp, "usage", None)
+                    text = resp.choices[0].message.content or ""
+                    finish_reason = resp.choices[0].finish_reason
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                # Una llamada rechazada por el breaker no llegó al modelo: no entra en sus cifras
+                if call_outcome(error) != "unavailable":
+                    stats.record(request["model"], time.perf_counter() - started, getattr(usage, "prompt_tokens", 0),
+                                 getattr(usage, "completion_tokens", 0), call_outcome(error))
+            sp.set(
+                bytes=len(text.encode("utf-8")),
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                cached_tokens=cached_tokens(usage),
+                completion_tokens=getattr(usage, "completion_tokens", None),
+                total_tokens=getattr(usage, "total_tokens", None),
+                finish_reason=finish_reason,
+            )
+        first_prompt_tokens = first_prompt_tokens or int(getattr(usage, "prompt_tokens", 0) or 0)
+        completion_total += int(getattr(usage, "completion_tokens", 0) or 0)
+        if finish_reason != "length" or call == MAX_CONTINUATIONS:
+            parts.append(text)
+            break
+        parts.append(trim_to_complete_section(text))
+        so_far = "\n\n".join(p.strip() for p in parts if p.strip())
+        if on_stream:
+            on_stream("reset", so_far + "\n\n")
+        messages = request["messages"] + [
+            {"role": "assistant", "content": so_far},
+            {"role": "user", "content": continuation_prompt(so_far, structure["headers"])},
+        ]
+    content = "\n\n".join(p.strip() for p in parts if p.strip())
+    record_usage(request["model"], budget, first_prompt_tokens, completion_total, len(content.split()),
+                 calls=call + 1, truncated=finish_reason == "length")
+    return content
+
+def _stream_completion(client, request: Dict[str, Any], call_opts: Dict[str, Any], on_stream: Callable[[str, str], None], sp):
+    """Una llamada con stream=True: emite cada fragmento y devuelve (texto, finish_reason, usage)."""
+    started = time.perf_counter()
+    stream = limited_call("openai", client.chat.completions.create, **_sdk_kwargs(request), stream=True,
+                          stream_options={"include_usage": True}, **call_opts)
+    pieces, finish_reason, usage = [], None, None
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        piece = choice.delta.content if choice.delta else None
+        if piece:
+            if not pieces:
+                sp.set(first_token_ms=round((time.perf_counter() - started) * 1000, 1))
+            pieces.append(piece)
+            on_stream("delta", piece)
+        finish_reason = choice.finish_reason or finish_reason
+    return "".join(pieces), finish_reason, usage
+
+_HEADING = re.compile(r"^#{1,3} ", re.MULTILINE)
+
+def trim_to_complete_section(md: str) -> str:
+    """Recorta un texto cortado hasta antes de su última sección (la incompleta)."""
+    starts = [m.start() for m in _HEADING.finditer(md)]
+    if len(starts) > 1:
+        return md[:starts[-1]].rstrip()
+    # Una sola sección: al menos no cortar a mitad de párrafo
+    cut = md.rfind("\n\n")
+    return md[:cut].rstrip() if cut > 0 else md
+
+def continuation_prompt(so_far: str, headers: List[str]) -> str:
+    """Pide el resto del artículo: las secciones de la estructura que aún no aparecen."""
+    written = {line.lstrip("#").strip().lower() for line in so_far.splitlines() if _HEADING.match(line)}
+    pending = [h for h in headers if h.strip().lower() not in written]
+    if pending:
+        todo = "Secciones pendientes, en este orden:\n" + "\n".join(f"- {h}" for h in pending)
+    else:
+        todo = "Completa la sección en curso y cierra con la conclusión."
+    return (
+        "El artículo anterior se cortó por longitud. Continúa exactamente donde termina, "
+        "sin repetir el título ni nada ya escrito, con el mismo formato Markdown.\n" + todo
+    )
+
+def cached_tokens(usage) -> int:
+    """Tokens del prompt servidos desde el caché del proveedor (`usage` objeto o dict)."""
+    if usage is None:
+        return 0
+    details = usage.get("prompt_tokens_details") if isinstance(usage, dict) else getattr(usage, "prompt_tokens_details", None)
+    if details is None:
+        return 0
+    value = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    return int(value or 0)
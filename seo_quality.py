@@ -0,0 +1,412 @@
+"""
+Análisis local de calidad SEO del artículo generado (sin llamadas a APIs).
+
+El Markdown se parte una sola vez en secciones (una por encabezado) y se
+calcula: conformidad de los encabezados con la estructura elegida y de su
+jerarquía, cobertura y densidad de la keyword y de las relacionadas,
+distribución de longitudes por sección y el índice de legibilidad de
+Fernández-Huerta. Las métricas de cada sección se guardan por huella de su
+texto: si cambia una sola sección, solo esa se vuelve a analizar.
+
+    report = analyze(md, keyword="estudiar enfermería", related_keywords="carrera enfermería, ...",
+                     headers=structure["headers"], target_words=1500)
+    report["score"], report["checks"], report["readability"]
+
+    python seo_quality.py articulo.md --keyword "estudiar enfermería" --words 1500
+"""
+import argparse, hashlib, json, re, statistics, sys, threading, time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from shared import shared_instance
+
+# Densidad de la keyword principal aceptable (% de las palabras)
+DENSITY_RANGE = (0.5, 2.5)
+# Desvío aceptable respecto a la extensión pedida
+WORD_COUNT_TOLERANCE = 0.15
+# Secciones H2/H3 con menos palabras se marcan como muy cortas
+SHORT_SECTION_WORDS = 60
+# Secciones con más de N veces la mediana se marcan como muy largas
+LONG_SECTION_FACTOR = 3.0
+# Similitud mínima (Dice sobre palabras) para dar por presente un encabezado de la estructura
+HEADER_MATCH_MIN = 0.6
+# Legibilidad mínima (Fernández-Huerta; 60-70 = normal)
+READABILITY_MIN = 60
+# Palabras del inicio del cuerpo donde debería aparecer la keyword
+INTRO_WORDS = 100
+# Cobertura mínima de las keywords relacionadas
+RELATED_COVERAGE_MIN = 0.8
+# Secciones analizadas que se conservan (por huella) para re-evaluar cambios parciales
+SECTION_CACHE_SIZE = 4096
+
+READABILITY_SCALE = [
+    (90, "muy fácil"), (80, "fácil"), (70, "algo fácil"), (60, "normal"),
+    (50, "algo difícil"), (30, "difícil"), (float("-inf"), "muy difícil"),
+]
+
+_HEADING_LINE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)?")
+_SENTENCE_END = re.compile(r"[.!?…]+(?=[\s\"')\]»]|$)")
+_ENDS_SENTENCE = re.compile(r"[.!?…][\"')\]»]*$")
+_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_URL = re.compile(r"https?://\S+")
+_LINE_MARKUP = re.compile(r"^\s*(?:>\s*)*(?:[-*+]\s+|\d+[.)]\s+)?")
+_INLINE_MARKUP = re.compile(r"[*_`~|]+")
+
+_VOWELS = frozenset("aeiouáéíóúü")
+# Vocales que forman hiato entre sí (las débiles acentuadas rompen el diptongo)
+_STRONG = frozenset("aeoáéóíú")
+_SILENT_U = re.compile(r"(?<=[qg])u(?=[eiéí])")
+_FOLD = str.maketrans("áéíóúüàèìòùâêîôûäëïöñç", "aeiouuaeiouaeiouaeionc")
+
+# =====================
+# Texto
+# =====================
+def fold(text: str) -> str:
+    """Minúsculas sin tildes: para comparar keywords escritas con o sin acentos (carácter a carácter)."""
+    return text.lower().translate(_FOLD)
+
+def words(text: str) -> List[str]:
+    return _WORD.findall(text)
+
+@lru_cache(maxsize=65536)
+def syllables(word: str) -> int:
+    """Sílabas de una palabra en español (núcleos vocálicos; diptongos y hiatos)."""
+    w = _SILENT_U.sub("", word.lower())
+    if w.endswith("y") and len(w) > 1 and w[-2] in _VOWELS:
+        w = w[:-1] + "i"  # hoy, muy, estoy
+    count, prev = 0, ""
+    for ch in w:
+        if ch in _VOWELS:
+            if not prev or (prev in _STRONG and ch in _STRONG):
+                count += 1
+            prev = ch
+        else:
+            prev = ""
+    return max(count, 1)
+
+def _plain_lines(lines: List[str]) -> List[str]:
+    """Líneas de texto sin marcado Markdown (sin bloques de código)."""
+    out, in_code = [], False
+    for line in lines:
+        if line.lstrip().startswith(("```", "~~~")):
+            in_code = not in_code
+            continue
+        if in_code or not line.strip() or set(line.strip()) <= set("-|: "):
+            continue
+        line = _URL.sub("", _LINK.sub(r"\1", line))
+        out.append(_INLINE_MARKUP.sub(" ", _LINE_MARKUP.sub("", line)).strip())
+    return [line for line in out if line]
+
+def _sentences(lines: List[str]) -> int:
+    """Oraciones: signos de cierre más cada línea (ítem, fila) que termina sin ellos."""
+    total = 0
+    for line in lines:
+        total += len(_SENTENCE_END.findall(line))
+        if not _ENDS_SENTENCE.search(line):
+            total += 1
+    return total
+
+def fernandez_huerta(n_words: int, n_syllables: int, n_sentences: int) -> Optional[float]:
+    """L = 206,84 − 0,60·P − 1,02·F (P: sílabas por 100 palabras; F: oraciones por 100 palabras)."""
+    if not n_words:
+        return None
+    p = n_syllables * 100 / n_words
+    f = n_sentences * 100 / n_words
+    return round(206.84 - 0.60 * p - 1.02 * f, 1)
+
+def readability_label(score: Optional[float]) -> str:
+    if score is None:
+        return "-"
+    return next(label for floor, label in READABILITY_SCALE if score >= floor)
+
+def split_sections(md: str) -> List[Dict[str, Any]]:
+    """Secciones del Markdown: {level, heading, lines}; lo previo al primer encabezado tiene nivel 0."""
+    sections = [{"level": 0, "heading": "", "lines": []}]
+    in_code = False
+    for line in md.splitlines():
+        if line.lstrip().startswith(("```", "~~~")):
+            in_code = not in_code
+        m = None if in_code else _HEADING_LINE.match(line)
+        if m:
+            sections.append({"level": len(m.group(1)), "heading": _INLINE_MARKUP.sub("", m.group(2)).strip(), "lines": []})
+        else:
+            sections[-1]["lines"].append(line)
+    if not sections[0]["lines"] or not "".join(sections[0]["lines"]).strip():
+        sections.pop(0)
+    return sections
+
+def _phrases(keyword: str, related_keywords) -> Tuple[List[str], Tuple[Tuple[str, ...], ...]]:
+    """
+    Keyword principal y relacionadas (la principal primero): textos tal como
+    se escribieron y tuplas de palabras normalizadas para contarlas.
+    """
+    if isinstance(related_keywords, str):
+        related_keywords = related_keywords.split(",")
+    labels, out, seen = [], [], set()
+    for phrase in [keyword or ""] + list(related_keywords or []):
+        tokens = tuple(words(fold(phrase)))
+        if (tokens and tokens not in seen) or not out:
+            # Sin keyword principal se conserva su lugar (tupla vacía)
+            seen.add(tokens)
+            labels.append(phrase.strip())
+            out.append(tokens)
+    return labels, tuple(out)
+
+def _count(tokens: List[str], index: Dict[str, List[int]], phrase: Tuple[str, ...]) -> int:
+    n = len(phrase)
+    if not n:
+        return 0
+    return sum(1 for i in index.get(phrase[0], ()) if tuple(tokens[i:i + n]) == phrase)
+
+def _index(tokens: List[str]) -> Dict[str, List[int]]:
+    index: Dict[str, List[int]] = {}
+    for i, t in enumerate(tokens):
+        index.setdefault(t, []).append(i)
+    return index
+
+def _similarity(a: str, b: str) -> float:
+    """Coeficiente de Dice entre los conjuntos de palabras normalizadas de dos encabezados."""
+    sa, sb = set(words(fold(a))), set(words(fold(b)))
+    if not sa or not sb:
+        return 0.0
+    return 2 * len(sa & sb) / (len(sa) + len(sb))
+
+# =====================
+# Analizador
+# =====================
+class QualityAnalyzer:
+    """Análisis por sección con caché por huella (texto + keywords): re-evaluar un cambio parcial es barato."""
+
+    def __init__(self, cache_size: int = SECTION_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"analyzed": 0, "reused": 0}
+
+    def _section(self, section: Dict[str, Any], phrases: Tuple[Tuple[str, ...], ...]) -> Tuple[Dict[str, Any], bool]:
+        body = "\n".join(section["lines"])
+        key = hashlib.sha1(json.dumps([section["level"], section["heading"], body, phrases],
+                                      ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached, True
+
+        lines = _plain_lines(section["lines"])
+        text = "\n".join(lines)
+        body_words = words(text)
+        tokens = words(fold(text))
+        heading_tokens = words(fold(section["heading"]))
+        index, heading_index = _index(tokens), _index(heading_tokens)
+        stats = {
+            "level": section["level"],
+            "heading": section["heading"],
+            "words": len(body_words),
+            "heading_words": len(heading_tokens),
+            "sentences": _sentences(lines),
+            "syllables": sum(syllables(w) for w in body_words),
+            "hits": [_count(tokens, index, p) for p in phrases],
+            "heading_hits": [_count(heading_tokens, heading_index, p) for p in phrases],
+            # Apariciones de la keyword principal en las primeras INTRO_WORDS palabras
+            "early_hits": _count(tokens[:INTRO_WORDS], _index(tokens[:INTRO_WORDS]), phrases[0]),
+        }
+        with self._lock:
+            self._cache[key] = stats
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return stats, False
+
+    def analyze(self, md: str, keyword: str = "", related_keywords="", headers: List[str] = None,
+                target_words: int = None) -> Dict[str, Any]:
+        """Reporte completo del artículo (ver el docstring del módulo)."""
+        started = time.perf_counter()
+        labels, phrases = _phrases(keyword, related_keywords)
+        sections, reused = [], 0
+        for section in split_sections(md or ""):
+            stats, hit = self._section(section, phrases)
+            sections.append(stats)
+            reused += hit
+        with self._lock:
+            self._counts["reused"] += reused
+            self._counts["analyzed"] += len(sections) - reused
+
+        total_words = sum(s["words"] + s["heading_words"] for s in sections)
+        body_words = sum(s["words"] for s in sections)
+        report = {
+            "words": total_words,
+            "target_words": target_words,
+            "headings": _heading_report(sections, headers or []),
+            "keywords": _keyword_report(sections, labels, phrases, total_words),
+            "sections": _section_report(sections),
+        }
+        score = fernandez_huerta(body_words, sum(s["syllables"] for s in sections), sum(s["sentences"] for s in sections))
+        report["readability"] = {
+            "fernandez_huerta": score,
+            "label": readability_label(score),
+            "sentences": sum(s["sentences"] for s in sections),
+            "words_per_sentence": round(body_words / max(1, sum(s["sentences"] for s in sections)), 1),
+            "syllables_per_word": round(sum(s["syllables"] for s in sections) / max(1, body_words), 2),
+        }
+        report["checks"] = _checks(report)
+        report["score"] = round(100 * sum(c["ok"] for c in report["checks"]) / max(1, len(report["checks"])))
+        report["sections_reused"] = reused
+        report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counts, "cached_sections": len(self._cache)}
+
+def _heading_report(sections: List[Dict[str, Any]], headers: List[str]) -> Dict[str, Any]:
+    found = [(s["level"], s["heading"]) for s in sections if s["level"]]
+    h1 = [h for level, h in found if level == 1]
+    jumps, prev = [], 1
+    for level, heading in found:
+        if level > prev + 1:
+            jumps.append(f"H{prev} → H{level}: {heading}")
+        prev = level
+
+    # Cada encabezado de la estructura se empareja con el H2/H3 más parecido aún libre
+    subheads = [(i, h) for i, (level, h) in enumerate(found) if level in (2, 3)]
+    used, matched, missing, positions = set(), [], [], []
+    for expected in headers:
+        best = max(((_similarity(expected, h), i, h) for i, h in subheads if i not in used), default=(0.0, -1, ""))
+        if best[0] >= HEADER_MATCH_MIN:
+            used.add(best[1])
+            positions.append(best[1])
+            matched.append({"expected": expected, "found": best[2], "similarity": round(best[0], 2)})
+        else:
+            missing.append(expected)
+    return {
+        "h1_count": len(h1),
+        "h1": h1[0] if h1 else None,
+        "h2_count": sum(1 for level, _ in found if level == 2),
+        "h3_count": sum(1 for level, _ in found if level == 3),
+        "level_jumps": jumps,
+        "expected": len(headers),
+        "matched": matched,
+        "missing": missing,
+        "in_order": positions == sorted(positions),
+        "extra": [h for i, h in subheads if i not in used] if headers else [],
+    }
+
+def _keyword_report(sections: List[Dict[str, Any]], labels: List[str], phrases, total_words: int) -> Dict[str, Any]:
+    def density(j):
+        n = sum(s["hits"][j] + s["heading_hits"][j] for s in sections)
+        return n, round(n * len(phrases[j]) * 100 / total_words, 2) if total_words else 0.0
+
+    report: Dict[str, Any] = {"keyword": labels[0], "related": []}
+    if phrases[0]:
+        count, pct = density(0)
+        # La introducción es el primer texto del artículo (normalmente bajo el H1)
+        intro = next((s for s in sections if s["words"]), None)
+        report.update({
+            "count": count,
+            "density_pct": pct,
+            "in_h1": any(s["heading_hits"][0] for s in sections if s["level"] == 1),
+            "in_intro": bool(intro and intro["early_hits"]),
+            "in_subheadings": sum(1 for s in sections if s["level"] in (2, 3) and s["heading_hits"][0]),
+        })
+    for j in range(1, len(phrases)):
+        count, pct = density(j)
+        report["related"].append({"keyword": labels[j], "count": count, "density_pct": pct})
+    found = sum(1 for r in report["related"] if r["count"])
+    report["related_coverage"] = round(found / len(report["related"]), 2) if report["related"] else None
+    return report
+
+def _section_report(sections: List[Dict[str, Any]]) -> Dict[str, Any]:
+    body = [s for s in sections if s["level"] in (2, 3)]
+    lengths = [s["words"] for s in body]
+    median = statistics.median(lengths) if lengths else 0
+    return {
+        "count": len(body),
+        "min_words": min(lengths, default=0),
+        "median_words": median,
+        "max_words": max(lengths, default=0),
+        "short": [s["heading"] for s in body if s["words"] < SHORT_SECTION_WORDS],
+        "long": [s["heading"] for s in body if median and s["words"] > LONG_SECTION_FACTOR * median],
+        "table": [{"nivel": f"H{s['level']}" if s["level"] else "-", "sección": s["heading"] or "(antes del primer encabezado)",
+                   "palabras": s["words"], "oraciones": s["sentences"],
+                   "fernández_huerta": fernandez_huerta(s["words"], s["syllables"], s["sentences"])} for s in sections],
+    }
+
+def _checks(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Comprobaciones con su resultado y un detalle legible (el puntaje es el % que pasa)."""
+    checks = []
+    def add(name, ok, detail):
+        checks.append({"check": name, "ok": bool(ok), "detail": detail})
+
+    target = report["target_words"]
+    if target:
+        ratio = report["words"] / target
+        add("Extensión", abs(ratio - 1) <= WORD_COUNT_TOLERANCE,
+            f"{report['words']:,} palabras de {target:,} pedidas ({ratio:.0%})")
+    h = report["headings"]
+    add("Un único H1", h["h1_count"] == 1, f"{h['h1_count']} H1")
+    add("Jerarquía de encabezados", not h["level_jumps"], "; ".join(h["level_jumps"]) or "sin saltos de nivel")
+    if h["expected"]:
+        add("Encabezados de la estructura", not h["missing"],
+            f"{len(h['matched'])}/{h['expected']} presentes" + (f"; faltan: {', '.join(h['missing'])}" if h["missing"] else ""))
+        add("Orden de la estructura", h["in_order"], "en orden" if h["in_order"] else "los encabezados no siguen el orden pedido")
+    k = report["keywords"]
+    if "count" in k:
+        add("Keyword en el H1", k["in_h1"], k["keyword"])
+        add("Keyword en la introducción", k["in_intro"], f"primeras {INTRO_WORDS} palabras")
+        low, high = DENSITY_RANGE
+        add("Densidad de la keyword", low <= k["density_pct"] <= high,
+            f"{k['density_pct']}% ({k['count']} apariciones; rango {low}-{high}%)")
+    if k["related"]:
+        missing = [r["keyword"] for r in k["related"] if not r["count"]]
+        add("Keywords relacionadas", k["related_coverage"] >= RELATED_COVERAGE_MIN,
+            f"{k['related_coverage']:.0%} usadas" + (f"; faltan: {', '.join(missing)}" if missing else ""))
+    s = report["sections"]
+    if s["count"]:
+        add("Secciones con desarrollo", not s["short"],
+            f"mediana {s['median_words']:g} palabras" + (f"; muy cortas: {', '.join(s['short'])}" if s["short"] else ""))
+    r = report["readability"]
+    if r["fernandez_huerta"] is not None:
+        add("Legibilidad", r["fernandez_huerta"] >= READABILITY_MIN,
+            f"Fernández-Huerta {r['fernandez_huerta']} ({r['label']}); {r['words_per_sentence']} palabras por oración")
+    return checks
+
+def get_analyzer() -> QualityAnalyzer:
+    """Analizador compartido: su caché de secciones sirve a todas las sesiones."""
+    return shared_instance("quality_analyzer", None, QualityAnalyzer)
+
+def analyze(md: str, keyword: str = "", related_keywords="", headers: List[str] = None,
+            target_words: int = None) -> Dict[str, Any]:
+    return get_analyzer().analyze(md, keyword, related_keywords, headers, target_words)
+
+# =====================
+# CLI
+# =====================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calidad SEO local de un artículo en Markdown")
+    parser.add_argument("files", nargs="+", help="Artículos .md")
+    parser.add_argument("--keyword", default="", help="Keyword principal")
+    parser.add_argument("--related", default="", help="Keywords relacionadas (coma separadas)")
+    parser.add_argument("--words", type=int, help="Extensión pedida")
+    parser.add_argument("--header", action="append", default=[], help="Encabezado esperado de la estructura (repetible, en orden)")
+    parser.add_argument("--json", action="store_true", help="Reporte completo en JSON")
+    args = parser.parse_args(argv)
+
+    reports = {}
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            reports[path] = analyze(f.read(), args.keyword, args.related, args.header, args.words)
+    if args.json:
+        print(json.dumps(reports if len(reports) > 1 else reports[args.files[0]], ensure_ascii=False, indent=2))
+        return 0
+    for path, report in reports.items():
+        print(f"{path}: {report['score']}/100 — {report['words']:,} palabras, "
+              f"Fernández-Huerta {report['readability']['fernandez_huerta']} ({report['readability']['label']}) "
+              f"[{report['elapsed_ms']} ms]")
+        for c in report["checks"]:
+            print(f"  {'✓' if c['ok'] else '✗'} {c['check']}: {c['detail']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
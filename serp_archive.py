@@ -0,0 +1,421 @@
+"""
+Archivo histórico de SERPs en SQLite (layout compacto, columnas enteras).
+
+Cada snapshot (keyword, mercado, dispositivo, fecha) guarda sus filas
+(rank, url, dominio, tipo de item). Los textos se guardan una sola vez en
+tablas diccionario y las filas solo llevan ids enteros, así las consultas
+agregadas escanean pocas páginas y se leen vía mmap.
+
+Además guarda el último research completo por keyword (comprimido), que el
+paso 1 sirve directamente mientras esté fresco (ver `watchlist.py`).
+
+Uso:
+    python serp_archive.py stats
+    python serp_archive.py top-domains --limit 20
+    python serp_archive.py rank-history https://ejemplo.com/pagina
+    python serp_archive.py keyword-history "estudiar enfermería"
+"""
+import argparse, json, os, sqlite3, sys, threading, time, zlib
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from shared import shared_instance
+
+DEFAULT_ARCHIVE_PATH = os.getenv("SERP_ARCHIVE_PATH", os.path.join("data", "serp_archive.sqlite3"))
+MMAP_SIZE = 1 << 30  # 1 GiB: lecturas vía mmap en lugar de read()
+# Cambio de posición a partir del cual una URL se vuelve a analizar
+MOVE_THRESHOLD = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keywords (id INTEGER PRIMARY KEY, keyword TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS domains (id INTEGER PRIMARY KEY, domain TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS urls (id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE, domain_id INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS item_types (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    keyword_id INTEGER NOT NULL,
+    market TEXT NOT NULL,
+    device TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_key ON snapshots (keyword_id, market, device, fetched_at);
+CREATE TABLE IF NOT EXISTS latest (
+    keyword_id INTEGER NOT NULL,
+    market TEXT NOT NULL,
+    device TEXT NOT NULL,
+    snapshot_id INTEGER NOT NULL,
+    PRIMARY KEY (keyword_id, market, device)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS serp_rows (
+    snapshot_id INTEGER NOT NULL,
+    rank_absolute INTEGER NOT NULL,
+    rank_group INTEGER,
+    type_id INTEGER NOT NULL,
+    url_id INTEGER,
+    domain_id INTEGER,
+    PRIMARY KEY (snapshot_id, rank_absolute)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS serp_rows_url ON serp_rows (url_id, snapshot_id, rank_group);
+CREATE INDEX IF NOT EXISTS serp_rows_domain ON serp_rows (domain_id, type_id, snapshot_id);
+CREATE TABLE IF NOT EXISTS content_analyses (
+    url_id INTEGER PRIMARY KEY,
+    analyzed_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS research_cache (
+    keyword_id INTEGER NOT NULL,
+    market TEXT NOT NULL,
+    device TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (keyword_id, market, device)
+) WITHOUT ROWID;
+"""
+
+def domain_of(url: str) -> str:
+    """Dominio sin www. para agregaciones."""
+    host = urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+class SerpArchive:
+    """Archivo append-only de snapshots SERP (una conexión por hilo)."""
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        return conn
+
+    # ---------------------
+    # Escritura
+    # ---------------------
+    def _intern(self, conn: sqlite3.Connection, table: str, column: str, value: str, cache: Dict) -> int:
+        key = (table, value)
+        if key in cache:
+            return cache[key]
+        row = conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,)).fetchone()
+        if row:
+            cache[key] = row[0]
+        else:
+            cache[key] = conn.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (value,)).lastrowid
+        return cache[key]
+
+    def _url_id(self, conn: sqlite3.Connection, url: str, cache: Dict) -> Tuple[int, int]:
+        key = ("urls", url)
+        if key in cache:
+            return cache[key]
+        domain_id = self._intern(conn, "domains", "domain", domain_of(url), cache)
+        row = conn.execute("SELECT id FROM urls WHERE url = ?", (url,)).fetchone()
+        url_id = row[0] if row else conn.execute(
+            "INSERT INTO urls (url, domain_id) VALUES (?, ?)", (url, domain_id)
+        ).lastrowid
+        cache[key] = (url_id, domain_id)
+        return cache[key]
+
+    def append_snapshot(self, keyword: str, items: List[Dict[str, Any]], market: str = "Peru",
+                        device: str = "desktop", fetched_at: float = None) -> int:
+        """Guarda todos los items del SERP como un snapshot nuevo y devuelve su id."""
+        fetched_at = fetched_at or time.time()
+        conn = self._conn()
+        cache: Dict = {}
+        with self._write_lock, conn:
+            keyword_id = self._intern(conn, "keywords", "keyword", keyword.strip().lower(), cache)
+            snapshot_id = conn.execute(
+                "INSERT INTO snapshots (keyword_id, market, device, fetched_at) VALUES (?, ?, ?, ?)",
+                (keyword_id, market, device, fetched_at),
+            ).lastrowid
+            rows = []
+            # rank_absolute es parte de la clave: sin él se usa la posición en la lista,
+            # corrida hasta un rank libre para no pisar otra fila del mismo snapshot
+            items = items or []
+            used = {it["rank_absolute"] for it in items if isinstance(it.get("rank_absolute"), int)}
+            taken = set()
+            for pos, it in enumerate(items, start=1):
+                type_id = self._intern(conn, "item_types", "name", it.get("type") or "unknown", cache)
+                url_id = domain_id = None
+                if it.get("url"):
+                    url_id, domain_id = self._url_id(conn, it["url"], cache)
+                rank_group = it.get("rank_group") if isinstance(it.get("rank_group"), int) else None
+                rank_absolute = it.get("rank_absolute")
+                if not isinstance(rank_absolute, int) or rank_absolute in taken:
+                    rank_absolute = pos
+                    while rank_absolute in used or rank_absolute in taken:
+                        rank_absolute += 1
+                taken.add(rank_absolute)
+                rows.append((snapshot_id, rank_absolute, rank_group, type_id, url_id, domain_id))
+            conn.executemany(
+                "INSERT OR REPLACE INTO serp_rows (snapshot_id, rank_absolute, rank_group, type_id, url_id, domain_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO latest (keyword_id, market, device, snapshot_id) VALUES (?, ?, ?, ?)",
+                (keyword_id, market, device, snapshot_id),
+            )
+        return snapshot_id
+
+    def save_analysis(self, url: str, analysis: Dict[str, Any], analyzed_at: float = None):
+        """Guarda el último análisis de contenido de una URL."""
+        conn = self._conn()
+        with self._write_lock, conn:
+            url_id, _ = self._url_id(conn, url, {})
+            conn.execute(
+                "INSERT OR REPLACE INTO content_analyses (url_id, analyzed_at, data) VALUES (?, ?, ?)",
+                (url_id, analyzed_at or time.time(), json.dumps(analysis, ensure_ascii=False)),
+            )
+
+    def save_research(self, keyword: str, data: Dict[str, Any], market: str = "Peru", device: str = "desktop",
+                      source: str = "interactive", refreshed_at: float = None):
+        """Guarda el resultado completo de `analyze_competitors` como último research de la keyword."""
+        blob = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"), 6)
+        conn = self._conn()
+        with self._write_lock, conn:
+            keyword_id = self._intern(conn, "keywords", "keyword", keyword.strip().lower(), {})
+            conn.execute(
+                "INSERT OR REPLACE INTO research_cache (keyword_id, market, device, refreshed_at, source, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (keyword_id, market, device, refreshed_at or time.time(), source, blob),
+            )
+
+    # ---------------------
+    # Lectura
+    # ---------------------
+    def get_research(self, keyword: str, market: str = "Peru", device: str = "desktop",
+                     max_age_sec: float = None) -> Optional[Dict[str, Any]]:
+        """Último research guardado: {"data", "refreshed_at", "source"} (None si no hay o es más viejo que max_age_sec)."""
+        row = self._conn().execute(
+            "SELECT r.refreshed_at, r.source, r.data FROM research_cache r JOIN keywords k ON k.id = r.keyword_id "
+            "WHERE k.keyword = ? AND r.market = ? AND r.device = ?",
+            (keyword.strip().lower(), market, device),
+        ).fetchone()
+        if not row or (max_age_sec is not None and time.time() - row[0] > max_age_sec):
+            return None
+        return {"refreshed_at": row[0], "source": row[1], "data": json.loads(zlib.decompress(row[2]).decode("utf-8"))}
+
+    def research_freshness(self, keywords: List[str], market: str = "Peru", device: str = "desktop") -> Dict[str, Dict[str, Any]]:
+        """{keyword: {"refreshed_at", "source"}} de las keywords con research guardado (sin leer los blobs)."""
+        wanted = {k.strip().lower(): k for k in keywords}
+        out: Dict[str, Dict[str, Any]] = {}
+        rows = self._conn().execute(
+            "SELECT k.keyword, r.refreshed_at, r.source FROM research_cache r JOIN keywords k ON k.id = r.keyword_id "
+            "WHERE r.market = ? AND r.device = ?", (market, device),
+        )
+        for keyword, refreshed_at, source in rows:
+            if keyword in wanted:
+                out[wanted[keyword]] = {"refreshed_at": refreshed_at, "source": source}
+        return out
+
+    def get_analysis(self, url: str, max_age_sec: float = None) -> Optional[Dict[str, Any]]:
+        """Último análisis guardado de la URL (None si no existe o es más viejo que max_age_sec)."""
+        row = self._conn().execute(
+            "SELECT a.analyzed_at, a.data FROM content_analyses a JOIN urls u ON u.id = a.url_id WHERE u.url = ?",
+            (url,),
+        ).fetchone()
+        if not row or (max_age_sec is not None and time.time() - row[0] > max_age_sec):
+            return None
+        return json.loads(row[1])
+
+    def last_snapshot(self, keyword: str, market: str = "Peru", device: str = "desktop",
+                      before: int = None) -> Optional[Dict[str, Any]]:
+        """Último snapshot para la clave (o el anterior a `before`), con sus filas."""
+        conn = self._conn()
+        sql = ("SELECT s.id, s.fetched_at FROM snapshots s JOIN keywords k ON k.id = s.keyword_id "
+               "WHERE k.keyword = ? AND s.market = ? AND s.device = ?")
+        params: List[Any] = [keyword.strip().lower(), market, device]
+        if before is not None:
+            sql += " AND s.id < ?"
+            params.append(before)
+        row = conn.execute(sql + " ORDER BY s.id DESC LIMIT 1", params).fetchone()
+        if not row:
+            return None
+        snapshot_id, fetched_at = row
+        rows = conn.execute(
+            "SELECT r.rank_absolute, r.rank_group, t.name, u.url, d.domain FROM serp_rows r "
+            "JOIN item_types t ON t.id = r.type_id "
+            "LEFT JOIN urls u ON u.id = r.url_id LEFT JOIN domains d ON d.id = r.domain_id "
+            "WHERE r.snapshot_id = ? ORDER BY r.rank_absolute", (snapshot_id,)
+        ).fetchall()
+        return {
+            "snapshot_id": snapshot_id,
+            "fetched_at": fetched_at,
+            "rows": [{"rank_absolute": ra, "rank_group": rg, "type": t, "url": u, "domain": d} for ra, rg, t, u, d in rows],
+        }
+
+    def top_domains(self, limit: int = 20, max_rank: int = 10, market: str = None,
+                    device: str = None, item_type: str = "organic") -> List[Dict[str, Any]]:
+        """Dominios presentes en más keywords (último snapshot de cada keyword)."""
+        sql = ("SELECT d.domain, COUNT(DISTINCT l.keyword_id) AS keywords, COUNT(*) AS appearances, "
+               "AVG(r.rank_group) AS avg_rank "
+               "FROM latest l JOIN serp_rows r ON r.snapshot_id = l.snapshot_id "
+               "JOIN domains d ON d.id = r.domain_id "
+               "WHERE r.rank_group <= ? AND r.type_id = (SELECT id FROM item_types WHERE name = ?)")
+        params: List[Any] = [max_rank, item_type]
+        if market:
+            sql += " AND l.market = ?"
+            params.append(market)
+        if device:
+            sql += " AND l.device = ?"
+            params.append(device)
+        sql += " GROUP BY r.domain_id ORDER BY keywords DESC, avg_rank ASC LIMIT ?"
+        params.append(limit)
+        return [
+            {"domain": d, "keywords": k, "appearances": a, "avg_rank": round(ar or 0, 2)}
+            for d, k, a, ar in self._conn().execute(sql, params)
+        ]
+
+    def rank_history(self, url: str, keyword: str = None) -> List[Dict[str, Any]]:
+        """Historial de posiciones de una URL (todas sus keywords o una)."""
+        sql = ("SELECT k.keyword, s.market, s.device, s.fetched_at, r.rank_group, r.rank_absolute "
+               "FROM urls u JOIN serp_rows r ON r.url_id = u.id "
+               "JOIN snapshots s ON s.id = r.snapshot_id JOIN keywords k ON k.id = s.keyword_id "
+               "WHERE u.url = ?")
+        params: List[Any] = [url]
+        if keyword:
+            sql += " AND k.keyword = ?"
+            params.append(keyword.strip().lower())
+        sql += " ORDER BY s.fetched_at"
+        return [
+            {"keyword": k, "market": m, "device": dv, "fetched_at": f, "rank_group": rg, "rank_absolute": ra}
+            for k, m, dv, f, rg, ra in self._conn().execute(sql, params)
+        ]
+
+    def keyword_history(self, keyword: str, market: str = "Peru", device: str = "desktop",
+                        max_rank: int = 10) -> List[Dict[str, Any]]:
+        """Posiciones orgánicas por snapshot para una keyword."""
+        sql = ("SELECT s.fetched_at, r.rank_group, u.url FROM snapshots s "
+               "JOIN keywords k ON k.id = s.keyword_id JOIN serp_rows r ON r.snapshot_id = s.id "
+               "JOIN urls u ON u.id = r.url_id "
+               "WHERE k.keyword = ? AND s.market = ? AND s.device = ? AND r.rank_group <= ? "
+               "AND r.type_id = (SELECT id FROM item_types WHERE name = 'organic') "
+               "ORDER BY s.fetched_at, r.rank_group")
+        return [
+            {"fetched_at": f, "rank_group": rg, "url": u}
+            for f, rg, u in self._conn().execute(sql, (keyword.strip().lower(), market, device, max_rank))
+        ]
+
+    def latest_serps(self, market: str = None, device: str = None, max_rank: int = 10) -> List[Dict[str, Any]]:
+        """URLs orgánicas del último snapshot de cada keyword (entrada para keyword_clusters)."""
+        sql = ("SELECT k.keyword, u.url FROM latest l JOIN keywords k ON k.id = l.keyword_id "
+               "JOIN serp_rows r ON r.snapshot_id = l.snapshot_id JOIN urls u ON u.id = r.url_id "
+               "WHERE r.rank_group <= ? AND r.type_id = (SELECT id FROM item_types WHERE name = 'organic')")
+        params: List[Any] = [max_rank]
+        if market:
+            sql += " AND l.market = ?"
+            params.append(market)
+        if device:
+            sql += " AND l.device = ?"
+            params.append(device)
+        sql += " ORDER BY l.keyword_id, r.rank_group"
+        serps: Dict[str, List[str]] = {}
+        for keyword, url in self._conn().execute(sql, params):
+            serps.setdefault(keyword, []).append(url)
+        return [{"keyword": k, "urls": v} for k, v in serps.items()]
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño del archivo."""
+        conn = self._conn()
+        count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return {
+            "path": self.path,
+            "keywords": count("keywords"),
+            "snapshots": count("snapshots"),
+            "cached_research": count("research_cache"),
+            "rows": count("serp_rows"),
+            "urls": count("urls"),
+            "domains": count("domains"),
+            "size_mb": round(os.path.getsize(self.path) / 1e6, 2) if os.path.exists(self.path) else 0,
+        }
+
+def diff_serps(previous_rows: List[Dict[str, Any]], items: List[Dict[str, Any]], top_n: int = 10,
+               move_threshold: int = MOVE_THRESHOLD) -> Dict[str, Any]:
+    """
+    Compara el top orgánico nuevo contra el snapshot anterior.
+    Devuelve URLs que entraron, salieron, se movieron (>= move_threshold) y sin cambios.
+    """
+    def _organic(rows, url_key="url"):
+        ranks: Dict[str, int] = {}
+        for r in rows or []:
+            rank = r.get("rank_group")
+            if r.get("type") == "organic" and r.get(url_key) and isinstance(rank, int) and rank <= top_n:
+                ranks.setdefault(r[url_key], rank)
+        return ranks
+
+    old = _organic(previous_rows)
+    new = _organic(items)
+    moved, unchanged = [], []
+    for url, rank in new.items():
+        if url in old:
+            delta = old[url] - rank
+            if abs(delta) >= move_threshold:
+                moved.append({"url": url, "from": old[url], "to": rank, "delta": delta})
+            else:
+                unchanged.append(url)
+    return {
+        "entered": [{"url": u, "to": r} for u, r in sorted(new.items(), key=lambda kv: kv[1]) if u not in old],
+        "exited": [{"url": u, "from": r} for u, r in sorted(old.items(), key=lambda kv: kv[1]) if u not in new],
+        "moved": sorted(moved, key=lambda m: m["to"]),
+        "unchanged": unchanged,
+    }
+
+def get_archive(path: str = DEFAULT_ARCHIVE_PATH) -> SerpArchive:
+    return shared_instance("serp_archive", path, lambda: SerpArchive(path))
+
+# =====================
+# CLI
+# =====================
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Consultas sobre el archivo histórico de SERPs.")
+    parser.add_argument("--db", default=DEFAULT_ARCHIVE_PATH, help="Ruta del archivo SQLite")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    p = sub.add_parser("top-domains")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--max-rank", type=int, default=10)
+    p.add_argument("--market")
+    p.add_argument("--device")
+    p = sub.add_parser("rank-history")
+    p.add_argument("url")
+    p.add_argument("--keyword")
+    p = sub.add_parser("keyword-history")
+    p.add_argument("keyword")
+    p.add_argument("--market", default="Peru")
+    p.add_argument("--device", default="desktop")
+    p = sub.add_parser("export-serps", help="JSONL de últimas SERPs (entrada de keyword_clusters.py)")
+    p.add_argument("--market")
+    p.add_argument("--device")
+    args = parser.parse_args(argv)
+
+    archive = SerpArchive(args.db)
+    start = time.perf_counter()
+    if args.cmd == "stats":
+        result = archive.stats()
+    elif args.cmd == "top-domains":
+        result = archive.top_domains(limit=args.limit, max_rank=args.max_rank, market=args.market, device=args.device)
+    elif args.cmd == "rank-history":
+        result = archive.rank_history(args.url, keyword=args.keyword)
+    elif args.cmd == "keyword-history":
+        result = archive.keyword_history(args.keyword, market=args.market, device=args.device)
+    else:
+        for entry in archive.latest_serps(market=args.market, device=args.device):
+            sys.stdout.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return 0
+
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    sys.stderr.write(f"{(time.perf_counter() - start) * 1000:.1f} ms\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
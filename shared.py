@@ -0,0 +1,29 @@
+"""
+Instancias compartidas por proceso.
+
+Los stores SQLite, el historial de modelos, los breakers, los limitadores, el
+analizador de calidad y el especulador se crean una vez por proceso (y por
+clave, p.ej. la ruta del archivo) y se reutilizan desde la app, la API y los
+CLIs. En Streamlit cada rerun vuelve a ejecutar app.py, pero los módulos
+importados quedan cargados: la instancia sobrevive a los reruns.
+
+    store = shared_instance("project_store", path, lambda: ProjectStore(path))
+    shared_instances("breaker")   # las ya creadas de ese tipo
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+_instances: Dict[Tuple[str, Hashable], Any] = {}
+# Reentrante: una fábrica puede pedir a su vez otra instancia compartida
+_instances_lock = threading.RLock()
+
+def shared_instance(kind: str, key: Hashable, factory: Callable[[], Any]) -> Any:
+    """Instancia de `kind` para `key`; la primera llamada la crea con `factory()`."""
+    with _instances_lock:
+        if (kind, key) not in _instances:
+            _instances[(kind, key)] = factory()
+        return _instances[(kind, key)]
+
+def shared_instances(kind: str) -> List[Any]:
+    with _instances_lock:
+        return [obj for (k, _), obj in _instances.items() if k == kind]
@@ -0,0 +1,208 @@
+"""
+Redacción especulativa mientras el usuario sigue en los pasos 2-3.
+
+En el paso 2 se calienta el cliente OpenAI (SDK importado, conexión TLS
+abierta). Al llegar al paso 3, con los inputs ya enviados, se redacta en
+segundo plano un borrador con la estructura optimizada (o la primera). En el
+paso 4, si la petición final a OpenAI es idéntica (misma estructura, inputs y
+research) el borrador se usa al instante; si no, se descarta y se redacta como
+siempre.
+
+El gasto especulativo tiene tope: SPECULATIVE_TOKEN_BUDGET tokens por hora en
+todo el proceso (0 lo desactiva) y como mucho un borrador por sesión.
+
+    spec = get_speculator()
+    spec.speculate(session_id, generation)     # paso 3 -> "started", "exists", "budget"...
+    draft = spec.take(session_id, generation)  # paso 4 -> {"content", "waterfall", ...} o None
+
+`generation` son los argumentos de `seo_pipeline.generate_content_with_openai`.
+"""
+import hashlib, json, os, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+import seo_pipeline
+from cassette import openai_http_client
+from shared import shared_instance
+from telemetry import start_trace
+from token_budget import plan_budget
+
+# Tokens (prompt + salida) especulativos por hora en todo el proceso
+SPECULATIVE_TOKEN_BUDGET = int(os.getenv("SPECULATIVE_TOKEN_BUDGET", "60000"))
+BUDGET_WINDOW_SEC = 3600
+# Redacciones especulativas simultáneas (las demás esperan en cola)
+WORKERS = 2
+# Un borrador no reclamado en este tiempo se descarta
+DRAFT_TTL_SEC = 1800
+# Intervalo mínimo entre calentamientos del cliente (mantiene viva la conexión)
+WARM_INTERVAL_SEC = 60
+
+def draft_key(generation: Dict[str, Any]) -> str:
+    """
+    Huella de una redacción: los mensajes que se enviarían a OpenAI más la
+    configuración del modelo. Cualquier cambio de inputs o estructura la cambia.
+    """
+    request = seo_pipeline.build_chat_request(**generation)
+    payload = {
+        "messages": request["messages"],
+        "model_config": generation.get("model_config") or {},
+        "word_count": generation.get("word_count"),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+def _estimate_tokens(generation: Dict[str, Any]) -> int:
+    """Tokens que se reservan del presupuesto antes de lanzar el borrador."""
+    request = seo_pipeline.build_chat_request(**generation)
+    budget = plan_budget(request["messages"], request["model"], generation["word_count"], request["max_tokens"])
+    return budget["prompt_tokens"] * budget["calls_estimate"] + budget["output_estimate"]
+
+def _trace_tokens(waterfall) -> int:
+    return sum(int(r.get("prompt_tokens") or 0) + int(r.get("completion_tokens") or 0)
+               for r in waterfall if r["stage"] == "openai.chat_completion")
+
+class Speculator:
+    """Borradores en segundo plano por sesión, con tope de tokens por hora."""
+
+    def __init__(self, token_budget: int = SPECULATIVE_TOKEN_BUDGET, workers: int = WORKERS):
+        self.token_budget = token_budget
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculative")
+        # Reentrante: add_done_callback sobre un futuro ya terminado corre en el acto
+        self._lock = threading.RLock()
+        self._drafts: Dict[str, Dict[str, Any]] = {}
+        # [inicio, tokens] por borrador lanzado: reserva estimada, luego el gasto real
+        self._charges: deque = deque()
+        self._last_warm = 0.0
+        self._counts = {"started": 0, "hits": 0, "misses": 0, "failed": 0, "skipped_budget": 0, "wasted_tokens": 0}
+
+    def enabled(self) -> bool:
+        # Sin clave la redacción es la plantilla local; con cassette no se graban ni reproducen especulaciones
+        return self.token_budget > 0 and bool(seo_pipeline.OPENAI_API_KEY) and openai_http_client() is None
+
+    def warm(self):
+        """Calienta el cliente OpenAI en segundo plano (como mucho cada WARM_INTERVAL_SEC)."""
+        if not self.enabled():
+            return
+        with self._lock:
+            if time.time() - self._last_warm < WARM_INTERVAL_SEC:
+                return
+            self._last_warm = time.time()
+        self._pool.submit(seo_pipeline.warm_openai)
+
+    def spent_tokens(self) -> int:
+        with self._lock:
+            return self._spent_locked()
+
+    def _spent_locked(self) -> int:
+        horizon = time.time() - BUDGET_WINDOW_SEC
+        while self._charges and self._charges[0][0] < horizon:
+            self._charges.popleft()
+        return sum(c[1] for c in self._charges)
+
+    def speculate(self, session_id: str, generation: Dict[str, Any]) -> str:
+        """
+        Lanza el borrador de `generation` para la sesión si no existe ya.
+        Devuelve "started", "exists", "budget" (tope alcanzado) o "disabled".
+        """
+        if not self.enabled():
+            return "disabled"
+        key = draft_key(generation)
+        with self._lock:
+            self._expire_locked()
+            current = self._drafts.get(session_id)
+            if current and current["key"] == key:
+                return "exists"
+            if current:
+                self._discard_locked(self._drafts.pop(session_id))
+        estimate = _estimate_tokens(generation)
+        with self._lock:
+            if self._spent_locked() + estimate > self.token_budget:
+                self._counts["skipped_budget"] += 1
+                return "budget"
+            charge = [time.time(), estimate]
+            self._charges.append(charge)
+            draft = {"key": key, "started_at": time.time(), "charge": charge, "structure": generation["structure"].get("name")}
+            draft["future"] = self._pool.submit(self._run, generation, charge)
+            self._drafts[session_id] = draft
+            self._counts["started"] += 1
+        return "started"
+
+    def _run(self, generation: Dict[str, Any], charge: list) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with start_trace("speculative_draft", keyword=generation.get("keyword")) as trace:
+            try:
+                content = seo_pipeline.generate_content_with_openai(**generation)
+            finally:
+                with self._lock:
+                    charge[1] = _trace_tokens(trace.waterfall()) or charge[1]
+        return {
+            "content": content,
+            "waterfall": trace.waterfall(),
+            "tokens": charge[1],
+            "elapsed_sec": round(time.perf_counter() - started, 2),
+            "finished_at": time.time(),
+        }
+
+    def take(self, session_id: str, generation: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Borrador de la sesión si corresponde exactamente a `generation` (espera
+        a que termine si sigue en curso: ya lleva ventaja). Si no corresponde se
+        descarta. Consume el borrador: una regeneración redacta de nuevo.
+        """
+        with self._lock:
+            draft = self._drafts.pop(session_id, None)
+        if draft is None:
+            return None
+        if draft["key"] != draft_key(generation) or time.time() - draft["started_at"] > DRAFT_TTL_SEC:
+            with self._lock:
+                self._counts["misses"] += 1
+                self._discard_locked(draft)
+            return None
+        waited = time.perf_counter()
+        try:
+            result = draft["future"].result()
+        except Exception:
+            with self._lock:
+                self._counts["failed"] += 1
+            return None
+        with self._lock:
+            self._counts["hits"] += 1
+        return {**result, "waited_sec": round(time.perf_counter() - waited, 2)}
+
+    def discard(self, session_id: str):
+        with self._lock:
+            draft = self._drafts.pop(session_id, None)
+            if draft:
+                self._discard_locked(draft)
+
+    def _discard_locked(self, draft: Dict[str, Any]):
+        future = draft["future"]
+        if future.cancel():
+            # Seguía en cola: no gastó nada
+            draft["charge"][1] = 0
+            return
+        def wasted(f):
+            with self._lock:
+                self._counts["wasted_tokens"] += draft["charge"][1]
+        future.add_done_callback(wasted)
+
+    def _expire_locked(self):
+        now = time.time()
+        for session_id in [s for s, d in self._drafts.items() if now - d["started_at"] > DRAFT_TTL_SEC]:
+            self._discard_locked(self._drafts.pop(session_id))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counts,
+                "pending": sum(1 for d in self._drafts.values() if not d["future"].done()),
+                "spent_tokens_last_hour": self._spent_locked(),
+                "token_budget_per_hour": self.token_budget,
+            }
+
+def get_speculator(token_budget: int = None) -> Speculator:
+    """Especulador del proceso; `token_budget` (si se pasa) reemplaza el tope por hora."""
+    spec = shared_instance("speculator", None, lambda: Speculator(SPECULATIVE_TOKEN_BUDGET))
+    if token_budget is not None:
+        spec.token_budget = token_budget
+    return spec
@@ -0,0 +1,274 @@
+"""
+Instrumentación por etapa: spans con duración, bytes y tokens.
+
+- `start_trace("research")` abre una traza para una ejecución (paso 1, paso 4...).
+- `with span("dataforseo.task_post") as sp: sp.set(bytes=...)` mide una etapa.
+- Cada span alimenta agregados por proceso (p50/p95 por etapa) que se exportan
+  en formato Prometheus (`prometheus_text()`) y las trazas completas en JSON
+  compatible con OTLP (`otlp_json()`), a archivo o vía `start_metrics_server()`.
+"""
+import contextvars, functools, json, os, secrets, threading, time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+
+SERVICE_NAME = "seo-agent"
+STAGE_SAMPLES = 1000   # duraciones recientes por etapa para percentiles
+RECENT_TRACES = 50     # trazas servidas en /traces
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("seo_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("seo_span", default=None)
+
+class Span:
+    """Una etapa medida dentro de una traza."""
+
+    def __init__(self, name: str, trace: "Trace", parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.depth = parent.depth + 1 if parent else 0
+        self.attrs = dict(attrs)
+        self.start = time.time()
+        self.end = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update({k: v for k, v in attrs.items() if v is not None})
+
+    @property
+    def duration(self) -> float:
+        return ((self.end or time.time()) - self.start)
+
+class Trace:
+    """Conjunto de spans de una ejecución del pipeline."""
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.attrs = attrs
+        self.start = time.time()
+        self.end = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, sp: Span):
+        with self._lock:
+            self.spans.append(sp)
+
+    def waterfall(self) -> List[Dict[str, Any]]:
+        """Filas ordenadas por inicio con desplazamiento y duración en ms."""
+        end = self.end or time.time()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return [{
+            "stage": s.name,
+            "depth": s.depth,
+            "offset_ms": round((s.start - self.start) * 1000, 1),
+            "duration_ms": round(s.duration * 1000, 1),
+            "error": s.error,
+            **{k: v for k, v in s.attrs.items()},
+        } for s in spans] + [{"stage": f"{self.name} (total)", "depth": -1, "offset_ms": 0.0,
+                              "duration_ms": round((end - self.start) * 1000, 1), "error": None}]
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Traza en el formato JSON de OTLP/HTTP (resourceSpans)."""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "seo-agent.telemetry"},
+                    "spans": [{
+                        "traceId": self.trace_id,
+                        "spanId": s.span_id,
+                        **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                        "name": s.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(int(s.start * 1e9)),
+                        "endTimeUnixNano": str(int((s.end or s.start) * 1e9)),
+                        "attributes": [_otlp_attr(k, v) for k, v in {**self.attrs, **s.attrs}.items()],
+                        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                    } for s in spans],
+                }],
+            }]
+        }
+
+def _otlp_attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+# =====================
+# Agregados por proceso
+# =====================
+_stages: Dict[str, Dict[str, Any]] = {}
+_stages_lock = threading.Lock()
+_recent_traces: deque = deque(maxlen=RECENT_TRACES)
+
+def _record(sp: Span):
+    with _stages_lock:
+        st = _stages.setdefault(sp.name, {
+            "durations": deque(maxlen=STAGE_SAMPLES), "count": 0, "sum": 0.0,
+            "errors": 0, "bytes": 0, "tokens": 0, "cached_tokens": 0,
+        })
+        st["durations"].append(sp.duration)
+        st["count"] += 1
+        st["sum"] += sp.duration
+        st["errors"] += 1 if sp.error else 0
+        st["bytes"] += int(sp.attrs.get("bytes") or 0)
+        st["tokens"] += int(sp.attrs.get("total_tokens") or 0)
+        st["cached_tokens"] += int(sp.attrs.get("cached_tokens") or 0)
+
+def stage_summary() -> List[Dict[str, Any]]:
+    """p50/p95 por etapa desde que arrancó el proceso (últimas STAGE_SAMPLES)."""
+    with _stages_lock:
+        items = [(name, dict(st, durations=sorted(st["durations"]))) for name, st in _stages.items()]
+    out = []
+    for name, st in sorted(items):
+        d = st["durations"]
+        q = lambda p: d[min(len(d) - 1, int(p * len(d)))] if d else 0.0
+        out.append({
+            "stage": name, "count": st["count"], "errors": st["errors"],
+            "p50_ms": round(q(0.50) * 1000, 1), "p95_ms": round(q(0.95) * 1000, 1),
+            "avg_ms": round(st["sum"] / st["count"] * 1000, 1) if st["count"] else 0.0,
+            "sum_sec": st["sum"],
+            "bytes": st["bytes"], "tokens": st["tokens"], "cached_tokens": st["cached_tokens"],
+        })
+    return out
+
+# =====================
+# API de instrumentación
+# =====================
+@contextmanager
+def start_trace(name: str, **attrs):
+    """Abre una traza; al cerrar se agrega a las recientes y se exporta a archivo si está configurado."""
+    trace = Trace(name, **attrs)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.end = time.time()
+        _current_trace.reset(token)
+        _recent_traces.append(trace)
+        _export_to_file(trace)
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mide una etapa. Sin traza activa solo alimenta los agregados del proceso."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    sp = Span(name, trace, parent if parent and parent.trace is trace else None, attrs)
+    token = _current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.error = f"{type(e).__name__}: {e}"[:200]
+        raise
+    finally:
+        sp.end = time.time()
+        _current_span.reset(token)
+        if trace is not None:
+            trace.add(sp)
+        _record(sp)
+
+def traced(name: str):
+    """Decorador: envuelve la función en un span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**attrs):
+    """Agrega atributos (bytes, tokens, url...) al span activo, si lo hay."""
+    sp = _current_span.get()
+    if sp is not None:
+        sp.set(**attrs)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+# =====================
+# Exportación
+# =====================
+def prometheus_text() -> str:
+    """Métricas por etapa en formato de texto de Prometheus."""
+    lines = [
+        "# HELP seo_agent_stage_duration_seconds Duración por etapa del pipeline.",
+        "# TYPE seo_agent_stage_duration_seconds summary",
+    ]
+    summary = stage_summary()
+    for s in summary:
+        label = s["stage"].replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'seo_agent_stage_duration_seconds{{stage="{label}",quantile="0.5"}} {s["p50_ms"] / 1000:.6f}')
+        lines.append(f'seo_agent_stage_duration_seconds{{stage="{label}",quantile="0.95"}} {s["p95_ms"] / 1000:.6f}')
+        lines.append(f'seo_agent_stage_duration_seconds_count{{stage="{label}"}} {s["count"]}')
+        lines.append(f'seo_agent_stage_duration_seconds_sum{{stage="{label}"}} {s["sum_sec"]:.6f}')
+    for metric, key, help_text in (
+        ("seo_agent_stage_errors_total", "errors", "Etapas terminadas con error."),
+        ("seo_agent_stage_bytes_total", "bytes", "Bytes de respuesta recibidos por etapa."),
+        ("seo_agent_stage_tokens_total", "tokens", "Tokens de OpenAI consumidos por etapa."),
+        ("seo_agent_stage_cached_tokens_total", "cached_tokens", "Tokens de prompt servidos desde el caché de OpenAI."),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for s in summary:
+            label = s["stage"].replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{metric}{{stage="{label}"}} {s[key]}')
+    return "\n".join(lines) + "\n"
+
+def otlp_json(limit: int = RECENT_TRACES) -> Dict[str, Any]:
+    """Trazas recientes combinadas en un único payload OTLP/JSON."""
+    traces = list(_recent_traces)[-limit:]
+    return {"resourceSpans": [rs for t in traces for rs in t.to_otlp()["resourceSpans"]]}
+
+def _export_to_file(trace: Trace):
+    path = os.getenv("TELEMETRY_OTLP_FILE")
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace.to_otlp(), ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics"):
+            body, ctype = prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif self.path.startswith("/traces"):
+            body, ctype = json.dumps(otlp_json()).encode(), "application/json"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Sirve /metrics (Prometheus) y /traces (OTLP JSON) en un hilo; idempotente por proceso."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
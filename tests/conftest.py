@@ -0,0 +1,4 @@
+import os, sys
+
+# Los módulos viven en la raíz del repo (sin paquete)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+import gzip, json
+
+import cassette
+from cassette import Cassette, CassetteTransport, httpx
+
+class _Chunks(httpx.SyncByteStream):
+    """Stream real por trozos (httpx.Response(content=...) ya llega leído y cerrado)."""
+
+    def __init__(self, data: bytes, size: int = 16):
+        self._parts = [data[i:i + size] for i in range(0, len(data), size)]
+
+    def __iter__(self):
+        yield from self._parts
+
+def test_httpx_gzip_round_trip(tmp_path):
+    path = str(tmp_path / "http.jsonl.gz")
+    payload = json.dumps({"choices": [{"message": {"content": "hola ñandú"}}]}).encode("utf-8")
+
+    def upstream(request):
+        return httpx.Response(200, headers={"content-type": "application/json", "content-encoding": "gzip"},
+                              stream=_Chunks(gzip.compress(payload)))
+
+    recorder = CassetteTransport(Cassette(path, "record"), inner=httpx.MockTransport(upstream))
+    with httpx.Client(transport=recorder) as client:
+        assert client.post("https://api.openai.com/v1/chat/completions", json={"q": 1}).content == payload
+
+    entry = cassette.load_entries(path)[0]
+    assert entry["headers"].get("content-encoding") == "gzip"
+
+    player = CassetteTransport(Cassette(path, "replay", speed=0))
+    with httpx.Client(transport=player) as client:
+        response = client.post("https://api.openai.com/v1/chat/completions", json={"q": 1})
+    assert response.status_code == 200
+    assert response.json() == json.loads(payload)
@@ -0,0 +1,66 @@
+import pytest
+
+import seo_pipeline
+from mock_servers import MockOpenAI
+from seo_pipeline import continuation_prompt, trim_to_complete_section
+
+STRUCTURE = {"headers": ["Qué es", "Cómo empezar", "Errores comunes", "Conclusión"]}
+
+def test_trim_cut_mid_section():
+    md = "# Título\n\n## Qué es\n\nTexto completo.\n\n## Cómo empezar\n\nPárrafo a medi"
+    assert trim_to_complete_section(md) == "# Título\n\n## Qué es\n\nTexto completo."
+
+def test_trim_cut_exactly_at_heading():
+    md = "## Qué es\n\nTexto completo.\n\n## Cómo empezar"
+    assert trim_to_complete_section(md) == "## Qué es\n\nTexto completo."
+
+def test_trim_without_headings():
+    assert trim_to_complete_section("Primer párrafo.\n\nSegundo a medi") == "Primer párrafo."
+    # Un único párrafo no se puede recortar sin perderlo todo
+    assert trim_to_complete_section("Un párrafo a medi") == "Un párrafo a medi"
+
+def test_continuation_prompt_lists_pending_sections():
+    prompt = continuation_prompt("# Título\n\n## Qué es\n\nTexto.\n\n## cómo empezar\n\nMás.", STRUCTURE["headers"])
+    assert "- Errores comunes\n- Conclusión" in prompt
+    assert "- Qué es" not in prompt and "- Cómo empezar" not in prompt
+    done = continuation_prompt("\n\n".join(f"## {h}\n\nTexto." for h in STRUCTURE["headers"]), STRUCTURE["headers"])
+    assert "Completa la sección en curso" in done
+
+@pytest.fixture
+def mock_openai(tmp_path, monkeypatch):
+    def start(**profile):
+        server = MockOpenAI(latency=0, **profile).start()
+        monkeypatch.setattr(seo_pipeline, "OPENAI_API_KEY", "sk-test")
+        monkeypatch.setattr(seo_pipeline, "OPENAI_BASE_URL", server.url + "/v1")
+        monkeypatch.setattr(seo_pipeline, "MODEL_STATS_PATH", str(tmp_path / "model_stats.sqlite3"))
+        servers.append(server)
+        return server
+    servers = []
+    yield start
+    for server in servers:
+        server.stop()
+
+def _request(max_tokens: int):
+    return seo_pipeline.build_chat_request("Guía", "estudiar enfermería", STRUCTURE, "profesional", 100, "",
+                                           {"competitors": []}, model_config={"max_tokens": max_tokens})
+
+def test_complete_article_without_truncation(mock_openai):
+    server = mock_openai(completion_words=120)
+    content = seo_pipeline._complete_article(seo_pipeline.openai_client(), _request(4000), 100, STRUCTURE)
+    assert server.stats()["requests"]["chat_completions"] == 1
+    assert content.startswith("# Artículo simulado")
+
+def test_continuations_stop_at_max_continuations(mock_openai, monkeypatch):
+    monkeypatch.setattr(seo_pipeline, "MAX_CONTINUATIONS", 2)
+    # Siempre más palabras de las que caben: cada llamada termina con finish_reason "length"
+    server = mock_openai(completion_words=50000)
+    events = []
+    content = seo_pipeline._complete_article(seo_pipeline.openai_client(), _request(400), 100, STRUCTURE,
+                                             on_stream=lambda kind, text: events.append((kind, text)))
+    assert server.stats()["requests"]["chat_completions"] == 3
+    assert [k for k, _ in events].count("reset") == 2
+    # Cada parte intermedia se recortó hasta su última sección completa antes de continuar
+    parts = content.split("# Artículo simulado")
+    assert len(parts) == 4
+    for reset in (text for kind, text in events if kind == "reset"):
+        assert reset.endswith("\n\n") and not reset.rstrip().splitlines()[-1].startswith("#")
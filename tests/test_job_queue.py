@@ -0,0 +1,35 @@
+import sqlite3
+
+import job_queue
+from job_queue import JobQueue
+
+def test_requeue_only_expired_leases(tmp_path, monkeypatch):
+    path = str(tmp_path / "jobs.sqlite3")
+    alive, restarted = JobQueue(path), JobQueue(path)
+    job_id = alive.submit("research", {"keyword": "a"})
+    assert alive.claim()["id"] == job_id
+
+    # Otro proceso que arranca no toca un job con lease vigente
+    assert restarted.requeue_stale() == 0
+    assert alive.heartbeat([job_id]) == 1
+    assert restarted.heartbeat([job_id]) == 0
+
+    # Si el dueño deja de renovarlo, el lease vence y vuelve a la cola
+    monkeypatch.setattr(job_queue, "LEASE_SEC", -1)
+    alive.heartbeat([job_id])
+    assert restarted.requeue_stale() == 1
+    assert restarted.claim()["id"] == job_id
+
+def test_migrates_queue_without_lease_columns(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+                 "result BLOB, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+                 "started_at REAL, finished_at REAL)")
+    conn.execute("INSERT INTO jobs (id, kind, status, params, attempts, created_at) VALUES ('j1', 'research', 'running', '{}', 1, 0)")
+    conn.commit()
+    conn.close()
+    queue = JobQueue(path)
+    # Un job `running` de antes de los leases se considera interrumpido
+    assert queue.requeue_stale() == 1
+    assert queue.get("j1")["status"] == "queued"
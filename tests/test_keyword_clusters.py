@@ -0,0 +1,35 @@
+import random
+from itertools import combinations
+
+from keyword_clusters import (DEFAULT_THRESHOLD, candidate_pairs, minhash_signature, ranked_urls,
+                              url_weights, weighted_jaccard)
+
+def _sample(n_topics: int = 25, per_topic: int = 8, seed: int = 7):
+    """Keywords por tema: el SERP base del tema con algunas URLs cambiadas y posiciones movidas."""
+    rng = random.Random(seed)
+    entries = []
+    for t in range(n_topics):
+        base = [f"https://site{rng.randrange(400)}.com/tema-{t}/{i}" for i in range(10)]
+        for k in range(per_topic):
+            urls = list(base)
+            for _ in range(rng.randrange(5)):
+                urls[rng.randrange(10)] = f"https://otro{rng.randrange(10**6)}.com/"
+            for _ in range(rng.randrange(3)):
+                i, j = rng.randrange(10), rng.randrange(10)
+                urls[i], urls[j] = urls[j], urls[i]
+            entries.append({"keyword": f"kw {t}-{k}", "urls": urls})
+    return entries
+
+def test_lsh_recall_against_brute_force():
+    weights = [url_weights(ranked_urls(e)) for e in _sample()]
+    expected = {
+        (i, j) for i, j in combinations(range(len(weights)), 2)
+        if weighted_jaccard(weights[i], weights[j]) >= DEFAULT_THRESHOLD
+    }
+    found = {
+        (i, j) for i, j in candidate_pairs([minhash_signature(w) for w in weights], DEFAULT_THRESHOLD)
+        if weighted_jaccard(weights[i], weights[j]) >= DEFAULT_THRESHOLD
+    }
+    assert len(expected) > 200
+    assert found <= expected
+    assert len(found) / len(expected) >= 0.95
@@ -0,0 +1,20 @@
+import threading
+
+from profiling import RerunProfiler
+
+def test_second_cprofile_session_falls_back_to_sampling():
+    first = RerunProfiler("cprofile", label="a").start()
+    try:
+        second = RerunProfiler("cprofile", label="b").start()
+        assert second.mode == "sample" and second.fallback
+        assert second.stop()["mode"] == "sample"
+    finally:
+        # Un rerun interrumpido lo detiene desde otro hilo
+        done = []
+        t = threading.Thread(target=lambda: done.append(first.stop(interrupted=True)))
+        t.start()
+        t.join()
+    assert done[0]["mode"] == "cprofile"
+    third = RerunProfiler("cprofile", label="c").start()
+    assert third.mode == "cprofile"
+    third.stop()
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+import rate_limit
+from deadline import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded
+
+def _half_open(monkeypatch, family: str) -> CircuitBreaker:
+    breaker = CircuitBreaker(family, failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == "half-open"
+    monkeypatch.setattr(rate_limit, "get_breaker", lambda name: breaker)
+    return breaker
+
+def test_deadline_in_half_open_releases_probe(monkeypatch):
+    breaker = _half_open(monkeypatch, "test")
+    with pytest.raises(DeadlineExceeded):
+        rate_limit.limited_request("test", "GET", "http://127.0.0.1:9/", deadline=Deadline(0))
+    # La prueba no quedó tomada: otra llamada puede volver a probar
+    assert breaker.state == "half-open"
+    assert breaker.allow() is True
+
+def test_local_error_in_half_open_releases_probe(monkeypatch):
+    breaker = _half_open(monkeypatch, "test_call")
+
+    def boom():
+        raise KeyError("sin status_code")
+
+    with pytest.raises(KeyError):
+        rate_limit.limited_call("test_call", boom)
+    assert breaker.allow() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+def test_retry_after_unparseable_date():
+    assert rate_limit.retry_after_seconds({"Retry-After": "mañana"}) is None
+    assert rate_limit.retry_after_seconds({"Retry-After": "Fri, 31 Dec 99999 23:59:59 GMT"}) is None
+    assert rate_limit.retry_after_seconds({"Retry-After": "3"}) == 3.0
+
+class APITimeoutError(Exception):
+    """Mismo nombre que el timeout del SDK de OpenAI."""
+
+def test_client_chosen_timeout_does_not_open_breaker(monkeypatch):
+    breaker = CircuitBreaker("test_timeout", failure_threshold=1)
+    monkeypatch.setattr(rate_limit, "get_breaker", lambda name: breaker)
+
+    def slow():
+        raise APITimeoutError("timeout")
+
+    with pytest.raises(APITimeoutError):
+        rate_limit.limited_call("test_timeout", slow, max_retries=0, client_timeout=True)
+    assert breaker.state == "closed"
+    with pytest.raises(APITimeoutError):
+        rate_limit.limited_call("test_timeout", slow, max_retries=0)
+    assert breaker.state == "open"
@@ -0,0 +1,45 @@
+import pytest
+
+from seo_quality import QualityAnalyzer, fernandez_huerta, syllables
+
+@pytest.mark.parametrize("word,expected", [
+    ("casa", 2), ("ciudad", 2), ("aire", 2), ("país", 2), ("leer", 2),
+    ("que", 1), ("guerra", 2), ("hoy", 1), ("muy", 1), ("enfermería", 5),
+])
+def test_syllables(word, expected):
+    assert syllables(word) == expected
+
+def test_fernandez_huerta():
+    # 100 palabras, 200 sílabas y 5 oraciones: 206,84 − 0,60·200 − 1,02·5
+    assert fernandez_huerta(100, 200, 5) == 81.7
+    assert fernandez_huerta(0, 0, 0) is None
+
+def _article(sections):
+    intro = "# Cómo estudiar enfermería\n\nEstudiar enfermería es una decisión importante."
+    return "\n\n".join([intro] + [f"## {heading}\n\n{text}" for heading, text in sections])
+
+SECTIONS = [
+    ("Requisitos para estudiar", "Necesitas el bachillerato completo. La nota de corte cambia cada año."),
+    ("Salidas laborales", "Hay trabajo en hospitales y clínicas. También en la atención domiciliaria."),
+    ("Conclusión", "Es una carrera exigente. Vale la pena si te gusta cuidar."),
+]
+
+def test_header_matching():
+    report = QualityAnalyzer().analyze(_article(SECTIONS), "estudiar enfermería",
+                                       headers=["Requisitos para estudiar enfermería", "Salidas laborales",
+                                                "Conclusión", "Dónde estudiar"])
+    h = report["headings"]
+    assert [m["found"] for m in h["matched"]] == ["Requisitos para estudiar", "Salidas laborales", "Conclusión"]
+    assert h["missing"] == ["Dónde estudiar"]
+    assert h["in_order"] and h["h1_count"] == 1
+
+def test_one_section_edit_reuses_the_rest():
+    analyzer = QualityAnalyzer()
+    first = analyzer.analyze(_article(SECTIONS), "estudiar enfermería")
+    assert first["sections_reused"] == 0
+    edited = list(SECTIONS)
+    edited[1] = ("Salidas laborales", "Hay trabajo en hospitales, clínicas y centros de salud.")
+    second = analyzer.analyze(_article(edited), "estudiar enfermería")
+    assert second["sections_reused"] == len(SECTIONS)  # H1 y las dos secciones sin cambios
+    # Primera pasada: H1 + 3 secciones; segunda: solo la editada
+    assert analyzer.stats()["analyzed"] == len(SECTIONS) + 2
@@ -0,0 +1,33 @@
+from serp_archive import MOVE_THRESHOLD, diff_serps
+
+def _organic(*urls, start: int = 1):
+    return [{"type": "organic", "url": u, "rank_group": i} for i, u in enumerate(urls, start) if u]
+
+def test_diff_serps_entered_exited_moved_unchanged():
+    previous = _organic("a", "b", "c", "d", "e", "f")
+    # a baja justo MOVE_THRESHOLD puestos (se movió); b sube uno menos (sin cambios)
+    current = _organic("x", "c", "b", None, "y", "e", "f", None, None, None, "z") + [
+        {"type": "organic", "url": "a", "rank_group": 1 + MOVE_THRESHOLD},
+        {"type": "people_also_ask", "url": "d", "rank_group": 4},
+    ]
+    diff = diff_serps(previous, current)
+
+    assert diff["entered"] == [{"url": "x", "to": 1}, {"url": "y", "to": 5}]
+    # d solo aparece como no orgánico y z queda fuera del top 10
+    assert diff["exited"] == [{"url": "d", "from": 4}]
+    assert diff["moved"] == [{"url": "a", "from": 1, "to": 1 + MOVE_THRESHOLD, "delta": -MOVE_THRESHOLD}]
+    assert sorted(diff["unchanged"]) == ["b", "c", "e", "f"]
+
+def test_diff_serps_threshold_boundary():
+    previous = _organic("a", "b")
+    below = diff_serps(previous, [{"type": "organic", "url": "a", "rank_group": MOVE_THRESHOLD},
+                                  {"type": "organic", "url": "b", "rank_group": 2 + MOVE_THRESHOLD}])
+    assert below["unchanged"] == ["a"]  # se movió MOVE_THRESHOLD - 1 puestos
+    assert below["moved"] == [{"url": "b", "from": 2, "to": 2 + MOVE_THRESHOLD, "delta": -MOVE_THRESHOLD}]
+    up = diff_serps(_organic(*"abcde"), [{"type": "organic", "url": "e", "rank_group": 5 - MOVE_THRESHOLD}])
+    assert up["moved"][0]["delta"] == MOVE_THRESHOLD
+
+def test_diff_serps_without_previous_rows():
+    diff = diff_serps([], _organic("a", "b"))
+    assert [e["url"] for e in diff["entered"]] == ["a", "b"]
+    assert diff["exited"] == [] and diff["moved"] == [] and diff["unchanged"] == []
@@ -0,0 +1,149 @@
+"""
+Presupuesto de tokens por modelo: prompt contado con el tokenizer real
+(tiktoken) y salida estimada a partir de las palabras pedidas.
+
+- `count_message_tokens(messages, model)`: tokens del prompt de chat.
+- `estimate_output_tokens(word_count, model)`: tokens esperados del artículo;
+  usa la relación tokens/palabra medida en generaciones anteriores del proceso
+  cuando hay suficientes muestras.
+- `plan_budget(...)`: `max_tokens` por llamada dentro de los límites del modelo.
+- `record_usage(...)` / `usage_report()`: estimado vs. real por modelo.
+
+Sin tiktoken (o sin poder descargar su vocabulario) se cae a una aproximación
+por caracteres; `exact` indica cuál se usó.
+"""
+import math, statistics, threading
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Any, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Límites publicados por modelo y tokenizer
+MODEL_LIMITS: Dict[str, Dict[str, Any]] = {
+    "gpt-4o-mini": {"context": 128000, "max_output": 16384, "encoding": "o200k_base"},
+    "gpt-4o": {"context": 128000, "max_output": 16384, "encoding": "o200k_base"},
+    "gpt-4-turbo": {"context": 128000, "max_output": 4096, "encoding": "cl100k_base"},
+    "gpt-3.5-turbo": {"context": 16385, "max_output": 4096, "encoding": "cl100k_base"},
+}
+DEFAULT_LIMITS = MODEL_LIMITS["gpt-4o-mini"]
+# Tokens por palabra en Markdown en español (o200k es más eficiente con el español)
+TOKENS_PER_WORD = {"o200k_base": 1.45, "cl100k_base": 1.75}
+# Caracteres por token para la aproximación sin tokenizer
+CHARS_PER_TOKEN = {"o200k_base": 4.0, "cl100k_base": 3.4}
+# Margen sobre la estimación de salida al fijar max_tokens
+OUTPUT_MARGIN = 1.15
+# Muestras reales necesarias antes de confiar en la relación aprendida
+MIN_SAMPLES = 3
+
+def model_limits(model: str) -> Dict[str, Any]:
+    if model in MODEL_LIMITS:
+        return MODEL_LIMITS[model]
+    # Variantes con fecha (gpt-4o-2024-08-06...) comparten límites con su familia
+    family = max((m for m in MODEL_LIMITS if model.startswith(m)), key=len, default=None)
+    return MODEL_LIMITS[family] if family else DEFAULT_LIMITS
+
+@lru_cache(maxsize=None)
+def _encoding(name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:  # vocabulario no descargable (sin red)
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    name = model_limits(model)["encoding"]
+    enc = _encoding(name)
+    if enc is not None:
+        return len(enc.encode(text or "", disallowed_special=()))
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN[name])
+
+def is_exact(model: str) -> bool:
+    return _encoding(model_limits(model)["encoding"]) is not None
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Tokens de un prompt de chat (contenido + ~3 tokens de formato por mensaje + 3 del inicio de la respuesta)."""
+    return sum(3 + count_tokens(m.get("content") or "", model) for m in messages) + 3
+
+# =====================
+# Historial estimado vs. real (por proceso)
+# =====================
+_lock = threading.Lock()
+_ratios: Dict[str, deque] = {}
+_usage: Dict[str, Dict[str, Any]] = {}
+
+def tokens_per_word(model: str) -> float:
+    """Mediana medida en el proceso si hay suficientes muestras; si no, la de referencia."""
+    with _lock:
+        samples = list(_ratios.get(model, ()))
+    if len(samples) >= MIN_SAMPLES:
+        return statistics.median(samples)
+    return TOKENS_PER_WORD[model_limits(model)["encoding"]]
+
+def estimate_output_tokens(word_count: int, model: str) -> int:
+    return int(word_count * tokens_per_word(model))
+
+def plan_budget(messages: List[Dict[str, str]], model: str, word_count: int, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Presupuesto de una redacción: tokens del prompt, salida estimada y el
+    `max_tokens` por llamada (al menos el configurado, con margen sobre la
+    estimación, sin pasar el máximo de salida del modelo ni su contexto).
+    """
+    limits = model_limits(model)
+    prompt_tokens = count_message_tokens(messages, model)
+    output_estimate = estimate_output_tokens(word_count, model)
+    wanted = max(int(max_tokens or 0), math.ceil(output_estimate * OUTPUT_MARGIN))
+    per_call = max(1, min(wanted, limits["max_output"], limits["context"] - prompt_tokens))
+    return {
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "output_estimate": output_estimate,
+        "max_tokens": per_call,
+        # Si la salida estimada no entra en una llamada, habrá continuaciones
+        "calls_estimate": max(1, math.ceil(output_estimate * OUTPUT_MARGIN / per_call)),
+        "exact": is_exact(model),
+    }
+
+def record_usage(model: str, budget: Dict[str, Any], prompt_tokens: int, completion_tokens: int, words: int, calls: int, truncated: bool):
+    """Registra una redacción terminada (todas sus llamadas) frente a su presupuesto."""
+    with _lock:
+        if words and completion_tokens and not truncated:
+            _ratios.setdefault(model, deque(maxlen=50)).append(completion_tokens / words)
+        u = _usage.setdefault(model, {"generations": 0, "prompt_estimate": 0, "prompt_actual": 0,
+                                      "output_estimate": 0, "output_actual": 0, "calls": 0, "truncated": 0})
+        u["generations"] += 1
+        u["prompt_estimate"] += budget["prompt_tokens"]
+        u["prompt_actual"] += int(prompt_tokens or 0)
+        u["output_estimate"] += budget["output_estimate"]
+        u["output_actual"] += int(completion_tokens or 0)
+        u["calls"] += calls
+        u["truncated"] += 1 if truncated else 0
+
+def reset_usage():
+    """Vacía el historial estimado vs. real (la relación tokens/palabra aprendida se conserva)."""
+    with _lock:
+        _usage.clear()
+
+def usage_report() -> List[Dict[str, Any]]:
+    """Estimado vs. real por modelo desde que arrancó el proceso."""
+    with _lock:
+        items = [(model, dict(u)) for model, u in _usage.items()]
+    error = lambda est, real: round((real - est) / est * 100, 1) if est else None
+    out = []
+    for model, u in sorted(items):
+        out.append({
+            "model": model,
+            "generations": u["generations"],
+            "prompt_estimate": u["prompt_estimate"], "prompt_actual": u["prompt_actual"],
+            "prompt_error_pct": error(u["prompt_estimate"], u["prompt_actual"]),
+            "output_estimate": u["output_estimate"], "output_actual": u["output_actual"],
+            "output_error_pct": error(u["output_estimate"], u["output_actual"]),
+            "tokens_per_word": round(tokens_per_word(model), 3),
+            "avg_calls": round(u["calls"] / u["generations"], 2),
+            "truncated": u["truncated"],
+        })
+    return out
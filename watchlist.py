@@ -0,0 +1,216 @@
+"""
+Warm-up programado de las keywords prioritarias (watchlist).
+
+Fuera de horario pico refresca el research de las keywords de la lista cuyo
+research guardado tenga más de `--max-age` horas: publica las tareas SERP en
+lotes (hasta 100 por POST), espera a que estén listas con un único sondeo
+compartido de tasks_ready y analiza el contenido con concurrencia acotada.
+Cada resultado queda en el archivo SERP, de donde el paso 1 lo sirve al
+instante mientras tenga menos de RESEARCH_CACHE_MAX_AGE_HOURS. Fuera de pico no
+hay usuario esperando: cada keyword tiene un presupuesto amplio
+(`--research-budget`) y un research que aun así omite URLs queda como
+`partial` y no se guarda como servible.
+
+    python watchlist.py run watchlist.txt --secrets .streamlit/secrets.toml
+    python watchlist.py schedule watchlist.txt --at 03:00   # cada día a esa hora
+    python watchlist.py report watchlist.txt                # frescura por keyword
+
+La watchlist es un .txt (una keyword por línea; `#` comenta) o un CSV con
+columna `keyword`.
+"""
+import argparse, csv, datetime, json, math, sys, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List
+
+import seo_pipeline
+from batch_generate import load_secrets
+from deadline import Deadline
+from serp_archive import get_archive
+from telemetry import start_trace
+
+# Un research más viejo que esto se refresca en la siguiente pasada
+REFRESH_AFTER_HOURS = 20.0
+# Espera máxima de las tareas SERP del lote (las que no lleguen van por LIVE)
+READY_WAIT_SEC = 600
+POLL_INTERVAL_SEC = 10
+# Presupuesto por keyword (el interactivo, RESEARCH_BUDGET_SEC, omite las URLs lentas)
+RESEARCH_BUDGET_SEC = 900
+
+def load_watchlist(path: str) -> List[str]:
+    """Keywords de la watchlist, sin duplicados (ignorando mayúsculas) y en orden."""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith(".csv"):
+            keywords = [(row.get("keyword") or "").strip() for row in csv.DictReader(f)]
+        else:
+            keywords = [line.split("#", 1)[0].strip() for line in f]
+    seen, out = set(), []
+    for keyword in keywords:
+        if keyword and keyword.lower() not in seen:
+            seen.add(keyword.lower())
+            out.append(keyword)
+    return out
+
+def freshness(keywords: List[str], max_age_hours: float = None) -> List[Dict[str, Any]]:
+    """Por keyword: última actualización, antigüedad y si el paso 1 la serviría desde caché."""
+    max_age = seo_pipeline.RESEARCH_CACHE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    known = get_archive(seo_pipeline.SERP_ARCHIVE_PATH).research_freshness(keywords)
+    now = time.time()
+    rows = []
+    for keyword in keywords:
+        entry = known.get(keyword)
+        age = round((now - entry["refreshed_at"]) / 3600, 1) if entry else None
+        rows.append({
+            "keyword": keyword,
+            "refreshed_at": entry["refreshed_at"] if entry else None,
+            "age_hours": age,
+            "source": entry["source"] if entry else None,
+            "fresh": age is not None and age <= max_age,
+        })
+    return rows
+
+def _wait_ready(task_ids: List[str], max_wait_sec: float, poll_interval: float) -> set:
+    """Sondea tasks_ready (una consulta para todo el lote) hasta que estén todas o venza la espera."""
+    pending, ready = set(task_ids), set()
+    started = time.monotonic()
+    while pending:
+        now_ready = seo_pipeline.dataforseo_ready_ids() & pending
+        ready |= now_ready
+        pending -= now_ready
+        if not pending or time.monotonic() - started > max_wait_sec:
+            break
+        time.sleep(poll_interval)
+    return ready
+
+def _refresh_keyword(keyword: str, task_id: str, ready: set, research_budget: float = RESEARCH_BUDGET_SEC) -> Dict[str, Any]:
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"keyword": keyword}
+    try:
+        with start_trace("watchlist", keyword=keyword):
+            serp = seo_pipeline.dataforseo_task_get(task_id) if task_id in ready else None
+            # Sin SERP del lote (tarea rechazada o no lista a tiempo) analyze_competitors cae a LIVE
+            data = seo_pipeline.analyze_competitors(keyword, incremental=True, deadline=Deadline(research_budget),
+                                                    serp=serp or {"items": []}, source="watchlist")
+        skipped = data["research_budget"]["skipped_urls"]
+        record.update({
+            # partial: analyze_competitors no lo guardó como research servible
+            "status": "partial" if skipped else "ok",
+            "live_fallback": data.get("serp_source") == "live",
+            "reused_analyses": (data.get("serp_diff") or {}).get("reused_analyses", 0),
+        })
+    except Exception as e:
+        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"[:300]})
+    record["elapsed_sec"] = round(time.perf_counter() - started, 2)
+    return record
+
+def refresh(keywords: List[str], max_age_hours: float = REFRESH_AFTER_HOURS, concurrency: int = 4, force: bool = False,
+            ready_wait_sec: float = READY_WAIT_SEC, poll_interval: float = POLL_INTERVAL_SEC,
+            research_budget: float = RESEARCH_BUDGET_SEC, progress=None) -> Dict[str, Any]:
+    """Una pasada de warm-up sobre la watchlist; devuelve el resumen."""
+    if not seo_pipeline.DATAFORSEO_LOGIN or not seo_pipeline.DATAFORSEO_PASSWORD:
+        raise RuntimeError("Faltan credenciales de DataForSEO (DATAFORSEO_LOGIN / DATAFORSEO_PASSWORD)")
+    started = time.perf_counter()
+    before = {r["keyword"]: r for r in freshness(keywords, max_age_hours)}
+    stale = keywords if force else [k for k in keywords if not before[k]["fresh"]]
+
+    task_ids = seo_pipeline.dataforseo_create_tasks(stale) if stale else {}
+    ready = _wait_ready(list(task_ids.values()), ready_wait_sec, poll_interval) if task_ids else set()
+
+    results: List[Dict[str, Any]] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(_refresh_keyword, k, task_ids.get(k), ready, research_budget) for k in stale]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if progress:
+                progress(results[-1], len(results), len(stale))
+    return {
+        "watchlist": len(keywords),
+        "already_fresh": len(keywords) - len(stale),
+        "refreshed": sum(1 for r in results if r["status"] != "error"),
+        "partial": sum(1 for r in results if r["status"] == "partial"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "task_posts": math.ceil(len(stale) / seo_pipeline.TASK_POST_BATCH),
+        "live_fallbacks": sum(1 for r in results if r.get("live_fallback")),
+        "wall_sec": round(time.perf_counter() - started, 1),
+        "failures": [r for r in results if r["status"] == "error"],
+    }
+
+def seconds_until(at: str, now: datetime.datetime = None) -> float:
+    """Segundos hasta la próxima vez que el reloj local marque `at` (HH:MM)."""
+    now = now or datetime.datetime.now()
+    hour, minute = (int(x) for x in at.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += datetime.timedelta(days=1)
+    return (target - now).total_seconds()
+
+# =====================
+# CLI
+# =====================
+def _print_summary(summary: Dict[str, Any]):
+    print(f"{summary['refreshed']} actualizadas ({summary['partial']} parciales, sin guardar), {summary['failed']} fallidas, "
+          f"{summary['already_fresh']} ya frescas de {summary['watchlist']} en {summary['wall_sec']}s — "
+          f"{summary['task_posts']} task_post, {summary['live_fallbacks']} por LIVE")
+    for f in summary["failures"]:
+        print(f"  {f['keyword']}: {f['error']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm-up programado del research de una watchlist de keywords")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("run", "schedule", "report"):
+        p = sub.add_parser(name)
+        p.add_argument("watchlist", help="Archivo .txt (una keyword por línea) o CSV con columna keyword")
+        p.add_argument("--secrets", help="Leer credenciales de un secrets.toml de Streamlit")
+        p.add_argument("--json", action="store_true", help="Salida en JSON")
+        if name != "report":
+            p.add_argument("--max-age", type=float, default=REFRESH_AFTER_HOURS, help="Refrescar research con más de N horas")
+            p.add_argument("--concurrency", type=int, default=4, help="Keywords analizadas en paralelo")
+            p.add_argument("--force", action="store_true", help="Refrescar todas, aunque estén frescas")
+            p.add_argument("--ready-wait", type=float, default=READY_WAIT_SEC, help="Espera máxima de las tareas SERP del lote")
+            p.add_argument("--research-budget", type=float, default=RESEARCH_BUDGET_SEC,
+                           help="Segundos de research por keyword (análisis de contenido incluido)")
+    sub.choices["schedule"].add_argument("--at", default="03:00", help="Hora local de cada pasada (HH:MM)")
+    args = parser.parse_args(argv)
+
+    seo_pipeline.configure(**load_secrets(args.secrets))
+    if args.cmd == "report":
+        rows = freshness(load_watchlist(args.watchlist))
+        if args.json:
+            print(json.dumps(rows, ensure_ascii=False, indent=2))
+        else:
+            for r in rows:
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["refreshed_at"])) if r["refreshed_at"] else "nunca"
+                mark = "✓" if r["fresh"] else "✗"
+                age = f"{r['age_hours']}h" if r["age_hours"] is not None else "-"
+                print(f"{mark} {r['keyword']:<50} {when:<17} {age:>8}  {r['source'] or ''}")
+            fresh = sum(1 for r in rows if r["fresh"])
+            print(f"\n{fresh}/{len(rows)} keywords servibles desde caché (≤ {seo_pipeline.RESEARCH_CACHE_MAX_AGE_HOURS:g} h)")
+        return 0
+
+    def progress(record, done, total):
+        status = record["status"] if record["status"] != "error" else f"ERROR {record['error']}"
+        print(f"[{done}/{total}] {record['keyword']}: {status} ({record['elapsed_sec']}s)", file=sys.stderr)
+
+    while True:
+        if args.cmd == "schedule":
+            wait = seconds_until(args.at)
+            print(f"Próxima pasada a las {args.at} (en {wait / 3600:.1f} h)", file=sys.stderr)
+            time.sleep(wait)
+        try:
+            summary = refresh(load_watchlist(args.watchlist), args.max_age, args.concurrency, args.force,
+                              ready_wait_sec=args.ready_wait, research_budget=args.research_budget,
+                              progress=None if args.json else progress)
+        except Exception as e:
+            if args.cmd == "run":
+                raise
+            # En modo programado una pasada fallida no detiene las siguientes
+            print(f"Pasada fallida: {type(e).__name__}: {e}", file=sys.stderr)
+            continue
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+        else:
+            _print_summary(summary)
+        if args.cmd == "run":
+            return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())